@@ -0,0 +1,469 @@
+# Benchmark das funções de extração do helper em partidas sintéticas (não depende da API)
+#
+# Uso: python benchmark.py [n_matches]                       comparações com as implementações de referência
+#      python benchmark.py suite [n_matches] [opções]         percentis de latência e alocações por função
+#                                                             (ver python benchmark.py suite --help)
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from helper import players_perfomance_at_n, events_at_n, get_participant_game_info, create_match_row
+from helper import extract_match_rows, match_snapshots, MatchFeatures
+from role_cache import RoleCache
+from roleidentification import get_roles
+from synthetic import make_matches, make_champion_roles
+
+
+def events_at_n_reference(timeline, n = 11):
+    '''
+     Implementação original de helper.events_at_n (uma chamada .loc por evento), mantida
+     aqui apenas como referência de paridade e de tempo para o benchmark.
+    '''
+
+    # Selecionando eventos de interresse
+    columns = ['participantId', 'wardsPlaced', 'wardsKilled', 'nKills', 'nDeaths', 'nAssists', 'firstBlood', 'firstTower',
+               'midTowersDestroyed', 'botTowersDestroyed', 'topTowersDestroyed', 'inhibitorsDestroyed', 'fireDragonsDestroyed',
+               'airDragonsDestroyed', 'waterDragonsDestroyed', 'earthDragonsDestroyed', 'riftHeraldDestroyed']
+
+    events_by_player = pd.DataFrame(columns = columns)
+    events_by_player['participantId'] = range(1,11)
+    events_by_player = events_by_player.fillna(0).set_index('participantId')
+
+    # Definindo alguns dicionários pra facilitar o input no DataFrame
+    dragon_dict = {'FIRE_DRAGON':'fireDragonsDestroyed',
+                  'WATER_DRAGON':'waterDragonsDestroyed',
+                  'EARTH_DRAGON':'earthDragonsDestroyed',
+                  'AIR_DRAGON':'airDragonsDestroyed'}
+
+    tower_dict = {'BOT_LANE': 'botTowersDestroyed',
+                  'TOP_LANE': 'topTowersDestroyed',
+                  'MID_LANE': 'midTowersDestroyed'}
+
+    # Iniando a contagem do First Blood e First Tower, eventos que não aparecem especificamente no objeto
+    first_blood = 0
+    first_tower = 0
+    
+    # Itera através dos Frames
+    for i in range(1, n):
+        events = timeline['frames'][i]['events']
+        
+        # De acordo com o evento, conta o número de vezes que o evento aconteceu
+        for event in events:
+            if event['type'] == 'WARD_PLACED':
+                if event['wardType'] !=  'UNDEFINED':
+                    events_by_player.loc[event['creatorId'], 'wardsPlaced'] += 1
+
+            if event['type'] == 'WARD_KILL':
+                if event['wardType'] !=  'UNDEFINED':
+                    events_by_player.loc[event['killerId'], 'wardsKilled'] += 1
+
+            # Evento CHAMPION_KILL gera 3 variáveis > o matador, o morto e quem ajudou a matar
+            if event['type'] == 'CHAMPION_KILL':
+                if event['killerId'] != 0:
+
+                    if first_blood == 0:
+                        events_by_player.loc[event['killerId'], 'firstBlood'] += 1
+                        first_blood +=1 
+
+                    events_by_player.loc[event['killerId'], 'nKills'] += 1
+                    events_by_player.loc[event['victimId'], 'nDeaths'] += 1
+
+                    # Pode ser mais de um assistente
+                    for assist in event['assistingParticipantIds']:
+                        events_by_player.loc[assist, 'nAssists'] += 1
+
+            # Eventos globais (morte de monstros elite, torres) afetam todos os players do time
+            if event['type'] == 'ELITE_MONSTER_KILL':
+                if event['monsterType'] == 'DRAGON':
+                    if event['killerId'] > 5:
+                        events_by_player.loc[6:, dragon_dict[event['monsterSubType']]] += 1
+                    else:
+                        events_by_player.loc[1:5, dragon_dict[event['monsterSubType']]] += 1
+
+                if event['monsterType'] == 'RIFTHERALD':
+                    if event['killerId'] > 5:
+                        events_by_player.loc[6:, 'riftHeraldDestroyed'] += 1
+                    else:
+                        events_by_player.loc[1:5, 'riftHeraldDestroyed'] += 1
+
+            if event['type'] == 'BUILDING_KILL':
+                if event['buildingType'] == 'TOWER_BUILDING':
+
+                    if event['teamId'] == 100:
+                        if first_tower == 0:
+                            events_by_player.loc[6:, 'firstTower'] += 1
+                            first_tower += 1
+
+                        events_by_player.loc[6:, tower_dict[event['laneType']]] += 1
+                    else:
+                        if first_tower == 0:
+                            events_by_player.loc[1:5, 'firstTower'] += 1
+                            first_tower += 1
+
+                        events_by_player.loc[1:5, tower_dict[event['laneType']]] += 1
+
+                if event['buildingType'] == 'INHIBITOR_BUILDING': 
+
+                    if event['killerId'] > 5:
+                        events_by_player.loc[6:, 'inhibitorsDestroyed'] += 1
+                    else:
+                        events_by_player.loc[1:5, 'inhibitorsDestroyed'] += 1
+
+    return events_by_player.reset_index()
+
+
+def check_events_parity(timelines, n = 11):
+    '''
+     Compara, coluna a coluna, a saída de helper.events_at_n com a implementação de referência.
+     Levanta AssertionError na primeira partida divergente.
+    '''
+    for timeline in timelines:
+        expected = events_at_n_reference(timeline, n = n)
+        result = events_at_n(timeline, n = n)
+
+        assert list(result.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(result, expected.astype(np.int64), check_dtype = False)
+
+        # O array cru precisa bater com o DataFrame
+        assert (events_at_n(timeline, n = n, as_array = True) == result.iloc[:, 1:].to_numpy()).all()
+
+
+def time_per_call(func, timelines, repeat = 3):
+    '''
+     Retorna o menor tempo médio por chamada (em segundos) de func sobre todas as timelines.
+    '''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for timeline in timelines:
+            func(timeline)
+        best = min(best, (time.perf_counter() - start) / len(timelines))
+
+    return best
+
+
+def bench_events(n_matches = 200):
+    timelines = [timeline for _, timeline in make_matches(n_matches)]
+
+    check_events_parity(timelines)
+    print(f'events_at_n: paridade OK em {n_matches} partidas')
+
+    reference = time_per_call(events_at_n_reference, timelines, repeat = 1)
+    frame = time_per_call(events_at_n, timelines)
+    array = time_per_call(lambda t: events_at_n(t, as_array = True), timelines)
+
+    print(f'events_at_n (referência .loc):  {reference * 1e3:8.3f} ms/partida')
+    print(f'events_at_n (DataFrame):        {frame * 1e3:8.3f} ms/partida  ({reference / frame:6.1f}x)')
+    print(f'events_at_n (as_array = True):  {array * 1e3:8.3f} ms/partida  ({reference / array:6.1f}x)')
+
+
+def match_rows_one_by_one(matches, champion_roles, role_cache = None):
+    '''
+     Caminho atual do notebook: uma chamada de cada função do helper por partida e um concat no final.
+    '''
+    rows = []
+    for game_info, timeline in matches:
+        if len(timeline['frames']) > 10:
+            rows.append(create_match_row(players_perfomance_at_n(timeline), events_at_n(timeline),
+                                         get_participant_game_info(game_info), champion_roles, game_info['gameId'],
+                                         role_cache = role_cache))
+
+    return pd.concat(rows, ignore_index = True)
+
+
+def check_match_rows_parity(matches, champion_roles):
+    '''
+     Compara a saída de helper.extract_match_rows com create_match_row aplicado partida a partida.
+
+     As duas versões usam um RoleCache, que chama get_roles com a composição ordenada: em empates entre
+     permutações, get_roles com os campeões na ordem do MatchDto pode escolher outra atribuição.
+    '''
+    expected = match_rows_one_by_one(matches, champion_roles, role_cache = RoleCache(champion_roles))
+    result = extract_match_rows([t for _, t in matches], [g for g, _ in matches], champion_roles)
+
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(result, expected.astype(result.dtypes.to_dict()))
+
+
+def bench_match_rows(n_matches = 200):
+    matches = make_matches(n_matches)
+    champion_roles = make_champion_roles()
+
+    check_match_rows_parity(matches, champion_roles)
+    print(f'extract_match_rows: paridade OK em {n_matches} partidas')
+
+    start = time.perf_counter()
+    match_rows_one_by_one(matches, champion_roles)
+    one_by_one = (time.perf_counter() - start) / n_matches
+
+    start = time.perf_counter()
+    extract_match_rows([t for _, t in matches], [g for g, _ in matches], champion_roles)
+    batch = (time.perf_counter() - start) / n_matches
+
+    print(f'create_match_row (partida a partida): {one_by_one * 1e3:8.3f} ms/partida')
+    print(f'extract_match_rows (lote):            {batch * 1e3:8.3f} ms/partida  ({one_by_one / batch:6.1f}x)')
+
+
+def _roles_playrate(champion_roles, roles):
+    # Soma das playrates de uma atribuição {role: championId}, a quantidade que get_roles maximiza
+    return sum(champion_roles.get(champion, {}).get(role, 0) for role, champion in roles.items())
+
+
+def check_role_cache_parity(compositions, champion_roles, expected, result):
+    '''
+     Compara as roles do RoleCache (result) com get_roles chamado direto com cada composição na ordem original
+     (expected). O RoleCache chama get_roles com a composição ordenada, então em empates entre permutações a
+     atribuição pode ser outra: as diferenças só são aceitas quando as duas têm a mesma playrate total.
+    '''
+    ties = 0
+    for composition, roles, cached in zip(compositions, expected, result):
+        if roles != cached:
+            assert sorted(cached.values()) == sorted(composition)
+            assert np.isclose(_roles_playrate(champion_roles, roles), _roles_playrate(champion_roles, cached))
+            ties += 1
+    return ties
+
+
+def bench_role_cache(n_matches = 200, pool_size = 50, seed = 0):
+    '''
+     Compara get_roles chamado para cada time com o RoleCache, sorteando as composições de um pool de
+     pool_size composições (meta restrito, como na SoloQ de alto elo).
+    '''
+    champion_roles = make_champion_roles()
+    rng = np.random.default_rng(seed)
+
+    champions = list(champion_roles)
+    pool = [rng.choice(champions, 5, replace = False).tolist() for _ in range(pool_size)]
+    compositions = [pool[i] for i in rng.integers(pool_size, size = 2 * n_matches)]
+
+    start = time.perf_counter()
+    expected = [get_roles(champion_roles, composition) for composition in compositions]
+    uncached = (time.perf_counter() - start) / len(compositions)
+
+    role_cache = RoleCache(champion_roles)
+    start = time.perf_counter()
+    result = role_cache.resolve_many(compositions)
+    cached = (time.perf_counter() - start) / len(compositions)
+
+    ties = check_role_cache_parity(compositions, champion_roles, expected, result)
+    print(f'RoleCache: paridade OK com get_roles em {len(compositions)} times ({ties} empates)')
+
+    print(f'get_roles (por time):         {uncached * 1e6:8.1f} us/time')
+    print(f'RoleCache.resolve_many:       {cached * 1e6:8.1f} us/time  ({uncached / cached:6.1f}x, '
+          f'hit rate {role_cache.stats["hit_rate"]:.1%})')
+
+
+# Arquivo padrão com os números de referência da suite (gravado com --save-baseline)
+BASELINE_PATH = 'benchmark_baseline.json'
+
+# Percentis de latência reportados pela suite
+PERCENTILES = (50, 90, 99)
+
+# Partidas por chamada do caso extract_match_rows da suite (a latência reportada é por partida)
+SUITE_BATCH_SIZE = 50
+
+
+def per_match(game_info, timeline, champion_roles):
+    '''
+     Caminho completo de uma partida no loop do notebook: performance -> eventos -> info -> linha.
+    '''
+    return create_match_row(players_perfomance_at_n(timeline), events_at_n(timeline),
+                            get_participant_game_info(game_info), champion_roles, game_info['gameId'])
+
+
+def suite_cases(matches, champion_roles):
+    '''
+     Casos da suite: {nome: (função, lista de argumentos de cada chamada, partidas por chamada)}. Só entram
+     partidas com mais de 10 frames, as únicas que o loop de extração aproveita.
+    '''
+    matches = [(game_info, timeline) for game_info, timeline in matches if len(timeline['frames']) > 10]
+    timelines = [(timeline,) for _, timeline in matches]
+    rows = [(players_perfomance_at_n(t), events_at_n(t), get_participant_game_info(g), champion_roles, g['gameId'])
+            for g, t in matches]
+    batches = [([t for _, t in matches[i:i + SUITE_BATCH_SIZE]], [g for g, _ in matches[i:i + SUITE_BATCH_SIZE]],
+                champion_roles) for i in range(0, len(matches), SUITE_BATCH_SIZE)]
+
+    return {'players_perfomance_at_n': (players_perfomance_at_n, timelines, 1),
+            'events_at_n': (events_at_n, timelines, 1),
+            'events_at_n(as_array)': (lambda t: events_at_n(t, as_array = True), timelines, 1),
+            'get_participant_game_info': (get_participant_game_info, [(g,) for g, _ in matches], 1),
+            'create_match_row': (create_match_row, rows, 1),
+            'per_match (ponta a ponta)': (per_match, [(g, t, champion_roles) for g, t in matches], 1),
+            'MatchFeatures (compacto)': (lambda g, t: MatchFeatures.from_match(g, t).row(champion_roles),
+                                         [(g, t) for g, t in matches], 1),
+            'match_snapshots': (match_snapshots, timelines, 1),
+            'extract_match_rows (lote)': (extract_match_rows, batches, SUITE_BATCH_SIZE)}
+
+
+def latencies(func, calls, repeat = 5):
+    '''
+     Executa func sobre todos os argumentos de calls, repeat vezes (depois de uma chamada de aquecimento), e
+     retorna o array com o tempo de cada chamada, em segundos.
+    '''
+    func(*calls[0])
+
+    times = []
+    for _ in range(repeat):
+        for args in calls:
+            start = time.perf_counter()
+            func(*args)
+            times.append(time.perf_counter() - start)
+
+    return np.array(times)
+
+
+def allocations(func, calls):
+    '''
+     Mede com o tracemalloc, em uma passada separada (o tracemalloc deixa as chamadas bem mais lentas), a memória
+     alocada por chamada: retorna (pico médio, tamanho médio do resultado) em bytes. O pico conta as alocações
+     do Python e do NumPy feitas durante a chamada, inclusive as já liberadas no final.
+    '''
+    peaks, retained = [], []
+
+    tracemalloc.start()
+    try:
+        for args in calls:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            result = func(*args)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+            del result
+    finally:
+        tracemalloc.stop()
+
+    return float(np.mean(peaks)), float(np.mean(retained))
+
+
+def run_suite(n_matches = 200, n_frames = (15, 45), events_per_frame = 40, seed = 0, repeat = 5):
+    '''
+     Roda todos os casos da suite em n_matches partidas sintéticas (synthetic.make_matches com n_frames e
+     events_per_frame) e retorna {'config': ..., 'results': {caso: métricas}}. As métricas são por partida
+     (no caso em lote, a chamada dividida pelo tamanho do lote): mean_us, p50_us, p90_us, p99_us, peak_kib e
+     result_kib.
+    '''
+    matches = make_matches(n_matches, n_frames = n_frames, events_per_frame = events_per_frame, seed = seed)
+    champion_roles = make_champion_roles(seed)
+
+    results = {}
+    for name, (func, calls, matches_per_call) in suite_cases(matches, champion_roles).items():
+        times = latencies(func, calls, repeat = repeat) / matches_per_call
+        peak, retained = allocations(func, calls)
+
+        results[name] = {'mean_us': times.mean() * 1e6,
+                         **{f'p{q}_us': np.percentile(times, q) * 1e6 for q in PERCENTILES},
+                         'peak_kib': peak / matches_per_call / 1024,
+                         'result_kib': retained / matches_per_call / 1024}
+
+    config = {'n_matches': n_matches, 'n_frames': list(n_frames) if not isinstance(n_frames, int) else n_frames,
+              'events_per_frame': events_per_frame, 'seed': seed, 'repeat': repeat,
+              'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+              'machine': platform.machine(), 'processor': platform.processor()}
+
+    return {'config': config, 'results': results}
+
+
+def print_suite(suite):
+    print(f'{"caso":28s} {"média":>10s} ' + ' '.join(f'{f"p{q}":>10s}' for q in PERCENTILES)
+          + f' {"pico KiB":>10s} {"result KiB":>10s}   (us por partida)')
+
+    for name, r in suite['results'].items():
+        print(f'{name:28s} {r["mean_us"]:10.1f} ' + ' '.join(f'{r[f"p{q}_us"]:10.1f}' for q in PERCENTILES)
+              + f' {r["peak_kib"]:10.1f} {r["result_kib"]:10.1f}')
+
+
+def save_baseline(suite, path = BASELINE_PATH):
+    with open(path, 'w') as f:
+        json.dump(suite, f, indent = 2)
+
+
+def load_baseline(path = BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_to_baseline(suite, baseline, tolerance = 0.2):
+    '''
+     Compara a suite com o baseline caso a caso (razão atual / baseline da p50 e do pico de memória) e imprime a
+     tabela. Retorna a lista de casos com regressão acima de tolerance em alguma das duas razões.
+
+     As latências só são comparáveis com a mesma configuração de partidas e na mesma máquina: diferenças de
+     configuração são avisadas antes da tabela.
+    '''
+    for key, value in baseline['config'].items():
+        if suite['config'].get(key) != value:
+            print(f'AVISO: {key} do baseline = {value!r}, atual = {suite["config"].get(key)!r}')
+
+    regressions = []
+    print(f'{"caso":28s} {"p50 base":>10s} {"p50 atual":>10s} {"razão":>7s} {"pico base":>10s} {"pico atual":>10s} {"razão":>7s}')
+
+    for name, r in suite['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f'{name:28s} (novo caso, sem baseline)')
+            continue
+
+        latency_ratio = r['p50_us'] / base['p50_us']
+        memory_ratio = r['peak_kib'] / base['peak_kib'] if base['peak_kib'] else 1.0
+        regressed = latency_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        if regressed:
+            regressions.append(name)
+
+        print(f'{name:28s} {base["p50_us"]:10.1f} {r["p50_us"]:10.1f} {latency_ratio:7.2f} '
+              f'{base["peak_kib"]:10.1f} {r["peak_kib"]:10.1f} {memory_ratio:7.2f}' + ('  <- REGRESSÃO' if regressed else ''))
+
+    return regressions
+
+
+def suite_main(argv):
+    parser = argparse.ArgumentParser(prog = 'benchmark.py suite',
+                                     description = 'Percentis de latência e alocações das funções de extração do helper.')
+    parser.add_argument('n_matches', type = int, nargs = '?', default = 200)
+    parser.add_argument('--frames', type = int, nargs = '+', default = [15, 45],
+                        help = 'frames por partida: um valor fixo ou o intervalo MIN MAX (padrão: 15 45)')
+    parser.add_argument('--events', type = int, default = 40, help = 'eventos por frame, em média (padrão: 40)')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--baseline', default = BASELINE_PATH, help = f'arquivo do baseline (padrão: {BASELINE_PATH})')
+    parser.add_argument('--save-baseline', action = 'store_true', help = 'grava o resultado como o novo baseline')
+    parser.add_argument('--tolerance', type = float, default = 0.2,
+                        help = 'piora relativa tolerada na comparação com o baseline (padrão: 0.2)')
+    args = parser.parse_args(argv)
+
+    n_frames = args.frames[0] if len(args.frames) == 1 else tuple(args.frames[:2])
+    suite = run_suite(args.n_matches, n_frames = n_frames, events_per_frame = args.events, seed = args.seed,
+                      repeat = args.repeat)
+    print_suite(suite)
+
+    if args.save_baseline:
+        save_baseline(suite, args.baseline)
+        print(f'baseline gravado em {args.baseline}')
+        return 0
+
+    try:
+        baseline = load_baseline(args.baseline)
+    except FileNotFoundError:
+        print(f'sem baseline em {args.baseline} (use --save-baseline)')
+        return 0
+
+    print()
+    regressions = compare_to_baseline(suite, baseline, tolerance = args.tolerance)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'suite':
+        sys.exit(suite_main(sys.argv[2:]))
+
+    n_matches = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    bench_events(n_matches)
+    bench_match_rows(n_matches)
+    bench_role_cache(n_matches)
@@ -0,0 +1,226 @@
+# Cache local das respostas cruas da API (MatchDto e MatchTimelineDto), para não depender da API a cada feature nova
+import gzip
+import json
+import sqlite3
+import time
+
+import pandas as pd
+
+from helper import extract_match_rows
+
+# zstd é opcional: sem a lib os blobs são gravados com gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+KINDS = ('match', 'timeline')
+
+
+def _compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level = 6).compress(data)
+    return gzip.compress(data, compresslevel = 6)
+
+
+def _decompress(blob, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+class MatchCache:
+    '''
+     Armazena o JSON cru das partidas em um arquivo SQLite, com uma linha por (region, gameId, tipo)
+     e o JSON comprimido (zstd quando disponível, senão gzip).
+
+     max_bytes limita o tamanho (comprimido) do cache: ao ultrapassar, as partidas acessadas há mais
+     tempo são removidas (LRU). Os contadores hits e misses contam as leituras de get_match.
+
+     Leituras não escrevem no arquivo: os horários de acesso ficam em memória e são gravados em lote a cada
+     access_batch leituras, antes de cada evict e no close.
+    '''
+    def __init__(self, path = 'data/raw_matches.sqlite', max_bytes = None, codec = None, access_batch = 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.codec = codec or ('zstd' if zstandard is not None else 'gzip')
+        self.access_batch = access_batch
+
+        self.hits = 0
+        self.misses = 0
+        self._accessed = {}
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS raw (
+                                 region TEXT NOT NULL,
+                                 game_id INTEGER NOT NULL,
+                                 kind TEXT NOT NULL,
+                                 codec TEXT NOT NULL,
+                                 blob BLOB NOT NULL,
+                                 size INTEGER NOT NULL,
+                                 last_access REAL NOT NULL,
+                                 PRIMARY KEY (region, game_id, kind))''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS raw_last_access ON raw (last_access)')
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.flush_access()
+        self.conn.close()
+
+    def flush_access(self):
+        '''
+         Grava os horários de acesso pendentes das leituras (uma transação para todo o lote).
+        '''
+        if not self._accessed:
+            return
+
+        self.conn.executemany('UPDATE raw SET last_access = ? WHERE region = ? AND game_id = ? AND kind = ?',
+                              [(accessed, *key) for key, accessed in self._accessed.items()])
+        self.conn.commit()
+        self._accessed = {}
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM raw WHERE kind = 'timeline'").fetchone()[0]
+
+    def __contains__(self, key):
+        region, game_id = key
+        row = self.conn.execute("SELECT COUNT(*) FROM raw WHERE region = ? AND game_id = ?", (region, game_id)).fetchone()
+        return row[0] == len(KINDS)
+
+    @property
+    def size_bytes(self):
+        return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM raw').fetchone()[0]
+
+    @property
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0,
+                'matches': len(self), 'size_bytes': self.size_bytes}
+
+    def get(self, region, game_id, kind):
+        '''
+         Retorna o objeto (dict) guardado para (region, game_id, kind) ou None.
+        '''
+        row = self.conn.execute('SELECT codec, blob FROM raw WHERE region = ? AND game_id = ? AND kind = ?',
+                                (region, game_id, kind)).fetchone()
+        if row is None:
+            return None
+
+        self._accessed[(region, game_id, kind)] = time.time()
+        if len(self._accessed) >= self.access_batch:
+            self.flush_access()
+
+        return json.loads(_decompress(row[1], row[0]))
+
+    def put(self, region, game_id, kind, obj):
+        blob = _compress(json.dumps(obj, separators = (',', ':')).encode(), self.codec)
+        self._accessed.pop((region, game_id, kind), None)
+
+        self.conn.execute('INSERT OR REPLACE INTO raw VALUES (?, ?, ?, ?, ?, ?, ?)',
+                          (region, game_id, kind, self.codec, blob, len(blob), time.time()))
+        self.conn.commit()
+
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+
+    def get_match(self, region, game_id):
+        '''
+         Retorna o par (game_info, timeline) da partida, ou None caso algum dos dois não esteja no cache.
+        '''
+        game_info = self.get(region, game_id, 'match')
+        timeline = self.get(region, game_id, 'timeline') if game_info is not None else None
+
+        if timeline is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return game_info, timeline
+
+    def put_match(self, region, game_id, game_info, timeline):
+        self.put(region, game_id, 'match', game_info)
+        self.put(region, game_id, 'timeline', timeline)
+
+    def evict(self, max_bytes):
+        '''
+         Remove as partidas menos recentemente acessadas até o cache ocupar no máximo max_bytes.
+        '''
+        self.flush_access()
+        size = self.size_bytes
+
+        while size > max_bytes:
+            row = self.conn.execute('SELECT region, game_id FROM raw ORDER BY last_access LIMIT 1').fetchone()
+            if row is None:
+                break
+
+            freed = self.conn.execute('SELECT SUM(size) FROM raw WHERE region = ? AND game_id = ?', row).fetchone()[0]
+            self.conn.execute('DELETE FROM raw WHERE region = ? AND game_id = ?', row)
+            size -= freed
+
+        self.conn.commit()
+
+    def keys(self, region = None):
+        '''
+         Lista os pares (region, game_id) das partidas completas no cache.
+        '''
+        if region is None:
+            rows = self.conn.execute('SELECT region, game_id FROM raw GROUP BY region, game_id HAVING COUNT(*) = ?', (len(KINDS),))
+        else:
+            rows = self.conn.execute('SELECT region, game_id FROM raw WHERE region = ? '
+                                     'GROUP BY region, game_id HAVING COUNT(*) = ?', (region, len(KINDS)))
+
+        return [tuple(row) for row in rows]
+
+    def load_match(self, region, game_id):
+        '''
+         Retorna o par (game_info, timeline) da partida, ou None, sem tocar nos contadores nem na ordem do LRU.
+        '''
+        objs = {}
+        for kind, codec, blob in self.conn.execute('SELECT kind, codec, blob FROM raw WHERE region = ? AND game_id = ?',
+                                                   (region, game_id)):
+            objs[kind] = json.loads(_decompress(blob, codec))
+
+        if len(objs) < len(KINDS):
+            return None
+        return objs['match'], objs['timeline']
+
+    def iter_matches(self, region = None):
+        '''
+         Itera pelos pares (game_info, timeline) de todas as partidas do cache, sem tocar nos contadores
+         nem na ordem do LRU.
+        '''
+        for region, game_id in self.keys(region):
+            match = self.load_match(region, game_id)
+            if match is not None:
+                yield match
+
+
+def replay_match_rows(cache, champion_roles, n = 10, region = None, chunk_size = 5000):
+    '''
+     Modo replay: refaz a extração (helper.extract_match_rows) de todas as partidas do cache, sem nenhuma
+     requisição à API. As partidas são processadas em blocos de chunk_size para limitar a memória
+     (para usar todos os núcleos, veja extraction.extract_parallel).
+
+     A função retorna o DataFrame de partidas (mesmas colunas de helper.create_match_row).
+    '''
+    chunks = []
+    game_infos, timelines = [], []
+
+    for game_info, timeline in cache.iter_matches(region):
+        game_infos.append(game_info)
+        timelines.append(timeline)
+
+        if len(timelines) == chunk_size:
+            chunks.append(extract_match_rows(timelines, game_infos, champion_roles, n = n))
+            game_infos, timelines = [], []
+
+    chunks.append(extract_match_rows(timelines, game_infos, champion_roles, n = n))
+
+    return pd.concat(chunks, ignore_index = True)
@@ -0,0 +1,106 @@
+# Tabelas de consulta dos campeões (nome, classe e códigos inteiros), indexadas pelo championId
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Arquivo versionado com os campeões: campeões novos entram no JSON, não no código
+CHAMPIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'champions.json')
+
+
+class ChampionTable:
+    '''
+     Tabelas densas indexadas pelo championId (posições sem campeão ficam com None / -1), montadas uma
+     única vez a partir do JSON de campeões.
+
+     Os métodos names, classes, class_codes e codes recebem um id, uma lista/array de ids ou uma Series
+     e fazem a conversão com uma única indexação de array.
+    '''
+    def __init__(self, champions, version = None):
+        self.version = version
+        self.ids = np.array(sorted(c['id'] for c in champions), dtype = np.int64)
+        self.class_labels = sorted({c['class'] for c in champions})
+
+        size = int(self.ids.max()) + 1
+        self._names = np.full(size, None, dtype = object)
+        self._classes = np.full(size, None, dtype = object)
+        self._class_codes = np.full(size, -1, dtype = np.int64)
+        self._codes = np.full(size, -1, dtype = np.int64)
+
+        class_code = {label: i for i, label in enumerate(self.class_labels)}
+        for champion in champions:
+            self._names[champion['id']] = champion['name']
+            self._classes[champion['id']] = champion['class']
+            self._class_codes[champion['id']] = class_code[champion['class']]
+
+        # Código inteiro contínuo (0..n_champions-1), na ordem dos ids
+        self._codes[self.ids] = np.arange(len(self.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _lookup(self, table, ids, missing):
+        if np.isscalar(ids):
+            ids = int(ids)
+            return table[ids] if 0 <= ids < len(table) else missing
+
+        values = np.asarray(ids, dtype = np.int64)
+        valid = (values >= 0) & (values < len(table))
+        result = np.where(valid, table[np.where(valid, values, 0)], missing)
+
+        if isinstance(ids, pd.Series):
+            return pd.Series(result, index = ids.index, name = ids.name)
+        return result
+
+    def names(self, ids):
+        return self._lookup(self._names, ids, None)
+
+    def classes(self, ids):
+        return self._lookup(self._classes, ids, None)
+
+    def class_codes(self, ids):
+        return self._lookup(self._class_codes, ids, -1)
+
+    def codes(self, ids):
+        return self._lookup(self._codes, ids, -1)
+
+
+@lru_cache(maxsize = None)
+def load_champions(path = CHAMPIONS_PATH):
+    '''
+     Lê o JSON de campeões e retorna a ChampionTable correspondente (carregada só na primeira chamada).
+    '''
+    with open(path, encoding = 'utf-8') as f:
+        data = json.load(f)
+
+    return ChampionTable(data['champions'], version = data.get('version'))
+
+
+def champion_names(ids):
+    '''
+     Converte championIds (escalar, array ou Series) nos nomes dos campeões.
+    '''
+    return load_champions().names(ids)
+
+
+def champion_classes(ids):
+    '''
+     Converte championIds (escalar, array ou Series) nas classes dos campeões (Burst, Diver, ...).
+    '''
+    return load_champions().classes(ids)
+
+
+def champion_class_codes(ids):
+    '''
+     Converte championIds (escalar, array ou Series) no código inteiro da classe (-1 para ids desconhecidos).
+    '''
+    return load_champions().class_codes(ids)
+
+
+def champion_codes(ids):
+    '''
+     Converte championIds (escalar, array ou Series) em um código inteiro contínuo (-1 para ids desconhecidos).
+    '''
+    return load_champions().codes(ids)
@@ -0,0 +1,450 @@
+# Crawler assíncrono da API da Riot Games, respeitando os limites de requisição da chave
+import asyncio
+import logging
+import time
+from collections import deque
+
+import aiohttp
+
+from helper import extract_match_rows
+from match_index import SeenMatches
+from metrics import METRICS, timed
+
+logger = logging.getLogger(__name__)
+
+# Limites de uma chave de desenvolvimento: 20 requisições/1s e 100 requisições/2min
+DEV_KEY_LIMITS = [(20, 1), (100, 120)]
+
+# Partidas desde 12/Fev, assim como no notebook de extração
+BEGIN_TIME = 1613171498
+
+# id 420 - Partidas SoloQ Ranked
+SOLOQ_QUEUE = 420
+
+
+class RiotApiError(Exception):
+    '''
+     Erro definitivo de uma requisição (status HTTP diferente de 2xx, 404, 429 e 5xx, ou
+     429/5xx que persistiram após todas as tentativas).
+    '''
+    def __init__(self, status, url):
+        super().__init__(f'{status} em {url}')
+        self.status = status
+        self.url = url
+
+
+class TokenBucket:
+    '''
+     Balde com capacity fichas. Cada ficha gasta volta ao balde period segundos depois, o que
+     garante no máximo capacity requisições em qualquer janela de period segundos (mesma regra
+     das janelas de limite da Riot).
+    '''
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self._spent = deque()
+
+    def wait_time(self, now):
+        # Devolver as fichas cujo período já passou
+        while self._spent and self._spent[0] <= now - self.period:
+            self._spent.popleft()
+
+        if len(self._spent) < self.capacity:
+            return 0.0
+        return self._spent[0] + self.period - now
+
+    def take(self, now):
+        self._spent.append(now)
+
+
+class RateLimiter:
+    '''
+     Agenda as requisições de acordo com todos os limites da chave ao mesmo tempo (ex.: por segundo e
+     por 2 minutos) e com as pausas pedidas pela API via Retry-After.
+    '''
+    def __init__(self, limits = DEV_KEY_LIMITS):
+        self.buckets = [TokenBucket(capacity, period) for capacity, period in limits]
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = max([self._blocked_until - now] + [b.wait_time(now) for b in self.buckets])
+
+                if wait <= 0:
+                    for bucket in self.buckets:
+                        bucket.take(now)
+                    return
+
+                await asyncio.sleep(wait)
+
+    def block_for(self, seconds):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class RiotClient:
+    '''
+     Cliente assíncrono dos endpoints usados no projeto (summoner-v4 e match-v4).
+
+     Todas as requisições compartilham uma sessão HTTP (pool de conexões limitado a concurrency) e um
+     RateLimiter. Respostas 429 pausam o limiter pelo Retry-After; respostas 5xx são repetidas com backoff
+     exponencial até max_retries vezes. Respostas 404 retornam None.
+
+     base_url permite apontar o cliente para outro servidor (ex.: fake_riot.FakeRiotServer). O contador
+     requests conta as requisições enviadas, incluindo as repetidas (o orçamento da chave). Requisições que
+     passam de timeout segundos são repetidas como as falhas de conexão.
+    '''
+    def __init__(self, api_key, region = 'br1', limits = DEV_KEY_LIMITS, concurrency = 10, max_retries = 5,
+                 base_url = None, timeout = 30):
+        self.api_key = api_key
+        self.region = region
+        self.limiter = RateLimiter(limits)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_url = base_url or f'https://{region}.api.riotgames.com'
+        self.timeout = timeout
+        self.session = None
+        self.requests = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit = self.concurrency)
+        self.session = aiohttp.ClientSession(connector = connector, headers = {'X-Riot-Token': self.api_key},
+                                             timeout = aiohttp.ClientTimeout(total = self.timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    @timed('api_request')
+    async def request(self, path, **params):
+        url = self.base_url + path
+        status = None
+
+        for attempt in range(self.max_retries + 1):
+            with METRICS.timer('rate_limit_wait'):
+                await self.limiter.acquire()
+
+            self.requests += 1
+            METRICS.count('requests')
+            try:
+                start = time.perf_counter()
+                async with self.session.get(url, params = params) as response:
+                    status = response.status
+                    METRICS.observe('api_latency', time.perf_counter() - start)
+
+                    if response.status == 200:
+                        return await response.json()
+
+                    if response.status == 404:
+                        return None
+
+                    if response.status == 429:
+                        METRICS.count('responses_429')
+                        # Sem Retry-After o limite é do serviço, não da chave -> backoff
+                        retry_after = float(response.headers.get('Retry-After', 2 ** attempt))
+                        logger.warning('429 em %s, aguardando %.1fs', path, retry_after)
+                        self.limiter.block_for(retry_after)
+                        continue
+
+                    if response.status < 500:
+                        raise RiotApiError(response.status, url)
+
+                    METRICS.count('responses_5xx')
+                    logger.warning('%d em %s (tentativa %d)', response.status, path, attempt + 1)
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                METRICS.count('connection_errors')
+                logger.warning('Falha de conexão em %s (tentativa %d): %s', path, attempt + 1, e)
+
+            with METRICS.timer('retry_backoff'):
+                await asyncio.sleep(min(2 ** attempt * 0.5, 30))
+
+        raise RiotApiError(status, url)
+
+    async def summoner_by_name(self, summoner_name):
+        return await self.request(f'/lol/summoner/v4/summoners/by-name/{summoner_name}')
+
+    async def matchlist_by_account(self, account_id, begin_time = None, queue = None):
+        params = {}
+        if begin_time is not None:
+            params['beginTime'] = begin_time * 1000
+        if queue is not None:
+            params['queue'] = queue
+        return await self.request(f'/lol/match/v4/matchlists/by-account/{account_id}', **params)
+
+    async def match_by_id(self, match_id):
+        return await self.request(f'/lol/match/v4/matches/{match_id}')
+
+    async def timeline_by_match(self, match_id):
+        return await self.request(f'/lol/match/v4/timelines/by-match/{match_id}')
+
+
+async def crawl(client, summoner_names, on_match, seen = None, begin_time = BEGIN_TIME, queue = SOLOQ_QUEUE, workers = None,
+                cache = None, mark_seen = True):
+    '''
+     Essa função toma como parâmetros obrigatórios um RiotClient aberto, uma lista de nomes de
+     summoners (ex.: helper.get_top_players_users) e a função on_match(game_info, timeline), chamada
+     para cada partida nova. Como parâmetros não obrigatórios recebe o índice seen (match_index.SeenMatches)
+     de gameIds já vistos, o begin_time (timestamp em segundos), a fila, o número de workers (padrão: client.concurrency)
+     e um cache.MatchCache, consultado antes de buscar a partida e o timeline na API.
+
+     Os workers consomem uma fila única de tarefas (summoners e partidas), então as requisições ficam
+     sempre no limite da chave em vez de esperar a latência de cada chamada. Erros de uma tarefa (da API ou
+     do on_match/cache) são logados e a tarefa é descartada, sem parar o crawl. Um gameId só entra em seen
+     depois que a partida foi buscada e entregue ao on_match, então partidas que falharam são buscadas de
+     novo no próximo crawl. Com mark_seen False, seen só é consultado e quem chama marca os ids quando as
+     partidas estiverem gravadas (ex.: crawl_to_sink).
+
+     A função retorna o índice de gameIds vistos (gravado no disco ao final, caso seen tenha path).
+    '''
+    seen = SeenMatches() if seen is None else seen
+    tasks = asyncio.Queue()
+
+    # gameIds enfileirados neste crawl, para que outros summoners não enfileirem a mesma partida
+    queued = set()
+
+    for summoner_name in summoner_names:
+        tasks.put_nowait(('summoner', summoner_name))
+
+    async def process_summoner(summoner_name):
+        summoner_data = await client.summoner_by_name(summoner_name)
+        if summoner_data is None:
+            return
+
+        match_list = await client.matchlist_by_account(summoner_data['accountId'], begin_time = begin_time, queue = queue)
+        if match_list is None:
+            return
+
+        # Como os players jogam um contra o outro e são do mesmo nível, várias partidas se repetem
+        game_ids = [match['gameId'] for match in match_list['matches'] if match['queue'] == queue]
+
+        for game_id in seen.filter_new(game_ids):
+            if game_id not in queued:
+                queued.add(game_id)
+                tasks.put_nowait(('match', game_id))
+
+    async def process_match(match_id):
+        cached = cache.get_match(client.region, match_id) if cache is not None else None
+        if cached is not None:
+            METRICS.count('cache_hits')
+            METRICS.count('matches_crawled')
+            on_match(*cached)
+            if mark_seen:
+                seen.add(match_id)
+            return
+
+        if cache is not None:
+            METRICS.count('cache_misses')
+
+        game_info, timeline = await asyncio.gather(client.match_by_id(match_id), client.timeline_by_match(match_id))
+
+        if game_info is not None and timeline is not None:
+            if cache is not None:
+                cache.put_match(client.region, match_id, game_info, timeline)
+            METRICS.count('matches_crawled')
+            on_match(game_info, timeline)
+            if mark_seen:
+                seen.add(match_id)
+
+    async def worker():
+        while True:
+            kind, key = await tasks.get()
+            try:
+                if kind == 'summoner':
+                    await process_summoner(key)
+                else:
+                    await process_match(key)
+
+            except RiotApiError as e:
+                logger.error('Descartando %s %s: %s', kind, key, e)
+
+            except Exception:
+                logger.exception('Descartando %s %s', kind, key)
+
+            finally:
+                tasks.task_done()
+
+    pool = [asyncio.create_task(worker()) for _ in range(workers or client.concurrency)]
+    await tasks.join()
+
+    for task in pool:
+        task.cancel()
+    await asyncio.gather(*pool, return_exceptions = True)
+
+    seen.flush()
+    return seen
+
+
+async def crawl_frontier(client, frontier, on_match, seen = None, begin_time = BEGIN_TIME, queue = SOLOQ_QUEUE,
+                         workers = None, cache = None, max_requests = None, idle_wait = 0.05):
+    '''
+     Versão priorizada do crawl: em vez de percorrer a lista de summoners na ordem, os workers consomem um
+     frontier.CrawlFrontier. Partidas enfileiradas vêm sempre antes de summoners (cada partida buscada é
+     inédita e atualiza a estimativa de partidas inéditas dos seus participantes), e o próximo summoner é o
+     de maior prioridade no momento. Os participantes de cada partida buscada entram na fronteira, já com o
+     accountId, então só os seeds ainda não vistos em nenhuma partida custam um summoner_by_name.
+
+     max_requests limita as requisições deste crawl (client.requests; tarefas já em andamento terminam, então
+     o total pode passar um pouco). Com a fronteira em um arquivo, chamar de novo com o mesmo arquivo continua
+     o crawl; on_match recebe cada partida pelo menos uma vez (uma interrupção entre o on_match e o registro
+     na fronteira faz a partida ser buscada de novo).
+
+     Os demais parâmetros são os de crawl. A função retorna o índice de gameIds vistos.
+    '''
+    seen = SeenMatches() if seen is None else seen
+    budget = None if max_requests is None else client.requests + max_requests
+    running = 0
+
+    async def process_summoner(summoner_id, summoner_name, account_id):
+        if account_id is None:
+            summoner_data = await client.summoner_by_name(summoner_name)
+            if summoner_data is None:
+                frontier.summoner_done(summoner_id, failed = True)
+                return
+            account_id = summoner_data['accountId']
+
+        # O match-v4 responde 404 para quem não tem partidas no período: conta como 0 na média do tier
+        match_list = await client.matchlist_by_account(account_id, begin_time = begin_time, queue = queue)
+        matches = match_list['matches'] if match_list is not None else []
+
+        game_ids = [match['gameId'] for match in matches if match['queue'] == queue]
+        new = frontier.add_matches(seen.filter_new(game_ids))
+        seen.update(new)
+
+        frontier.summoner_done(summoner_id, n_matches = len(game_ids), n_new = len(new), account_id = account_id)
+
+    async def process_match(match_id):
+        cached = cache.get_match(client.region, match_id) if cache is not None else None
+        if cached is not None:
+            METRICS.count('cache_hits')
+            game_info, timeline = cached
+        else:
+            if cache is not None:
+                METRICS.count('cache_misses')
+            game_info, timeline = await asyncio.gather(client.match_by_id(match_id), client.timeline_by_match(match_id))
+
+        if game_info is None or timeline is None:
+            frontier.match_done(match_id, failed = True)
+            return
+
+        if cache is not None and cached is None:
+            cache.put_match(client.region, match_id, game_info, timeline)
+        METRICS.count('matches_crawled')
+        on_match(game_info, timeline)
+
+        frontier.discover(game_info)
+        frontier.match_done(match_id)
+
+    async def worker():
+        nonlocal running
+
+        while budget is None or client.requests < budget:
+            match_id = frontier.next_match()
+            summoner = frontier.next_summoner() if match_id is None else None
+
+            if match_id is None and summoner is None:
+                # Fila vazia: termina se ninguém mais pode enfileirar tarefas, senão espera
+                if running == 0:
+                    return
+                await asyncio.sleep(idle_wait)
+                continue
+
+            running += 1
+            try:
+                if match_id is not None:
+                    await process_match(match_id)
+                else:
+                    await process_summoner(*summoner)
+
+            except Exception as e:
+                task = f'match {match_id}' if match_id is not None else f'summoner {summoner[1]}'
+                if isinstance(e, RiotApiError):
+                    logger.error('Descartando %s: %s', task, e)
+                else:
+                    logger.exception('Descartando %s', task)
+
+                if match_id is not None:
+                    frontier.match_done(match_id, failed = True)
+                else:
+                    frontier.summoner_done(summoner[0], failed = True)
+
+            finally:
+                running -= 1
+
+    # Se um worker parar com um erro fora das tarefas (ex.: no SQLite da fronteira), os demais são cancelados
+    # e o erro é repassado; seen é gravado de qualquer forma
+    pool = [asyncio.create_task(worker()) for _ in range(workers or client.concurrency)]
+    try:
+        await asyncio.gather(*pool)
+    finally:
+        for task in pool:
+            task.cancel()
+        await asyncio.gather(*pool, return_exceptions = True)
+        seen.flush()
+
+    return seen
+
+
+async def crawl_match_rows(api_key, summoner_names, champion_roles, region = 'br1', n = 10, cache = None, seen = None,
+                           **kwargs):
+    '''
+     Atalho para o loop do notebook de extração: faz o crawl das partidas dos summoner_names e retorna
+     o DataFrame de partidas (mesmas colunas de helper.create_match_row). Com um cache.MatchCache, as
+     respostas cruas ficam guardadas e podem ser reprocessadas depois com cache.replay_match_rows. Com um
+     match_index.SeenMatches persistente, partidas vistas em crawls anteriores não são buscadas de novo.
+
+     Os demais kwargs são repassados ao RiotClient (limits, concurrency, base_url, ...). No Jupyter,
+     que já possui um event loop rodando, use: all_matches = await crawl_match_rows(...)
+    '''
+    timelines = []
+    game_infos = []
+
+    def collect(game_info, timeline):
+        game_infos.append(game_info)
+        timelines.append(timeline)
+
+    async with RiotClient(api_key, region = region, **kwargs) as client:
+        await crawl(client, summoner_names, collect, seen = seen, cache = cache)
+
+    return extract_match_rows(timelines, game_infos, champion_roles, n = n)
+
+
+async def crawl_to_sink(api_key, summoner_names, champion_roles, sink, region = 'br1', n = 10, cache = None, seen = None,
+                        **kwargs):
+    '''
+     Versão em streaming de crawl_match_rows: as partidas são extraídas em blocos de sink.batch_size e
+     gravadas no sink (sink.MatchRowSink), então a memória fica constante durante todo o crawl.
+
+     Sem seen, o índice de partidas vistas é montado a partir do que já está gravado no sink, de forma
+     que um crawl interrompido retoma do último lote gravado sem buscar as mesmas partidas de novo. Os ids
+     só entram em seen depois que as linhas das partidas foram gravadas no disco.
+
+     A função retorna o número de linhas gravadas no sink.
+    '''
+    if seen is None:
+        seen = SeenMatches()
+        seen.update(sink.game_ids())
+
+    pending = []
+
+    def write_pending():
+        if pending:
+            sink.write(extract_match_rows([t for _, t in pending], [g for g, _ in pending], champion_roles, n = n))
+            sink.flush()
+            seen.update(game_info['gameId'] for game_info, _ in pending)
+            pending.clear()
+
+    def collect(game_info, timeline):
+        pending.append((game_info, timeline))
+        if len(pending) >= sink.batch_size:
+            write_pending()
+
+    async with RiotClient(api_key, region = region, **kwargs) as client:
+        await crawl(client, summoner_names, collect, seen = seen, cache = cache, mark_seen = False)
+
+    write_pending()
+    seen.flush()
+
+    return len(sink)
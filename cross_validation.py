@@ -0,0 +1,202 @@
+# Cross-validation em paralelo dos modelos do notebook de modelagem, com as matrizes e os folds gravados uma única vez
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import is_classifier
+from sklearn.linear_model import LogisticRegression, RidgeClassifier
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.svm import LinearSVC, LinearSVR
+
+# Modelos lineares do notebook, com o max_iter usado em fit_linear_classifiers: {nome: (classe, parâmetros)}. O
+# LinearSVR é um regressor: a acurácia dele é a das previsões arredondadas em 0.5 (ver _accuracy)
+LINEAR_MODELS = {'LogisticRegression': (LogisticRegression, {'max_iter': 2000}),
+                 'LinearSVC': (LinearSVC, {'max_iter': 100000}),
+                 'RidgeClassifier': (RidgeClassifier, {'max_iter': 2000}),
+                 'LinearSVR': (LinearSVR, {'max_iter': 100000})}
+
+# Linhas da tabela de scores com fold FULL_FIT: modelo treinado no set de treino inteiro (acurácia de treino e de validação)
+FULL_FIT = -1
+
+
+class FoldCache:
+    '''
+     Diretório com as matrizes de cada variante do dataset e os índices dos folds, gravados uma única vez por add:
+
+       {nome}/X.npy (denso) ou X_data.npy / X_indices.npy / X_indptr.npy (CSR), y.npy
+       {nome}/folds.npz: índices de treino/validação (train_test_split do notebook) e dos k folds do set de treino
+
+     Os arrays são abertos com memory-map, então os processos do run_cv leem as mesmas páginas sem copiar o
+     dataset para cada job.
+    '''
+    def __init__(self, directory = 'data/cv'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok = True)
+
+    def _path(self, name, filename):
+        return os.path.join(self.directory, name, filename)
+
+    def names(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.exists(self._path(name, 'meta.json')))
+
+    def __contains__(self, name):
+        return os.path.exists(self._path(name, 'meta.json'))
+
+    def add(self, name, X, y, cv = 10, random_state = 42, overwrite = False):
+        '''
+         Grava a variante name (X denso ou esparso, y) com o split treino/validação do notebook
+         (train_test_split com random_state) e os cv folds estratificados do set de treino (os mesmos do
+         cross_val_score de um classificador).
+        '''
+        if name in self and not overwrite:
+            return
+
+        os.makedirs(os.path.join(self.directory, name), exist_ok = True)
+        y = np.asarray(y)
+
+        if sp.issparse(X):
+            X = sp.csr_matrix(X)
+            for part in ('data', 'indices', 'indptr'):
+                np.save(self._path(name, f'X_{part}.npy'), getattr(X, part))
+        else:
+            np.save(self._path(name, 'X.npy'), np.ascontiguousarray(X, dtype = np.float64))
+        np.save(self._path(name, 'y.npy'), y)
+
+        train, val = train_test_split(np.arange(len(y)), random_state = random_state)
+        folds = {'train': train, 'val': val}
+        for k, (fold_train, fold_test) in enumerate(StratifiedKFold(n_splits = cv).split(train, y[train])):
+            folds[f'train_{k}'] = train[fold_train]
+            folds[f'test_{k}'] = train[fold_test]
+        np.savez(self._path(name, 'folds.npz'), **folds)
+
+        # meta.json por último: a variante só aparece em names depois de gravada por inteiro
+        with open(self._path(name, 'meta.json'), 'w') as f:
+            json.dump({'sparse': sp.issparse(X), 'shape': list(X.shape), 'cv': cv}, f)
+
+    def load(self, name):
+        '''
+         Retorna (X, y, folds) da variante name, com os arrays em memory-map.
+        '''
+        with open(self._path(name, 'meta.json')) as f:
+            meta = json.load(f)
+
+        if meta['sparse']:
+            parts = [np.load(self._path(name, f'X_{part}.npy'), mmap_mode = 'r') for part in ('data', 'indices', 'indptr')]
+            X = sp.csr_matrix(tuple(parts), shape = tuple(meta['shape']), copy = False)
+        else:
+            X = np.load(self._path(name, 'X.npy'), mmap_mode = 'r')
+
+        y = np.load(self._path(name, 'y.npy'), mmap_mode = 'r')
+        with np.load(self._path(name, 'folds.npz')) as folds:
+            folds = dict(folds)
+
+        return X, y, folds
+
+    def n_folds(self, name):
+        with open(self._path(name, 'meta.json')) as f:
+            return json.load(f)['cv']
+
+
+# Variantes já abertas em cada processo worker
+_worker = {}
+
+
+def _init_worker(directory):
+    _worker['cache'] = FoldCache(directory)
+    _worker['datasets'] = {}
+
+
+def _accuracy(clf, X, y):
+    # Regressores (LinearSVR) retornariam o R² no score: a previsão é arredondada para a classe mais próxima
+    if is_classifier(clf):
+        return clf.score(X, y)
+    return float(np.mean((np.asarray(clf.predict(X)) >= 0.5) == y))
+
+
+def _fit_job(dataset, model_name, model, params, fold, trace_memory = True):
+    '''
+     Roda no worker: treina um modelo em um fold e retorna uma linha da tabela de scores, com o tempo de fit
+     e o pico de memória alocada durante o fit.
+
+     O tracemalloc deixa o fit bem mais lento, então o tempo vem de um fit sem rastreamento e, com
+     trace_memory, o pico vem de um segundo fit rastreado (peak_mb fica NaN sem trace_memory). O pico conta as
+     alocações do Python e do NumPy (cópias do X, matrizes do solver do sklearn), mas não as feitas dentro de
+     bibliotecas nativas (liblinear, LightGBM, CatBoost).
+    '''
+    if dataset not in _worker['datasets']:
+        _worker['datasets'][dataset] = _worker['cache'].load(dataset)
+    X, y, folds = _worker['datasets'][dataset]
+
+    if fold == FULL_FIT:
+        train, test = folds['train'], folds['val']
+    else:
+        train, test = folds[f'train_{fold}'], folds[f'test_{fold}']
+
+    X_train, y_train = X[train], y[train]
+
+    start = time.perf_counter()
+    clf = model(**params).fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    peak = np.nan
+    if trace_memory:
+        tracemalloc.start()
+        model(**params).fit(X_train, y_train)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {'data': dataset, 'model': model_name, 'fold': fold,
+            'train_score': _accuracy(clf, X_train, y_train), 'test_score': _accuracy(clf, X[test], y[test]),
+            'fit_seconds': fit_seconds, 'peak_mb': peak / 1024 ** 2}
+
+
+def run_cv(cache, models = None, datasets = None, n_jobs = None, trace_memory = True):
+    '''
+     Essa função toma como parâmetro obrigatório um FoldCache e, como parâmetros não obrigatórios, os modelos
+     ({nome: (classe, parâmetros)}, padrão: LINEAR_MODELS - modelos de boosting como o LGBMClassifier e o
+     CatBoostClassifier entram do mesmo jeito), as variantes (padrão: todas do cache) e o número de processos.
+
+     Cada job (variante, modelo, fold) roda em um processo do pool; além dos k folds, cada par (variante, modelo)
+     tem um job FULL_FIT, treinado no set de treino inteiro (a "training accuracy" do notebook). Com
+     trace_memory, cada job faz um segundo fit para medir o pico de memória (ver _fit_job).
+
+     A função retorna a tabela de scores, com uma linha por job: data, model, fold, train_score, test_score,
+     fit_seconds e peak_mb.
+    '''
+    models = models or LINEAR_MODELS
+    datasets = datasets or cache.names()
+
+    jobs = [(dataset, model_name, model, params, fold, trace_memory)
+            for dataset in datasets
+            for model_name, (model, params) in models.items()
+            for fold in [FULL_FIT] + list(range(cache.n_folds(dataset)))]
+
+    rows = []
+    with ProcessPoolExecutor(max_workers = n_jobs, initializer = _init_worker, initargs = (cache.directory,)) as executor:
+        for future in as_completed([executor.submit(_fit_job, *job) for job in jobs]):
+            rows.append(future.result())
+
+    return pd.DataFrame(rows).sort_values(['data', 'model', 'fold']).reset_index(drop = True)
+
+
+def summarize_scores(scores):
+    '''
+     Resume a tabela de run_cv no formato do fit_linear_classifiers: média e desvio da acurácia nos folds,
+     acurácia de treino (FULL_FIT), e o tempo total e o pico de memória dos fits, por (variante, modelo).
+    '''
+    folds = scores[scores['fold'] != FULL_FIT].groupby(['data', 'model'])
+    full = scores[scores['fold'] == FULL_FIT].set_index(['data', 'model'])
+
+    summary = pd.DataFrame({'cv mean accuracy': folds['test_score'].mean(),
+                            'cv std accuracy': folds['test_score'].std(ddof = 0),
+                            'training accuracy': full['train_score'],
+                            'validation accuracy': full['test_score'],
+                            'fit seconds': scores.groupby(['data', 'model'])['fit_seconds'].sum(),
+                            'peak mb': scores.groupby(['data', 'model'])['peak_mb'].max()})
+    return summary
@@ -0,0 +1,291 @@
+# Armazenamento tipado e colunar dos datasets gerados no preprocessing (no lugar dos CSVs)
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import scipy.sparse as sp
+
+from helper import ROLE_COLUMNS
+
+
+def is_champion_column(column):
+    '''
+     Mesma regra dos notebooks: colunas que possuem alguma lane no nome são as de campeões/classes.
+    '''
+    return any(lane in column for lane in ROLE_COLUMNS)
+
+
+# Chave dos metadados do schema Parquet com as colunas category e as suas categorias
+METADATA_KEY = b'dataset_store'
+
+
+def _default_categorical(df):
+    # Colunas de campeões/classes, exceto as já transformadas em one-hot
+    return [column for column in df.columns if is_champion_column(column) and df[column].dtype not in (bool, np.uint8)]
+
+
+def _python_value(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _categories(df, categorical):
+    # {coluna: categorias} das colunas category de df (None: categorias inferidas dos valores no load)
+    return {column: ([_python_value(v) for v in df[column].cat.categories]
+                     if isinstance(df[column].dtype, pd.CategoricalDtype) else None)
+            for column in categorical}
+
+
+def _plain_values(series):
+    # O Parquet não guarda o dtype category de colunas inteiras: grava os valores (Int64 com nulos, para que
+    # todos os blocos de um DatasetWriter tenham o mesmo tipo) e o load refaz o category
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if pd.api.types.is_integer_dtype(series.cat.categories.dtype):
+            return series.astype('Int64')
+        return series.astype(object)
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return series.astype('Int64')
+    return series
+
+
+def _categorical_table(df, categories):
+    df = df.assign(**{column: _plain_values(df[column]) for column in categories})
+    table = pa.Table.from_pandas(df, preserve_index = False)
+
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps({'categorical': categories}).encode()
+    return table.replace_schema_metadata(metadata)
+
+
+def _restore_categorical(df, path):
+    metadata = pq.read_schema(path).metadata or {}
+    if METADATA_KEY not in metadata:
+        return df
+
+    for column, categories in json.loads(metadata[METADATA_KEY])['categorical'].items():
+        if column in df.columns:
+            if categories is None:
+                # Lista de valores Python: colunas Int64 voltam com categorias int64, como antes de gravadas
+                categories = sorted(_python_value(v) for v in df[column].dropna().unique())
+            df[column] = pd.Categorical(df[column], categories = pd.Index(categories))
+    return df
+
+
+def _columns_csr(df, columns):
+    # Colunas one-hot de df (bool/uint8) como CSR, coluna a coluna, sem copiar o bloco denso inteiro
+    rows = [np.flatnonzero(df[column].to_numpy()) for column in columns]
+    cols = [np.full(len(r), j, dtype = np.int64) for j, r in enumerate(rows)]
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype = np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype = np.int64)
+    return sp.csr_matrix((np.ones(len(rows), dtype = np.uint8), (rows, cols)), shape = (len(df), len(columns)))
+
+
+class DatasetStore:
+    '''
+     Guarda as variantes do dataset (df_boosted, df_linear, df_linear_sparse, ...) em directory.
+
+     save grava um DataFrame em Parquet, com as colunas de campeões como category (os valores vão para o
+     Parquet e as colunas/categorias para os metadados do schema; load refaz o dtype). save_sparse monta o
+     one-hot das colunas de campeões/classes direto dos códigos (preprocessing.one_hot_csr) em uma matriz CSR
+     (.npz do SciPy) e grava o resto em Parquet, sem nunca materializar o bloco one-hot denso.
+
+     load lê apenas as columns pedidas (projeção de colunas) e usa memory-map nos arquivos Parquet.
+    '''
+    def __init__(self, directory = 'data/datasets'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok = True)
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, f'{name}{suffix}')
+
+    def names(self):
+        return sorted(f[:-len('.parquet')] for f in os.listdir(self.directory) if f.endswith('.parquet'))
+
+    def is_sparse(self, name):
+        return os.path.exists(self._path(name, '.sparse.npz'))
+
+    def save(self, name, df, categorical = None):
+        '''
+         Grava df em Parquet. categorical é a lista de colunas salvas como category (padrão: colunas de campeões,
+         exceto as já transformadas em one-hot).
+        '''
+        if categorical is None:
+            categorical = _default_categorical(df)
+
+        pq.write_table(_categorical_table(df, _categories(df, categorical)), self._path(name, '.parquet'))
+
+        # Uma variante densa regravada não pode manter um bloco esparso antigo
+        if self.is_sparse(name):
+            os.remove(self._path(name, '.sparse.npz'))
+            os.remove(self._path(name, '.sparse.json'))
+
+    def save_sparse(self, name, df, vocabularies = None, sparse_columns = None):
+        '''
+         Grava df separando o one-hot em uma matriz CSR. As colunas de vocabularies ({coluna: valores}, ex.:
+         PreprocessingState.vocabularies) viram one-hot direto dos códigos, com preprocessing.one_hot_csr (colunas
+         {coluna}_{valor} no fim, como no pd.get_dummies), sem nunca densificar. Colunas que já são one-hot
+         (sparse_columns, padrão: colunas bool/uint8) também vão para a matriz.
+        '''
+        # Import local: preprocessing importa dataset_store
+        from preprocessing import one_hot_csr
+
+        vocabularies = vocabularies or {}
+        if sparse_columns is None:
+            sparse_columns = [column for column in df.columns if df[column].dtype in (bool, np.uint8)
+                              and column not in ('gameID', 'isWinner_blue') and column not in vocabularies]
+
+        one_hot, one_hot_names = one_hot_csr(df, list(vocabularies), vocabularies)
+        matrix = sp.hstack([_columns_csr(df, sparse_columns), one_hot], format = 'csr')
+
+        skip = set(sparse_columns) | set(vocabularies)
+        dense_columns = [column for column in df.columns if column not in skip]
+        order = [column for column in df.columns if column not in vocabularies] + one_hot_names
+
+        sp.save_npz(self._path(name, '.sparse.npz'), matrix)
+        with open(self._path(name, '.sparse.json'), 'w') as f:
+            json.dump({'columns': list(sparse_columns) + one_hot_names, 'order': order}, f)
+
+        pq.write_table(pa.Table.from_pandas(df[dense_columns], preserve_index = False), self._path(name, '.parquet'))
+
+    def load(self, name, columns = None):
+        '''
+         Lê a variante name como DataFrame (apenas as columns pedidas, quando informadas). Nas variantes
+         esparsas as colunas one-hot voltam como SparseDtype, na ordem original.
+        '''
+        path = self._path(name, '.parquet')
+        if not self.is_sparse(name):
+            df = pq.read_table(path, columns = columns, memory_map = True).to_pandas()
+            return _restore_categorical(df, path)
+
+        with open(self._path(name, '.sparse.json')) as f:
+            meta = json.load(f)
+
+        columns = columns or meta['order']
+        sparse_columns = [c for c in meta['columns'] if c in set(columns)]
+        dense_columns = [c for c in columns if c not in set(meta['columns'])]
+
+        df = _restore_categorical(pq.read_table(path, columns = dense_columns, memory_map = True).to_pandas(), path)
+
+        if sparse_columns:
+            matrix = sp.load_npz(self._path(name, '.sparse.npz')).tocsc()
+            position = {c: j for j, c in enumerate(meta['columns'])}
+            index = [position[c] for c in sparse_columns]
+            one_hot = pd.DataFrame.sparse.from_spmatrix(matrix[:, index], columns = sparse_columns)
+            df = pd.concat([df, one_hot], axis = 1)
+
+        return df[columns]
+
+    def load_sparse(self, name, target = 'isWinner_blue', drop = ('gameID',)):
+        '''
+         Lê a variante esparsa name já no formato dos modelos lineares: retorna (X, y, feature_names), em que
+         X é uma matriz CSR com o bloco denso seguido do bloco one-hot, sem densificar as colunas one-hot.
+         Variantes gravadas com save (sem bloco esparso) também são aceitas: todas as colunas vão para X.
+        '''
+        table = pq.read_table(self._path(name, '.parquet'), memory_map = True)
+        dense_columns = [c for c in table.column_names if c != target and c not in drop]
+
+        y = table.column(target).to_numpy()
+        dense = np.column_stack([table.column(c).to_numpy().astype(np.float64) for c in dense_columns])
+
+        if not self.is_sparse(name):
+            return sp.csr_matrix(dense), y, dense_columns
+
+        with open(self._path(name, '.sparse.json')) as f:
+            meta = json.load(f)
+
+        one_hot = sp.load_npz(self._path(name, '.sparse.npz'))
+
+        X = sp.hstack([sp.csr_matrix(dense), one_hot], format = 'csr')
+        return X, y, dense_columns + meta['columns']
+
+    def writer(self, name, sparse_columns = None):
+        '''
+         Retorna um DatasetWriter para gravar a variante name em blocos (ver DatasetWriter).
+        '''
+        return DatasetWriter(self, name, sparse_columns)
+
+
+class DatasetWriter:
+    '''
+     Grava uma variante do dataset em blocos, para pipelines que não cabem na memória: cada write adiciona
+     um row group ao Parquet. As colunas category são as mesmas do save, com as categorias do primeiro bloco.
+     Com sparse_columns (nomes das colunas one-hot), cada write também recebe o bloco CSR correspondente, e a
+     matriz .npz é montada no close a partir dos blocos esparsos (a memória usada é proporcional aos valores
+     não-nulos, não ao número de colunas one-hot).
+
+     Os arquivos só substituem a variante anterior no close. Se o bloco with terminar com uma exceção, os
+     arquivos temporários são apagados (abort) e a variante anterior continua intacta.
+    '''
+    def __init__(self, store, name, sparse_columns = None):
+        self.store = store
+        self.name = name
+        self.sparse_columns = sparse_columns
+        self.rows = 0
+
+        self._tmp_path = store._path(name, '.parquet.tmp')
+        self._writer = None
+        self._blocks = []
+        self._order = None
+        self._categories = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, df, one_hot = None):
+        if self._categories is None:
+            self._categories = _categories(df, _default_categorical(df))
+        table = _categorical_table(df, self._categories)
+
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._tmp_path, table.schema)
+            self._order = list(df.columns) + list(self.sparse_columns or [])
+        elif table.schema != self._writer.schema:
+            table = table.cast(self._writer.schema)
+
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+        if self.sparse_columns is not None:
+            self._blocks.append(sp.csr_matrix(one_hot, dtype = np.uint8))
+
+    def close(self):
+        if self._writer is None:
+            return
+
+        self._writer.close()
+        self._writer = None
+
+        if self.sparse_columns is None:
+            if self.store.is_sparse(self.name):
+                os.remove(self.store._path(self.name, '.sparse.npz'))
+                os.remove(self.store._path(self.name, '.sparse.json'))
+        else:
+            tmp_npz = self.store._path(self.name, '.sparse.tmp.npz')
+            sp.save_npz(tmp_npz, sp.vstack(self._blocks, format = 'csr'))
+            os.replace(tmp_npz, self.store._path(self.name, '.sparse.npz'))
+            with open(self.store._path(self.name, '.sparse.json'), 'w') as f:
+                json.dump({'columns': list(self.sparse_columns), 'order': self._order}, f)
+            self._blocks = []
+
+        os.replace(self._tmp_path, self.store._path(self.name, '.parquet'))
+
+    def abort(self):
+        '''
+         Descarta o que foi gravado (usado quando um bloco falha no meio): a variante anterior continua intacta.
+        '''
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._blocks = []
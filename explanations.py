@@ -0,0 +1,241 @@
+# Valores SHAP dos modelos finais: TreeSHAP em blocos em um pool de processos, com cache em disco por hash do modelo
+# e versão do dataset, e explicações por partida (features que mais contribuíram) junto com cada previsão
+import hashlib
+import json
+import os
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def _booster(model):
+    # lgbm.Booster ou o booster_ de um LGBMClassifier treinado
+    booster = getattr(model, 'booster_', model)
+    return booster if hasattr(booster, 'model_to_string') else None
+
+
+def _is_catboost(model):
+    return hasattr(model, 'get_feature_importance') and hasattr(model, 'get_cat_feature_indices')
+
+
+def _is_linear(model):
+    coef = getattr(model, 'coef_', None)
+    return coef is not None and np.ndim(coef) == 2 and len(coef) == 1
+
+
+def catboost_pool(model, X):
+    '''
+     Pool do CatBoost com as features de X (matriz na ordem do treino), com a mesma conversão de
+     tuning.SharedSplit: colunas categóricas do CatBoost precisam ser inteiras (NaN vira -1).
+    '''
+    import catboost
+
+    # Colunas com os nomes do treino: o CatBoost recusa um Pool cujos nomes não batem com os do modelo
+    cat_features = model.get_cat_feature_indices()
+    df = pd.DataFrame(np.asarray(X), columns = model.feature_names_)
+    for j in cat_features:
+        column = model.feature_names_[j]
+        df[column] = df[column].fillna(-1).astype(np.int64)
+    return catboost.Pool(df, cat_features = cat_features)
+
+
+def contributions(model, X, background_mean = None, threads = None):
+    '''
+     Contribuições SHAP de cada feature para cada linha de X, na escala da margem do modelo (log-odds): retorna
+     um array (n, n_features + 1) em que a última coluna é o valor base - a soma de cada linha é a margem
+     prevista, o mesmo formato do pred_contrib do LightGBM e do ShapValues do CatBoost.
+
+       - LightGBM (Booster ou LGBMClassifier) e CatBoost: TreeSHAP exato das próprias bibliotecas;
+       - modelos lineares do sklearn (coef_): o mesmo cálculo do shap.LinearExplainer (perturbação
+         intervencional), coef * (x - background_mean), que precisa da média das features no treino.
+
+     threads limita as threads de cada chamada (os workers de shap_values usam 1).
+    '''
+    booster = _booster(model)
+    if booster is not None:
+        X = X.toarray() if sp.issparse(X) else np.asarray(X, dtype = np.float64)
+        kwargs = {'num_threads': threads} if threads else {}
+        return np.asarray(booster.predict(X, pred_contrib = True, **kwargs))
+
+    if _is_catboost(model):
+        return np.asarray(model.get_feature_importance(catboost_pool(model, X), type = 'ShapValues',
+                                                       thread_count = threads or -1))
+
+    if _is_linear(model):
+        if background_mean is None:
+            raise ValueError('modelos lineares precisam de background_mean (média das features no set de treino)')
+
+        coef = np.asarray(model.coef_[0], dtype = np.float64)
+        background_mean = np.asarray(background_mean, dtype = np.float64)
+        X = X.toarray() if sp.issparse(X) else np.asarray(X, dtype = np.float64)
+
+        out = np.empty((X.shape[0], X.shape[1] + 1))
+        out[:, :-1] = (X - background_mean) * coef
+        out[:, -1] = background_mean @ coef + np.ravel(model.intercept_)[0]
+        return out
+
+    raise TypeError(f'modelo {type(model).__name__} não suportado (LightGBM, CatBoost ou linear do sklearn)')
+
+
+def model_hash(model, background_mean = None):
+    '''
+     Hash do modelo treinado (e do background_mean, que muda os valores dos modelos lineares): o texto do
+     modelo no LightGBM e o pickle nos demais.
+    '''
+    booster = _booster(model)
+    h = hashlib.sha1(booster.model_to_string().encode() if booster is not None else pickle.dumps(model, protocol = 4))
+    if background_mean is not None:
+        h.update(np.ascontiguousarray(background_mean, dtype = np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def dataset_version(X):
+    '''
+     Versão de um dataset pelo conteúdo (hash dos valores e do shape de X, denso ou CSR).
+    '''
+    h = hashlib.sha1(str(X.shape).encode())
+    parts = (X.data, X.indices, X.indptr) if sp.issparse(X) else (np.ascontiguousarray(X),)
+    for part in parts:
+        h.update(np.ascontiguousarray(part).view(np.uint8))
+    return h.hexdigest()[:16]
+
+
+class ShapCache:
+    '''
+     Matrizes SHAP gravadas em directory/{hash do modelo}/{versão do dataset}.npy (formato de contributions), com
+     um .json ao lado (feature_names e shape). A matriz é gravada com um nome temporário e só renomeada no
+     final, então uma execução interrompida nunca aparece como entrada do cache. load abre com memory-map.
+    '''
+    def __init__(self, directory = 'data/shap'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok = True)
+
+    def _path(self, model_key, version, suffix):
+        return os.path.join(self.directory, model_key, f'{version}{suffix}')
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(*key, '.npy'))
+
+    def load(self, model_key, version):
+        return np.load(self._path(model_key, version, '.npy'), mmap_mode = 'r')
+
+    def feature_names(self, model_key, version):
+        with open(self._path(model_key, version, '.json')) as f:
+            return json.load(f)['feature_names']
+
+    def create(self, model_key, version, shape, feature_names = None):
+        '''
+         Abre uma matriz nova (memory-map em um arquivo temporário) para ser preenchida em blocos; commit a
+         publica no cache.
+        '''
+        os.makedirs(os.path.join(self.directory, model_key), exist_ok = True)
+        with open(self._path(model_key, version, '.json'), 'w') as f:
+            json.dump({'feature_names': list(feature_names) if feature_names is not None else None,
+                       'shape': list(shape)}, f)
+        return np.lib.format.open_memmap(self._path(model_key, version, '.npy.tmp'), mode = 'w+', dtype = np.float64,
+                                         shape = shape)
+
+    def commit(self, model_key, version, values):
+        values.flush()
+        os.replace(self._path(model_key, version, '.npy.tmp'), self._path(model_key, version, '.npy'))
+
+
+# Modelo de cada processo worker, carregado uma única vez no initializer
+_worker = {}
+
+
+def _init_worker(model, background_mean):
+    _worker['model'] = model
+    _worker['background_mean'] = background_mean
+
+
+def _contributions_chunk(task):
+    start, X = task
+    return start, contributions(_worker['model'], X, _worker['background_mean'], threads = 1)
+
+
+def shap_values(model, X, version = None, cache = None, feature_names = None, background_mean = None,
+                chunk_size = 2000, workers = None):
+    '''
+     Essa função toma como parâmetros obrigatórios o modelo e a matriz X (densa ou CSR). Como parâmetros não
+     obrigatórios recebe a versão do dataset (padrão: dataset_version(X)), um ShapCache, os nomes das features
+     (gravados junto da matriz), o background_mean dos modelos lineares, o tamanho dos blocos e o número de
+     processos (padrão: os.cpu_count(); 1 calcula no próprio processo).
+
+     Os blocos de chunk_size linhas são calculados em um ProcessPoolExecutor (cada worker com 1 thread), com no
+     máximo 2 blocos por worker em andamento, e escritos direto na matriz de saída - com cache, um memory-map no
+     disco, então a memória fica limitada aos blocos em andamento. Se a matriz de (modelo, versão) já estiver no
+     cache, nada é recalculado.
+
+     A função retorna o array (n, n_features + 1) de contributions (última coluna: valor base).
+    '''
+    model_key = model_hash(model, background_mean)
+    version = version or dataset_version(X)
+
+    if cache is not None and (model_key, version) in cache:
+        return cache.load(model_key, version)
+
+    shape = (X.shape[0], X.shape[1] + 1)
+    out = cache.create(model_key, version, shape, feature_names) if cache is not None else np.empty(shape)
+    chunks = ((start, X[start:start + chunk_size]) for start in range(0, X.shape[0], chunk_size))
+
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for start, chunk in chunks:
+            out[start:start + chunk.shape[0]] = contributions(model, chunk, background_mean)
+    else:
+        with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                                 initargs = (model, background_mean)) as executor:
+            pending = deque()
+
+            for chunk in chunks:
+                pending.append(executor.submit(_contributions_chunk, chunk))
+
+                if len(pending) >= 2 * workers:
+                    start, values = pending.popleft().result()
+                    out[start:start + len(values)] = values
+
+            while pending:
+                start, values = pending.popleft().result()
+                out[start:start + len(values)] = values
+
+    if cache is None:
+        return out
+
+    cache.commit(model_key, version, out)
+    return cache.load(model_key, version)
+
+
+def top_contributions(values, X, feature_names, top_k = 5):
+    '''
+     Explicação de cada linha: as top_k features com maior contribuição absoluta, na ordem. values é a saída de
+     contributions para as linhas de X. Retorna uma lista de {'base_value', 'features': [{'feature', 'value',
+     'contribution'}, ...]}.
+    '''
+    values = np.asarray(values)
+    X = X.toarray() if sp.issparse(X) else np.asarray(X)
+    top_k = min(top_k, values.shape[1] - 1)
+
+    explanations = []
+    for row in range(values.shape[0]):
+        phi = values[row, :-1]
+        top = np.argpartition(-np.abs(phi), top_k - 1)[:top_k] if top_k > 0 else np.array([], dtype = np.int64)
+        top = top[np.argsort(-np.abs(phi[top]))]
+
+        explanations.append({'base_value': float(values[row, -1]),
+                             'features': [{'feature': feature_names[j],
+                                           'value': None if np.isnan(X[row, j]) else float(X[row, j]),
+                                           'contribution': float(phi[j])} for j in top]})
+
+    return explanations
+
+
+def shap_frame(values, feature_names, index = None):
+    '''
+     DataFrame das contribuições (sem a coluna do valor base), para o shap.summary_plot ou análises no notebook.
+    '''
+    return pd.DataFrame(np.asarray(values)[:, :-1], columns = feature_names, index = index)
@@ -0,0 +1,338 @@
+# Export do modelo final e do preprocessing para o scorer compilado (scorer.CompiledScorer), só com NumPy na inferência
+#
+# Uso: python export.py modelo.pkl preprocessing_state.json saida.npz [n_partidas do teste de paridade]
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from champions import load_champions
+from helper import XP_LEVEL_THRESHOLDS, engineered_feature_arrays, match_row_arrays
+from prediction import FeatureEncoder, positive_proba
+from preprocessing import PreprocessingState, is_champion_column
+from scorer import MISSING_NAN, MISSING_NONE, MISSING_ZERO, CompiledScorer
+
+# Versão do formato do .npz, gravada no meta
+FORMAT_VERSION = 1
+
+_MISSING_TYPES = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+
+
+def compile_lightgbm(model):
+    '''
+     Achata as árvores de um lgbm.Booster (ou LGBMClassifier) binário em arrays, a partir do dump_model: um nó
+     por posição, com feature (-1 nas folhas), threshold, filhos, default_left, missing_type, o lado dos NaN
+     (nan_left) e, nos splits categóricos, a linha de category_table com o conjunto de categorias que vai para
+     a esquerda.
+    '''
+    booster = getattr(model, 'booster_', model)
+    dump = booster.dump_model()
+
+    if not dump['objective'].startswith('binary') or dump.get('average_output'):
+        raise ValueError(f"apenas modelos gbdt binários são suportados (objective {dump['objective']!r})")
+
+    objective = dict(part.split(':') for part in dump['objective'].split()[1:])
+
+    nodes = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'default_left', 'missing_type',
+                                   'categorical', 'category_row', 'value')}
+    categories = []
+    roots = []
+    max_depth = 0
+
+    for tree in dump['tree_info']:
+        stack = [(tree['tree_structure'], None, None, 0)]
+
+        while stack:
+            node, parent, side, depth = stack.pop()
+            index = len(nodes['feature'])
+            max_depth = max(max_depth, depth)
+
+            if parent is None:
+                roots.append(index)
+            else:
+                nodes[side][parent] = index
+
+            is_leaf = 'leaf_value' in node
+            categorical = not is_leaf and node['decision_type'] == '=='
+
+            nodes['feature'].append(-1 if is_leaf else node['split_feature'])
+            nodes['threshold'].append(0.0 if is_leaf or categorical else float(node['threshold']))
+            nodes['left'].append(index)
+            nodes['right'].append(index)
+            nodes['default_left'].append(False if is_leaf else bool(node['default_left']))
+            nodes['missing_type'].append(MISSING_NONE if is_leaf else _MISSING_TYPES[node['missing_type']])
+            nodes['categorical'].append(categorical)
+            nodes['category_row'].append(len(categories) if categorical else 0)
+            nodes['value'].append(node['leaf_value'] if is_leaf else 0.0)
+
+            if categorical:
+                categories.append([int(c) for c in str(node['threshold']).split('||')])
+
+            # Pré-ordem: o filho da esquerda sai da pilha primeiro e fica sempre na posição seguinte à do pai
+            if not is_leaf:
+                stack.append((node['right_child'], index, 'right', depth + 1))
+                stack.append((node['left_child'], index, 'left', depth + 1))
+
+    width = max((max(c) for c in categories), default = -1) + 1
+    category_table = np.zeros((max(len(categories), 1), max(width, 1)), dtype = bool)
+    for row, values in enumerate(categories):
+        category_table[row, values] = True
+
+    dtypes = {'feature': np.int32, 'threshold': np.float64, 'left': np.int32, 'right': np.int32,
+              'default_left': bool, 'missing_type': np.uint8, 'categorical': bool, 'category_row': np.int32,
+              'value': np.float64}
+    arrays = {name: np.array(values, dtype = dtypes[name]) for name, values in nodes.items()}
+    arrays.update(roots = np.array(roots, dtype = np.int32), category_table = category_table)
+
+    # Lado dos NaN em cada nó: default_left nos missing_type NaN/Zero, o lado do 0 no None e direita nos categóricos
+    arrays['nan_left'] = np.where(arrays['missing_type'] == MISSING_NONE, arrays['threshold'] >= 0,
+                                  arrays['default_left']) & ~arrays['categorical']
+
+    return arrays, {'kind': 'lightgbm', 'max_depth': max_depth, 'sigmoid': float(objective.get('sigmoid', 1.0))}
+
+
+def compile_catboost(model):
+    '''
+     Arrays das árvores simétricas de um CatBoostClassifier binário treinado só com features numéricas (o
+     JSON do save_model): um split por nível (feature, borda float32, lado dos NaN) e os valores das folhas.
+     Features categóricas usam CTRs calculadas com o hash interno do CatBoost e não são suportadas.
+    '''
+    if len(model.get_cat_feature_indices()):
+        raise ValueError('modelos CatBoost com features categóricas não são suportados (CTRs)')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'model.json')
+        model.save_model(path, format = 'json')
+        with open(path) as f:
+            dump = json.load(f)
+
+    float_features = dump['features_info']['float_features']
+    scale, biases = dump.get('scale_and_bias', [1.0, [0.0]])
+    bias = float(biases[0])
+
+    split_feature, split_border, split_nan_true, split_weight, tree_split = [], [], [], [], []
+    leaf_value, tree_offset = [], []
+
+    for tree in dump['oblivious_trees']:
+        splits = tree.get('splits') or []
+        if not splits:
+            # Árvore sem splits: uma folha só, somada ao bias
+            bias += scale * tree['leaf_values'][0]
+            continue
+
+        tree_split.append(len(split_feature))
+        tree_offset.append(len(leaf_value))
+        leaf_value.extend(tree['leaf_values'])
+
+        for depth, split in enumerate(splits):
+            feature = float_features[split['float_feature_index']]
+            split_feature.append(feature['flat_feature_index'])
+            split_border.append(split['border'])
+            split_nan_true.append(feature.get('nan_value_treatment') == 'AsTrue')
+            split_weight.append(1 << depth)
+
+    arrays = {'split_feature': np.array(split_feature, dtype = np.int64),
+              'split_border': np.array(split_border, dtype = np.float32),
+              'split_nan_true': np.array(split_nan_true, dtype = bool),
+              'split_weight': np.array(split_weight, dtype = np.int64),
+              'tree_split': np.array(tree_split, dtype = np.int64),
+              'tree_offset': np.array(tree_offset, dtype = np.int64),
+              'leaf_value': np.array(leaf_value, dtype = np.float64),
+              'scale': np.array(scale, dtype = np.float64), 'bias': np.array(bias)}
+
+    return arrays, {'kind': 'catboost'}
+
+
+def compile_linear(model):
+    '''
+     Coeficientes e intercepto de um modelo linear binário do sklearn (a probabilidade é a sigmoide da
+     decision_function, como em prediction.positive_proba).
+    '''
+    return ({'coef': np.asarray(model.coef_[0], dtype = np.float64),
+             'intercept': np.array(float(np.ravel(model.intercept_)[0]))}, {'kind': 'linear'})
+
+
+def compile_model(model):
+    if hasattr(getattr(model, 'booster_', model), 'dump_model'):
+        return compile_lightgbm(model)
+
+    if hasattr(model, 'get_cat_feature_indices'):
+        return compile_catboost(model)
+
+    coef = getattr(model, 'coef_', None)
+    if coef is not None and np.ndim(coef) == 2 and len(coef) == 1:
+        return compile_linear(model)
+
+    raise TypeError(f'modelo {type(model).__name__} não suportado (LightGBM, CatBoost ou linear do sklearn)')
+
+
+def _source_column(column):
+    # Colunas de classe (roleTOP_red) saem do campeão da mesma lane (TOP_red)
+    if is_champion_column(column):
+        return column
+
+    if column.startswith('role') and is_champion_column(column[len('role'):]):
+        return column[len('role'):]
+
+    raise ValueError(f'coluna categórica {column!r} não deriva de uma coluna de campeão')
+
+
+def compile_preprocessing(state, feature_names, variant = 'linear'):
+    '''
+     Compila o encoding do prediction.FeatureEncoder em arrays: posições das features numéricas, parâmetros
+     do PowerTransformer (variant 'linear') e, para cada coluna de campeão/classe, uma tabela indexada pelo
+     championId com a posição da coluna one-hot ('linear') ou o código do LabelEncoder ('boosted'), -1 para
+     valores fora das features. As classes vêm da tabela de campeões (champions.json) no momento do export.
+    '''
+    position = {name: j for j, name in enumerate(feature_names)}
+    champions = load_champions()
+
+    vocabulary_ids = [value for vocabulary in state.vocabularies.values() for value in vocabulary
+                      if isinstance(value, (int, np.integer))]
+    size = int(max([champions.ids.max()] + vocabulary_ids)) + 1
+    ids = np.arange(size)
+    classes = champions.classes(ids)
+
+    one_hot = set()
+    sources, tables, categorical_index = [], [], []
+
+    for column, vocabulary in state.vocabularies.items():
+        if variant == 'linear':
+            lookup = {value: position[f'{column}_{value}'] for value in vocabulary if f'{column}_{value}' in position}
+            one_hot.update(lookup.values())
+            j = -1
+        else:
+            if column not in position:
+                continue
+            lookup = {value: code for code, value in enumerate(vocabulary)}
+            j = position[column]
+
+        if not lookup:
+            continue
+
+        source = _source_column(column)
+        values = ids if source == column else classes
+        tables.append(np.array([lookup.get(_python_value(value), -1) for value in values], dtype = np.int32))
+        sources.append(source)
+        categorical_index.append(j)
+
+    numeric = [(name, j) for name, j in position.items() if name not in state.vocabularies and j not in one_hot]
+    power = [(j, *state.power[name]) for name, j in numeric if name in state.power] if variant == 'linear' else []
+    power_index, lambdas, means, scales = (list(values) for values in zip(*power)) if power else ([], [], [], [])
+
+    arrays = {'numeric_index': np.array([j for _, j in numeric], dtype = np.int64),
+              'power_index': np.array(power_index, dtype = np.int64),
+              'power_lambdas': np.array(lambdas, dtype = np.float64),
+              'power_means': np.array(means, dtype = np.float64),
+              'power_scales': np.array(scales, dtype = np.float64),
+              'categorical_tables': np.array(tables, dtype = np.int32).reshape(len(tables), size),
+              'categorical_index': np.array(categorical_index, dtype = np.int64),
+              'xp_level_thresholds': np.asarray(XP_LEVEL_THRESHOLDS)}
+
+    meta = {'variant': variant, 'feature_names': list(feature_names), 'numeric_names': [name for name, _ in numeric],
+            'categorical_sources': sources, 'champions_version': champions.version}
+    return arrays, meta
+
+
+def _python_value(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+def parity_columns(pairs, champion_roles, n = 10):
+    '''
+     Colunas das partidas (game_info, timeline) no formato de entrada do scorer: as de helper.match_row_arrays
+     no frame n mais as de helper.engineered_feature_arrays (o que o MatchPredictor monta antes do encoding).
+    '''
+    columns = match_row_arrays([t for _, t in pairs], [g for g, _ in pairs], champion_roles, cutoffs = [n])[n]
+    columns.update(engineered_feature_arrays(columns))
+    return columns
+
+
+def check_parity(model, state, scorer, columns, atol = 1e-6):
+    '''
+     Teste de paridade: compara a matriz de features e a probabilidade do scorer compilado com as do
+     prediction.FeatureEncoder + modelo original nas mesmas colunas. Retorna {'rows', 'max_feature_diff',
+     'max_proba_diff'} e levanta ValueError se alguma diferença passar de atol.
+    '''
+    X = FeatureEncoder(state, scorer.feature_names, scorer.variant).transform(columns)
+    X_compiled = scorer.transform(columns)
+
+    both_nan = np.isnan(X) & np.isnan(X_compiled)
+    feature_diff = np.where(both_nan, 0.0, np.abs(X - X_compiled))
+    proba_diff = np.abs(positive_proba(model, X) - scorer.predict_proba(X_compiled))
+
+    report = {'rows': len(X),
+              'max_feature_diff': float(np.nan_to_num(feature_diff, nan = np.inf).max(initial = 0.0)),
+              'max_proba_diff': float(proba_diff.max(initial = 0.0))}
+
+    if report['max_feature_diff'] > atol or report['max_proba_diff'] > atol:
+        raise ValueError(f'scorer compilado diverge do modelo original: {report}')
+    return report
+
+
+def export_scorer(model, state, feature_names, path, variant = 'linear', parity = None, atol = 1e-6):
+    '''
+     Essa função toma como parâmetros obrigatórios o modelo final (lgbm.Booster/LGBMClassifier, CatBoostClassifier
+     só com features numéricas ou linear do sklearn), o PreprocessingState, os nomes das features (ordem do
+     treino) e o caminho do .npz. Como parâmetros não obrigatórios recebe o variant do preprocessing e as
+     colunas de partidas para o teste de paridade (ver parity_columns), feito antes de gravar o arquivo.
+
+     O .npz não usa pickle: é carregado por scorer.CompiledScorer.load, que só importa NumPy.
+
+     A função retorna o relatório de check_parity (ou None sem parity).
+    '''
+    model_arrays, model_meta = compile_model(model)
+    arrays, meta = compile_preprocessing(state, feature_names, variant)
+    arrays.update(model_arrays)
+    meta.update(model_meta, format_version = FORMAT_VERSION)
+
+    report = None
+    if parity is not None:
+        report = check_parity(model, state, CompiledScorer(arrays, meta), parity, atol = atol)
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, meta = np.frombuffer(json.dumps(meta).encode(), dtype = np.uint8), **arrays)
+    os.replace(tmp_path, path)
+
+    return report
+
+
+def main(argv):
+    '''
+     Exporta um modelo gravado por prediction.MatchPredictor.save, com o teste de paridade em partidas
+     sintéticas (synthetic.make_matches), e mede o load e o score do arquivo gerado.
+    '''
+    from synthetic import make_champion_roles, make_matches
+
+    model_path, state_path, path = argv[:3]
+    n_matches = int(argv[3]) if len(argv) > 3 else 500
+
+    with open(model_path, 'rb') as f:
+        bundle = pickle.load(f)
+    state = PreprocessingState.load(state_path)
+
+    columns = parity_columns(make_matches(n_matches, seed = 0), make_champion_roles(), n = bundle['n'])
+    report = export_scorer(bundle['model'], state, bundle['feature_names'], path, variant = bundle['variant'],
+                           parity = columns)
+    print(f'{path}: paridade em {report["rows"]} partidas (features {report["max_feature_diff"]:.2e}, '
+          f'probabilidade {report["max_proba_diff"]:.2e})')
+
+    start = time.perf_counter()
+    scorer = CompiledScorer.load(path)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    scorer.score(columns)
+    score_ms = (time.perf_counter() - start) * 1000
+    print(f'load {load_ms:.1f}ms, score de {report["rows"]} partidas {score_ms:.1f}ms')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        sys.exit('Uso: python export.py modelo.pkl preprocessing_state.json saida.npz [n_partidas]')
+    main(sys.argv[1:])
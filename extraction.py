@@ -0,0 +1,210 @@
+# Extração paralela (ProcessPoolExecutor) das linhas de partidas a partir das respostas cruas já guardadas
+import glob
+import gzip
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache import MatchCache
+from helper import MATCH_ROW_COLUMNS, extract_match_rows
+from metrics import METRICS
+from role_cache import RoleCache
+
+logger = logging.getLogger(__name__)
+
+# Estado de cada processo worker (champion_roles, n, conexão com o cache e RoleCache), montado uma única vez no initializer
+_worker = {}
+
+
+def _init_worker(champion_roles, n, cache_path, role_cache_path, metrics_enabled = False):
+    # Os números de cada bloco voltam para o processo principal junto com o resultado (ver _collect); com fork o
+    # worker herda os contadores do processo principal, que não podem voltar somados
+    METRICS.reset()
+    METRICS.enabled = metrics_enabled
+    _worker['champion_roles'] = champion_roles
+    _worker['role_cache'] = RoleCache(champion_roles, path = role_cache_path)
+    _worker['n'] = n
+    _worker['cache'] = MatchCache(cache_path) if cache_path is not None else None
+
+
+def _read_json(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding = 'utf-8') as f:
+        return json.load(f)
+
+
+def _load_pairs(kind, items):
+    '''
+     Carrega os pares (game_info, timeline) de uma tarefa. Partidas que não puderem ser lidas entram na
+     lista de falhas como (gameId, erro).
+    '''
+    pairs, failures = [], []
+
+    for item in items:
+        try:
+            if kind == 'cache':
+                match = _worker['cache'].load_match(*item)
+                if match is None:
+                    raise KeyError(f'partida {item} não está completa no cache')
+                pairs.append(match)
+            elif kind == 'files':
+                pairs.append((_read_json(item[0]), _read_json(item[2])))
+            else:
+                pairs.append(item)
+
+        except Exception as e:
+            failures.append((item[1] if kind != 'pairs' else None, repr(e)))
+
+    return pairs, failures
+
+
+def _to_block(match_rows):
+    return match_rows.to_numpy(dtype = np.int64)
+
+
+def _extract_chunk(task):
+    '''
+     Roda no worker: extrai as linhas de um bloco de partidas e retorna (block, failures, metrics), em que block
+     é um array int64 (n_partidas, len(MATCH_ROW_COLUMNS)) - bem mais barato de serializar que um DataFrame - e
+     metrics o snapshot do metrics.METRICS do worker durante o bloco.
+
+     Se a extração do bloco inteiro falhar, as partidas são extraídas uma a uma para isolar as que falharam.
+    '''
+    kind, items = task
+    with METRICS.timer('load_pairs'):
+        pairs, failures = _load_pairs(kind, items)
+    champion_roles, n, role_cache = _worker['champion_roles'], _worker['n'], _worker['role_cache']
+
+    try:
+        rows = extract_match_rows([t for _, t in pairs], [g for g, _ in pairs], champion_roles, n = n,
+                                  role_cache = role_cache)
+        return _to_block(rows), failures, METRICS.drain()
+
+    except Exception:
+        blocks = []
+        for game_info, timeline in pairs:
+            try:
+                blocks.append(_to_block(extract_match_rows([timeline], [game_info], champion_roles, n = n,
+                                                            role_cache = role_cache)))
+            except Exception as e:
+                failures.append((game_info.get('gameId'), repr(e)))
+
+    block = np.concatenate(blocks) if blocks else np.empty((0, len(MATCH_ROW_COLUMNS)), dtype = np.int64)
+    return block, failures, METRICS.drain()
+
+
+def _chunked(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def _directory_items(directory):
+    '''
+     Pares de arquivos <gameId>.match.json / <gameId>.timeline.json (opcionalmente .gz) de directory.
+    '''
+    for match_path in sorted(glob.glob(os.path.join(directory, '*.match.json*'))):
+        game_id = os.path.basename(match_path).split('.match.json')[0]
+
+        for suffix in ('', '.gz'):
+            timeline_path = os.path.join(directory, f'{game_id}.timeline.json{suffix}')
+            if os.path.exists(timeline_path):
+                yield (match_path, int(game_id), timeline_path)
+                break
+
+
+def _tasks(source, region, chunk_size):
+    '''
+     Retorna (cache_path, tarefas): no cache e nos diretórios os workers recebem apenas as chaves e leem
+     o JSON cru eles mesmos; pares em memória são enviados aos workers em blocos.
+    '''
+    if isinstance(source, MatchCache):
+        source = source.path
+
+    if isinstance(source, str) and os.path.isdir(source):
+        return None, (('files', chunk) for chunk in _chunked(_directory_items(source), chunk_size))
+
+    if isinstance(source, str):
+        with MatchCache(source) as cache:
+            keys = cache.keys(region)
+        return source, (('cache', chunk) for chunk in _chunked(keys, chunk_size))
+
+    return None, (('pairs', chunk) for chunk in _chunked(source, chunk_size))
+
+
+def to_match_rows(block):
+    '''
+     Converte um bloco retornado pelos workers no DataFrame de partidas (colunas de MATCH_ROW_COLUMNS).
+    '''
+    return pd.DataFrame(block, columns = MATCH_ROW_COLUMNS).astype({'isWinner_blue': bool})
+
+
+def _collect(future):
+    block, failures, metrics = future.result()
+    METRICS.merge(metrics)
+    METRICS.count('extraction_failures', len(failures))
+
+    for game_id, error in failures:
+        logger.error('Falha ao extrair a partida %s: %s', game_id, error)
+
+    return to_match_rows(block)
+
+
+def iter_match_row_blocks(source, champion_roles, n = 10, workers = None, chunk_size = 256, region = None,
+                          role_cache_path = None):
+    '''
+     Essa função toma como parâmetros obrigatórios a origem das partidas e o objeto champion_roles. source pode ser:
+       - um cache.MatchCache (ou o caminho do arquivo SQLite), filtrado por region quando informada;
+       - um diretório com os arquivos <gameId>.match.json e <gameId>.timeline.json (ou .json.gz);
+       - qualquer iterável de pares (game_info, timeline).
+
+     A extração (helper.extract_match_rows) roda em workers (padrão: os.cpu_count()) de um ProcessPoolExecutor,
+     em blocos de chunk_size partidas, e no máximo 2 blocos por worker ficam em andamento para limitar a memória.
+     Partidas que falharem (JSON inválido, DTO incompleto, ...) são logadas e descartadas sem interromper o lote.
+     Cada worker mantém um role_cache.RoleCache entre os blocos; com role_cache_path, as roles resolvidas
+     ficam em um arquivo SQLite compartilhado pelos workers (e pelas próximas execuções).
+
+     Com metrics.METRICS ligado, os timers e contadores dos workers são somados aos do processo principal.
+
+     A função é um gerador de DataFrames (um por bloco, na ordem da origem), que podem ir direto para um
+     sink.MatchRowSink.
+    '''
+    workers = workers or os.cpu_count()
+    cache_path, tasks = _tasks(source, region, chunk_size)
+
+    with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                             initargs = (champion_roles, n, cache_path, role_cache_path, METRICS.enabled)) as executor:
+        pending = deque()
+
+        for task in tasks:
+            pending.append(executor.submit(_extract_chunk, task))
+
+            if len(pending) >= 2 * workers:
+                yield _collect(pending.popleft())
+
+        while pending:
+            yield _collect(pending.popleft())
+
+
+def extract_parallel(source, champion_roles, n = 10, workers = None, chunk_size = 256, region = None,
+                     role_cache_path = None):
+    '''
+     Versão de iter_match_row_blocks que retorna um único DataFrame com todas as partidas extraídas.
+    '''
+    blocks = list(iter_match_row_blocks(source, champion_roles, n = n, workers = workers, chunk_size = chunk_size,
+                                        region = region, role_cache_path = role_cache_path))
+    if not blocks:
+        return to_match_rows(np.empty((0, len(MATCH_ROW_COLUMNS)), dtype = np.int64))
+
+    return pd.concat(blocks, ignore_index = True)
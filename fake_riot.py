@@ -0,0 +1,144 @@
+# Servidor HTTP local que imita os endpoints da Riot usados pelo crawler, para rodar sem internet
+#
+# Uso: python fake_riot.py [porta]  ->  RiotClient(..., base_url = 'http://127.0.0.1:porta')
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+
+from aiohttp import web
+
+from synthetic import make_game_info, make_timeline
+
+
+class FakeRiotServer:
+    '''
+     Servidor com n_summoners summoners e n_matches partidas sintéticas. Cada summoner jogou
+     matches_per_summoner partidas sorteadas, então várias partidas se repetem entre summoners
+     (como no high elo). Os participantIdentities de cada partida trazem os summoners (até 10) em cujo
+     matchlist ela aparece.
+
+     O servidor aplica os próprios limites (limits, no formato de crawler.DEV_KEY_LIMITS), respondendo
+     429 com Retry-After quando estourados, e responde 503 em uma fração error_rate das requisições.
+     Os contadores requests, rate_limited e server_errors permitem checar o comportamento do cliente.
+    '''
+    def __init__(self, n_summoners = 20, n_matches = 100, matches_per_summoner = 15, limits = None,
+                 error_rate = 0.0, latency = 0.0, seed = 0):
+        rng = random.Random(seed)
+
+        self.summoners = {f'summoner{i}': {'id': f'sum-{i}', 'accountId': f'acc-{i}', 'name': f'summoner{i}'}
+                          for i in range(n_summoners)}
+        self.game_ids = [2200000000 + k for k in range(n_matches)]
+        self._known_games = set(self.game_ids)
+        self.matchlists = {s['accountId']: rng.sample(self.game_ids, min(matches_per_summoner, n_matches))
+                           for s in self.summoners.values()}
+        self.players = {game_id: [] for game_id in self.game_ids}
+        for s in self.summoners.values():
+            for game_id in self.matchlists[s['accountId']]:
+                self.players[game_id].append(s)
+        self.seed = seed
+
+        self.windows = [(capacity, period, deque()) for capacity, period in (limits or [])]
+        self.error_rate = error_rate
+        self.latency = latency
+        self._rng = rng
+
+        self.requests = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+
+        self.app = web.Application(middlewares = [self._limits_middleware])
+        self.app.add_routes([web.get('/lol/summoner/v4/summoners/by-name/{name}', self._summoner),
+                             web.get('/lol/match/v4/matchlists/by-account/{account_id}', self._matchlist),
+                             web.get('/lol/match/v4/matches/{match_id}', self._match),
+                             web.get('/lol/match/v4/timelines/by-match/{match_id}', self._timeline)])
+        self._runner = None
+        self.url = None
+
+    @web.middleware
+    async def _limits_middleware(self, request, handler):
+        self.requests += 1
+        now = time.monotonic()
+
+        for capacity, period, spent in self.windows:
+            while spent and spent[0] <= now - period:
+                spent.popleft()
+
+            if len(spent) >= capacity:
+                self.rate_limited += 1
+                retry_after = max(1, int(spent[0] + period - now + 1))
+                return web.Response(status = 429, headers = {'Retry-After': str(retry_after)})
+
+        for _, _, spent in self.windows:
+            spent.append(now)
+
+        if self._rng.random() < self.error_rate:
+            self.server_errors += 1
+            return web.Response(status = 503)
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        return await handler(request)
+
+    async def _summoner(self, request):
+        summoner = self.summoners.get(request.match_info['name'])
+        if summoner is None:
+            raise web.HTTPNotFound()
+        return web.json_response(summoner)
+
+    async def _matchlist(self, request):
+        game_ids = self.matchlists.get(request.match_info['account_id'])
+        if game_ids is None:
+            raise web.HTTPNotFound()
+
+        matches = [{'gameId': game_id, 'queue': 420 if game_id % 7 else 440, 'platformId': 'BR1',
+                    'timestamp': 1613171498000 + game_id % 10**6} for game_id in game_ids]
+        return web.json_response({'matches': matches, 'startIndex': 0, 'endIndex': len(matches),
+                                  'totalGames': len(matches)})
+
+    def _game_id(self, request):
+        game_id = int(request.match_info['match_id'])
+        if game_id not in self._known_games:
+            raise web.HTTPNotFound()
+        return game_id
+
+    async def _match(self, request):
+        game_id = self._game_id(request)
+        game_info = make_game_info(game_id = game_id, seed = self.seed + game_id)
+
+        for identity, summoner in zip(game_info['participantIdentities'], self.players[game_id]):
+            identity['player'].update(summonerName = summoner['name'], accountId = summoner['accountId'],
+                                      summonerId = summoner['id'])
+        return web.json_response(game_info)
+
+    async def _timeline(self, request):
+        game_id = self._game_id(request)
+        return web.json_response(make_timeline(seed = self.seed + game_id))
+
+    async def start(self, host = '127.0.0.1', port = 0):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}'
+        return self.url
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    web.run_app(FakeRiotServer(limits = [(20, 1), (100, 120)], error_rate = 0.05).app, host = '127.0.0.1', port = port)
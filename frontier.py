@@ -0,0 +1,208 @@
+# Fronteira do crawl: fila de prioridade persistente de summoners, ordenada pelo número estimado de partidas inéditas
+import sqlite3
+
+# Estados das linhas de summoners e matches
+PENDING, RUNNING, DONE, FAILED = 0, 1, 2, 3
+
+# Tier dos summoners descobertos nos participantIdentities das partidas buscadas
+DISCOVERED = 'DISCOVERED'
+
+
+class CrawlFrontier:
+    '''
+     Fronteira de um crawl gravada em um arquivo SQLite (path None mantém tudo em memória): os summoners
+     a visitar, as partidas já enfileiradas e quantas partidas cada tier retorna no matchlist. Cada operação
+     é gravada na hora, então um crawl interrompido retoma exatamente de onde parou - tarefas que estavam em
+     andamento voltam para a fila ao reabrir o arquivo.
+
+     Prioridade de um summoner: partidas inéditas estimadas = média de partidas por matchlist do seu tier
+     (suavizada por default_matches enquanto o tier tem poucos summoners visitados) menos o número de
+     partidas já buscadas em que ele aparece (appearances). No high elo as mesmas pessoas jogam juntas, então
+     quem já apareceu em muitas partidas buscadas tem pouco a acrescentar. Empates saem na ordem de entrada,
+     e ninguém é descartado: um summoner só perde prioridade ao aparecer em partidas já buscadas.
+
+     Summoners são identificados pelo accountId. Os seeds (ex.: helper.get_top_players_users) entram só com
+     o nome e ganham o accountId quando aparecem em alguma partida, o que dispensa o summoner_by_name.
+     Os ids inteiros das linhas dão a ordem de entrada.
+    '''
+    def __init__(self, path = None, default_matches = 20):
+        self.path = path
+        self.default_matches = default_matches
+
+        self.conn = sqlite3.connect(path or ':memory:')
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS summoners (
+                                 id INTEGER PRIMARY KEY,
+                                 name TEXT,
+                                 account_id TEXT UNIQUE,
+                                 tier TEXT NOT NULL,
+                                 appearances INTEGER NOT NULL DEFAULT 0,
+                                 state INTEGER NOT NULL DEFAULT 0,
+                                 n_matches INTEGER,
+                                 n_new INTEGER)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS summoners_name ON summoners (name)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS summoners_state ON summoners (state)')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS matches (
+                                 game_id INTEGER PRIMARY KEY,
+                                 state INTEGER NOT NULL DEFAULT 0)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS matches_state ON matches (state)')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS tiers (
+                                 tier TEXT PRIMARY KEY,
+                                 visited INTEGER NOT NULL,
+                                 matches INTEGER NOT NULL)''')
+
+        # Tarefas em andamento quando o crawl anterior parou voltam para a fila
+        self.conn.execute('UPDATE summoners SET state = ? WHERE state = ?', (PENDING, RUNNING))
+        self.conn.execute('UPDATE matches SET state = ? WHERE state = ?', (PENDING, RUNNING))
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def add_summoners(self, summoner_names, tier = 'SEED'):
+        '''
+         Adiciona os seeds summoner_names (nomes) com o tier informado; nomes já presentes são ignorados.
+         Para manter os tiers de helper.get_top_players_users(..., by_tier = True):
+
+           for tier, names in top_players.items():
+               frontier.add_summoners(names, tier)
+        '''
+        for name in summoner_names:
+            if self.conn.execute('SELECT 1 FROM summoners WHERE name = ?', (name,)).fetchone() is None:
+                self.conn.execute('INSERT INTO summoners (name, tier) VALUES (?, ?)', (name, tier))
+        self.conn.commit()
+
+    def add_matches(self, game_ids):
+        '''
+         Enfileira os game_ids ainda não enfileirados e retorna a lista deles, na ordem original.
+        '''
+        new = []
+        for game_id in game_ids:
+            if self.conn.execute('INSERT OR IGNORE INTO matches (game_id) VALUES (?)', (int(game_id),)).rowcount:
+                new.append(game_id)
+        self.conn.commit()
+        return new
+
+    def discover(self, game_info):
+        '''
+         Registra os participantes de uma partida buscada (participantIdentities do MatchDto): incrementa o
+         appearances de quem já está na fronteira, resolve o accountId dos seeds pelo nome e adiciona os
+         summoners novos com o tier DISCOVERED. Retorna o número de summoners novos.
+        '''
+        new = 0
+
+        for identity in game_info.get('participantIdentities', []):
+            player = identity.get('player') or {}
+            account_id, name = player.get('accountId'), player.get('summonerName')
+            if not account_id:
+                continue
+
+            if self.conn.execute('UPDATE summoners SET appearances = appearances + 1 WHERE account_id = ?',
+                                 (account_id,)).rowcount:
+                continue
+
+            if self.conn.execute('UPDATE summoners SET account_id = ?, appearances = appearances + 1 '
+                                 'WHERE account_id IS NULL AND name = ?', (account_id, name)).rowcount:
+                continue
+
+            self.conn.execute('INSERT INTO summoners (name, account_id, tier, appearances) VALUES (?, ?, ?, 1)',
+                              (name, account_id, DISCOVERED))
+            new += 1
+
+        self.conn.commit()
+        return new
+
+    def next_match(self):
+        '''
+         Retira uma partida da fila (estado RUNNING até match_done) ou retorna None.
+        '''
+        row = self.conn.execute('SELECT game_id FROM matches WHERE state = ? ORDER BY game_id LIMIT 1',
+                                (PENDING,)).fetchone()
+        if row is None:
+            return None
+
+        self.conn.execute('UPDATE matches SET state = ? WHERE game_id = ?', (RUNNING, row[0]))
+        self.conn.commit()
+        return row[0]
+
+    def match_done(self, game_id, failed = False):
+        self.conn.execute('UPDATE matches SET state = ? WHERE game_id = ?', (FAILED if failed else DONE, game_id))
+        self.conn.commit()
+
+    def next_summoner(self):
+        '''
+         Retira o summoner de maior prioridade (estado RUNNING até summoner_done) e retorna a tupla
+         (id, name, account_id) - account_id é None para os seeds ainda não resolvidos - ou None.
+        '''
+        row = self.conn.execute('SELECT s.id, s.name, s.account_id FROM summoners s '
+                                'LEFT JOIN tiers t ON t.tier = s.tier WHERE s.state = ? '
+                                'ORDER BY (COALESCE(t.matches, 0) + ?) * 1.0 / (COALESCE(t.visited, 0) + 1) '
+                                '- s.appearances DESC, s.id LIMIT 1',
+                                (PENDING, self.default_matches)).fetchone()
+        if row is None:
+            return None
+
+        self.conn.execute('UPDATE summoners SET state = ? WHERE id = ?', (RUNNING, row[0]))
+        self.conn.commit()
+        return tuple(row)
+
+    def summoner_done(self, summoner_id, n_matches = None, n_new = None, account_id = None, failed = False):
+        '''
+         Marca o summoner summoner_id como visitado: n_matches (partidas do matchlist, já filtradas pela fila)
+         entra na média do tier, e n_new (partidas enfileiradas) fica registrado para o stats. account_id é o
+         do seed resolvido pelo summoner_by_name.
+        '''
+        if failed:
+            self.conn.execute('UPDATE summoners SET state = ? WHERE id = ?', (FAILED, summoner_id))
+            self.conn.commit()
+            return
+
+        row = self.conn.execute('SELECT tier, account_id FROM summoners WHERE id = ?', (summoner_id,)).fetchone()
+        if row is None:
+            return
+        tier, current = row
+
+        self.conn.execute('UPDATE summoners SET state = ?, n_matches = ?, n_new = ? WHERE id = ?',
+                          (DONE, n_matches, n_new, summoner_id))
+
+        if account_id is not None and current is None:
+            # O accountId pode já ter sido descoberto com outro nome (summoner renomeado): o seed absorve a linha,
+            # a não ser que ela esteja em andamento em outro worker - aí o seed fica sem o accountId
+            other = self.conn.execute('SELECT id, appearances, state FROM summoners WHERE account_id = ?',
+                                      (account_id,)).fetchone()
+            if other is None:
+                self.conn.execute('UPDATE summoners SET account_id = ? WHERE id = ?', (account_id, summoner_id))
+            elif other[2] != RUNNING:
+                self.conn.execute('DELETE FROM summoners WHERE id = ?', (other[0],))
+                self.conn.execute('UPDATE summoners SET account_id = ?, appearances = appearances + ? WHERE id = ?',
+                                  (account_id, other[1], summoner_id))
+
+        if n_matches is not None:
+            self.conn.execute('INSERT INTO tiers VALUES (?, 1, ?) ON CONFLICT (tier) DO UPDATE SET '
+                              'visited = visited + 1, matches = matches + excluded.matches', (tier, n_matches))
+        self.conn.commit()
+
+    def pending(self):
+        '''
+         Retorna (summoners, partidas) ainda na fila.
+        '''
+        summoners = self.conn.execute('SELECT COUNT(*) FROM summoners WHERE state = ?', (PENDING,)).fetchone()[0]
+        matches = self.conn.execute('SELECT COUNT(*) FROM matches WHERE state = ?', (PENDING,)).fetchone()[0]
+        return summoners, matches
+
+    @property
+    def stats(self):
+        summoners = dict(self.conn.execute('SELECT state, COUNT(*) FROM summoners GROUP BY state').fetchall())
+        matches = dict(self.conn.execute('SELECT state, COUNT(*) FROM matches GROUP BY state').fetchall())
+        discovered = self.conn.execute('SELECT COUNT(*) FROM summoners WHERE tier = ?', (DISCOVERED,)).fetchone()[0]
+        return {'summoners_pending': summoners.get(PENDING, 0), 'summoners_visited': summoners.get(DONE, 0),
+                'summoners_failed': summoners.get(FAILED, 0), 'summoners_discovered': discovered,
+                'matches_pending': matches.get(PENDING, 0), 'matches_done': matches.get(DONE, 0),
+                'matches_failed': matches.get(FAILED, 0)}
@@ -2,146 +2,195 @@
 import numpy as np
 import pandas as pd
 from roleidentification import get_roles
+from role_cache import RoleCache
+from metrics import METRICS, timed
 
-def players_perfomance_at_n(timeline, n = 10):
+from champions import champion_names, champion_classes
+
+@timed()
+def players_perfomance_at_n(timeline, n = 10, as_array = False):
     '''
      Essa função toma como parâmetro obrigatório um objeto timeline (MatchTimelineDto) e
-     como parâmetro não obrigatório n (int = 10). 
+     como parâmetros não obrigatórios n (int = 10) e as_array (bool = False).
 
      O objeto MatchTimelineDto é um Json definido pela RiotGames com diversas informações 
      de uma partida de acordo com o tempo - stats dos players, eventos principais e etc.
 
      Documentação do objeto: https://developer.riotgames.com/apis#match-v4/GET_getMatchTimeline
 
-     A função retorna um DataFrame com a perfomance dos players no frame n do jogo (frame = aprox min).
+     A função retorna um DataFrame com a perfomance dos players no frame n do jogo (frame = aprox min),
+     ou o array (10, len(PERFORMANCE_COLUMNS)) na ordem do participantId caso as_array seja True.
     '''
     
     # Selecionando apenas os stats de interesse
     keys = ['participantId', 'totalGold', 'xp', 'minionsKilled', 'jungleMinionsKilled']
 
-    champs_at_10 = pd.DataFrame(columns = keys)
-    
-    # Iterando por cada um dos players
-    for i in range(1, 11):
+    # Pegando os stats de cada um dos players (o DataFrame é montado uma única vez)
+    participant_frames = timeline['frames'][n]['participantFrames']
+
+    if as_array:
+        return np.array([[participant_frames[f'{i}'][k] for k in keys[1:]] for i in range(1, 11)], dtype = np.int64)
 
-        # Pegando os stats
-        t = timeline['frames'][n]['participantFrames'][f'{i}']  
-        main_perfomance = {k: t[k] for k in keys}
-        champs_at_10 = champs_at_10.append(main_perfomance, ignore_index = True)
+    champs_at_10 = pd.DataFrame([{k: participant_frames[f'{i}'][k] for k in keys} for i in range(1, 11)],
+                                columns = keys)
     
     return champs_at_10
 
-def events_at_n(timeline, n = 11):
-    '''
-     Essa função toma como parâmetro obrigatório um objeto timeline (MatchTimelineDto) e
-     como parâmetro não obrigatório n (int = 11). 
+# Eventos de interesse contados por player (a ordem define as colunas do array de eventos)
+EVENT_COLUMNS = ['wardsPlaced', 'wardsKilled', 'nKills', 'nDeaths', 'nAssists', 'firstBlood', 'firstTower',
+                 'midTowersDestroyed', 'botTowersDestroyed', 'topTowersDestroyed', 'inhibitorsDestroyed', 'fireDragonsDestroyed',
+                 'airDragonsDestroyed', 'waterDragonsDestroyed', 'earthDragonsDestroyed', 'riftHeraldDestroyed']
 
-     O objeto MatchTimelineDto é um Json definido pela RiotGames com diversas informações 
-     de uma partida de acordo com o tempo - stats dos players, eventos principais e etc.
+_EVENT_IDX = {column: j for j, column in enumerate(EVENT_COLUMNS)}
 
-     Documentação do objeto: https://developer.riotgames.com/apis#match-v4/GET_getMatchTimeline
+# Linhas do array de cada time (participantes 1-5 são do time 100, 6-10 do time 200)
+_TEAM_100 = slice(0, 5)
+_TEAM_200 = slice(5, 10)
 
-     A função percorre os primeiros n frames do jogo (frame = aprox min), contando os eventos de
-     interesse definidos anteriormente e adicionando a contagem a um DataFrame em que cada observação
-     é um player do jogo e cada variável é um tipo de evento.
+_DRAGON_IDX = {'FIRE_DRAGON': _EVENT_IDX['fireDragonsDestroyed'],
+               'WATER_DRAGON': _EVENT_IDX['waterDragonsDestroyed'],
+               'EARTH_DRAGON': _EVENT_IDX['earthDragonsDestroyed'],
+               'AIR_DRAGON': _EVENT_IDX['airDragonsDestroyed']}
 
-     A função retorna um DataFrame contendo os eventos que ocorreram por player.
-    '''
+_TOWER_IDX = {'BOT_LANE': _EVENT_IDX['botTowersDestroyed'],
+              'TOP_LANE': _EVENT_IDX['topTowersDestroyed'],
+              'MID_LANE': _EVENT_IDX['midTowersDestroyed']}
 
-    # Selecionando eventos de interresse
-    columns = ['participantId', 'wardsPlaced', 'wardsKilled', 'nKills', 'nDeaths', 'nAssists', 'firstBlood', 'firstTower',
-               'midTowersDestroyed', 'botTowersDestroyed', 'topTowersDestroyed', 'inhibitorsDestroyed', 'fireDragonsDestroyed',
-               'airDragonsDestroyed', 'waterDragonsDestroyed', 'earthDragonsDestroyed', 'riftHeraldDestroyed']
 
-    events_by_player = pd.DataFrame(columns = columns)
-    events_by_player['participantId'] = range(1,11)
-    events_by_player = events_by_player.fillna(0).set_index('participantId')
+def _killer_team(event):
+    # Eventos globais afetam todos os players do time de quem matou (killerId 0 conta pro time 100)
+    return _TEAM_200 if event['killerId'] > 5 else _TEAM_100
 
-    # Definindo alguns dicionários pra facilitar o input no DataFrame
-    dragon_dict = {'FIRE_DRAGON':'fireDragonsDestroyed',
-                  'WATER_DRAGON':'waterDragonsDestroyed',
-                  'EARTH_DRAGON':'earthDragonsDestroyed',
-                  'AIR_DRAGON':'airDragonsDestroyed'}
 
-    tower_dict = {'BOT_LANE': 'botTowersDestroyed',
-                  'TOP_LANE': 'topTowersDestroyed',
-                  'MID_LANE': 'midTowersDestroyed'}
+def _on_ward_placed(acc, event):
+    # Id 0 (sem player) viraria o índice -1, o participante 10
+    if event['wardType'] != 'UNDEFINED' and event['creatorId'] != 0:
+        acc[event['creatorId'] - 1, _EVENT_IDX['wardsPlaced']] += 1
 
-    # Iniando a contagem do First Blood e First Tower, eventos que não aparecem especificamente no objeto
-    first_blood = 0
-    first_tower = 0
-    
-    # Itera através dos Frames
-    for i in range(1, n):
-        events = timeline['frames'][i]['events']
-        
-        # De acordo com o evento, conta o número de vezes que o evento aconteceu
-        for event in events:
-            if event['type'] == 'WARD_PLACED':
-                if event['wardType'] !=  'UNDEFINED':
-                    events_by_player.loc[event['creatorId'], 'wardsPlaced'] += 1
 
-            if event['type'] == 'WARD_KILL':
-                if event['wardType'] !=  'UNDEFINED':
-                    events_by_player.loc[event['killerId'], 'wardsKilled'] += 1
+def _on_ward_kill(acc, event):
+    if event['wardType'] != 'UNDEFINED' and event['killerId'] != 0:
+        acc[event['killerId'] - 1, _EVENT_IDX['wardsKilled']] += 1
+
+
+def _on_champion_kill(acc, event):
+    # Evento CHAMPION_KILL gera 3 variáveis > o matador, o morto e quem ajudou a matar
+    killer = event['killerId']
+    if killer == 0:
+        return
+
+    if not acc[:, _EVENT_IDX['firstBlood']].any():
+        acc[killer - 1, _EVENT_IDX['firstBlood']] += 1
+
+    acc[killer - 1, _EVENT_IDX['nKills']] += 1
+    acc[event['victimId'] - 1, _EVENT_IDX['nDeaths']] += 1
+
+    # Pode ser mais de um assistente
+    for assist in event['assistingParticipantIds']:
+        acc[assist - 1, _EVENT_IDX['nAssists']] += 1
+
+
+def _on_elite_monster_kill(acc, event):
+    if event['monsterType'] == 'DRAGON':
+        column = _DRAGON_IDX.get(event['monsterSubType'])
+    elif event['monsterType'] == 'RIFTHERALD':
+        column = _EVENT_IDX['riftHeraldDestroyed']
+    else:
+        return
+
+    if column is not None:
+        acc[_killer_team(event), column] += 1
+
+
+def _on_building_kill(acc, event):
+    if event['buildingType'] == 'TOWER_BUILDING':
+        # teamId é o time dono da torre, então quem pontua é o outro time
+        team = _TEAM_200 if event['teamId'] == 100 else _TEAM_100
+
+        if not acc[:, _EVENT_IDX['firstTower']].any():
+            acc[team, _EVENT_IDX['firstTower']] += 1
+
+        acc[team, _TOWER_IDX[event['laneType']]] += 1
+
+    elif event['buildingType'] == 'INHIBITOR_BUILDING':
+        acc[_killer_team(event), _EVENT_IDX['inhibitorsDestroyed']] += 1
+
+
+# Tabela de despacho: tipo do evento -> função que acumula o evento no array
+EVENT_HANDLERS = {'WARD_PLACED': _on_ward_placed,
+                  'WARD_KILL': _on_ward_kill,
+                  'CHAMPION_KILL': _on_champion_kill,
+                  'ELITE_MONSTER_KILL': _on_elite_monster_kill,
+                  'BUILDING_KILL': _on_building_kill}
+
+
+def reduce_events(events, acc = None):
+    '''
+     Essa função toma como parâmetro obrigatório uma lista de eventos (EventDto) e como
+     parâmetro não obrigatório um array acumulador acc (np.ndarray (10, len(EVENT_COLUMNS))).
+
+     Cada evento é despachado pelo tipo para a função que o contabiliza; eventos sem
+     interesse (ITEM_PURCHASED, SKILL_LEVEL_UP, ...) são ignorados.
+
+     A função retorna o array acumulador (criado zerado quando não informado).
+    '''
+    if acc is None:
+        acc = np.zeros((10, len(EVENT_COLUMNS)), dtype = np.int64)
 
-            # Evento CHAMPION_KILL gera 3 variáveis > o matador, o morto e quem ajudou a matar
-            if event['type'] == 'CHAMPION_KILL':
-                if event['killerId'] != 0:
+    if METRICS.enabled:
+        METRICS.count('events', len(events))
 
-                    if first_blood == 0:
-                        events_by_player.loc[event['killerId'], 'firstBlood'] += 1
-                        first_blood +=1 
+    handlers = EVENT_HANDLERS
+    for event in events:
+        handler = handlers.get(event['type'])
+        if handler is not None:
+            handler(acc, event)
 
-                    events_by_player.loc[event['killerId'], 'nKills'] += 1
-                    events_by_player.loc[event['victimId'], 'nDeaths'] += 1
+    return acc
 
-                    # Pode ser mais de um assistente
-                    for assist in event['assistingParticipantIds']:
-                        events_by_player.loc[assist, 'nAssists'] += 1
+@timed()
+def events_at_n(timeline, n = 11, as_array = False):
+    '''
+     Essa função toma como parâmetro obrigatório um objeto timeline (MatchTimelineDto) e
+     como parâmetros não obrigatórios n (int = 11) e as_array (bool = False).
 
-            # Eventos globais (morte de monstros elite, torres) afetam todos os players do time
-            if event['type'] == 'ELITE_MONSTER_KILL':
-                if event['monsterType'] == 'DRAGON':
-                    if event['killerId'] > 5:
-                        events_by_player.loc[6:, dragon_dict[event['monsterSubType']]] += 1
-                    else:
-                        events_by_player.loc[1:5, dragon_dict[event['monsterSubType']]] += 1
+     O objeto MatchTimelineDto é um Json definido pela RiotGames com diversas informações 
+     de uma partida de acordo com o tempo - stats dos players, eventos principais e etc.
 
-                if event['monsterType'] == 'RIFTHERALD':
-                    if event['killerId'] > 5:
-                        events_by_player.loc[6:, 'riftHeraldDestroyed'] += 1
-                    else:
-                        events_by_player.loc[1:5, 'riftHeraldDestroyed'] += 1
+     Documentação do objeto: https://developer.riotgames.com/apis#match-v4/GET_getMatchTimeline
 
-            if event['type'] == 'BUILDING_KILL':
-                if event['buildingType'] == 'TOWER_BUILDING':
+     A função percorre os primeiros n frames do jogo (frame = aprox min) uma única vez, contando os
+     eventos de interesse (EVENT_COLUMNS) em um array de inteiros em que cada linha é um player do
+     jogo e cada coluna é um tipo de evento.
 
-                    if event['teamId'] == 100:
-                        if first_tower == 0:
-                            events_by_player.loc[6:, 'firstTower'] += 1
-                            first_tower += 1
+     A função retorna um DataFrame contendo os eventos que ocorreram por player, ou o próprio
+     array (10, len(EVENT_COLUMNS)) caso as_array seja True.
+    '''
+    acc = np.zeros((10, len(EVENT_COLUMNS)), dtype = np.int64)
+    METRICS.count('timelines')
 
-                        events_by_player.loc[6:, tower_dict[event['laneType']]] += 1
-                    else:
-                        if first_tower == 0:
-                            events_by_player.loc[1:5, 'firstTower'] += 1
-                            first_tower += 1
+    # Itera através dos Frames
+    frames = timeline['frames']
+    for i in range(1, n):
+        reduce_events(frames[i]['events'], acc)
 
-                        events_by_player.loc[1:5, tower_dict[event['laneType']]] += 1
+    if as_array:
+        return acc
 
-                if event['buildingType'] == 'INHIBITOR_BUILDING': 
+    events_by_player = pd.DataFrame(acc, columns = EVENT_COLUMNS)
+    events_by_player.insert(0, 'participantId', range(1, 11))
 
-                    if event['killerId'] > 5:
-                        events_by_player.loc[6:, 'inhibitorsDestroyed'] += 1
-                    else:
-                        events_by_player.loc[1:5, 'inhibitorsDestroyed'] += 1
+    return events_by_player
 
-    return events_by_player.reset_index()
+# Registro de cada participante retornado por get_participant_game_info(game_info, as_array = True)
+PARTICIPANT_INFO_DTYPE = np.dtype([('participantId', np.int8), ('teamId', np.int16), ('championId', np.int16),
+                                   ('lane', 'U12'), ('role', 'U12'), ('isWinner', bool)])
 
-def get_participant_game_info(game_info):
+@timed()
+def get_participant_game_info(game_info, as_array = False):
     '''
-     Essa função toma como parâmetro obrigatório um objeto game_info (MatchDto).
+     Essa função toma como parâmetro obrigatório um objeto game_info (MatchDto) e como parâmetro
+     não obrigatório as_array (bool = False).
 
      O objeto MatchDto é um Json definido pela RiotGames com diversas informações 
      de gerais de uma partida (players, champions, gameID, fila e etc)
@@ -149,13 +198,12 @@ def get_participant_game_info(game_info):
      Documentação do objeto: https://developer.riotgames.com/apis#match-v4/GET_getMatch
 
      A função retorna um DataFrame contendo os players como observações e a lane, a role,
-     o time, o champion e se saiu vitorioso ou não como variáveis.
+     o time, o champion e se saiu vitorioso ou não como variáveis - ou, caso as_array seja True,
+     um array estruturado (PARTICIPANT_INFO_DTYPE) com um registro por player, na ordem do MatchDto.
     '''
 
     # Selecionar informações relevantes
-    keys = ['participantId', 'teamId', 'championId', 'timeline']
-
-    participant_game_info = pd.DataFrame(columns = keys)
+    keys = ['participantId', 'teamId', 'championId']
 
     # Definir o time vencedor
     if game_info['teams'][0]['win'] == 'Win':
@@ -164,28 +212,51 @@ def get_participant_game_info(game_info):
     else:
         winner = game_info['teams'][1]['teamId']
 
-    # Adicionar as informações sobre os players e o game
-    for i in range(0, 10):
-        gip = game_info['participants'][i]  
-        main_info = {k: gip[k] for k in keys}
-        participant_game_info = participant_game_info.append(main_info, ignore_index = True)
+    if as_array:
+        return np.array([(gip['participantId'], gip['teamId'], gip['championId'], gip['timeline']['lane'],
+                          gip['timeline']['role'], gip['teamId'] == winner) for gip in game_info['participants'][:10]],
+                        dtype = PARTICIPANT_INFO_DTYPE)
 
-    participant_game_info['lane'] = [participant_game_info['timeline'][i]['lane'] for i in range(len(participant_game_info))]
-    participant_game_info['role'] = [participant_game_info['timeline'][i]['role'] for i in range(len(participant_game_info))]
-    participant_game_info['isWinner'] = [True if team == winner else False for team in participant_game_info['teamId']]
+    # Adicionar as informações sobre os players e o game (lane e role vêm do timeline de cada participante)
+    rows = []
+    for gip in game_info['participants'][:10]:
+        main_info = {k: gip[k] for k in keys}
+        main_info['lane'] = gip['timeline']['lane']
+        main_info['role'] = gip['timeline']['role']
+        main_info['isWinner'] = gip['teamId'] == winner
+        rows.append(main_info)
 
-    # Dropar a coluna timeline após tirar as informações necessárias dela
-    participant_game_info = participant_game_info.drop('timeline', axis = 1)
+    participant_game_info = pd.DataFrame(rows, columns = keys + ['lane', 'role', 'isWinner'])
     
     return participant_game_info
 
-def create_match_row(players_perfomance_at_10, players_events_at_10, participant_game_info, champion_roles, match_id):
+# Colunas (e ordem) da linha de uma partida, como retornada por create_match_row
+MATCH_ROW_COLUMNS = ['gameID', 'isWinner_blue', 'totalGold_red', 'xp_red', 'nKills_red', 'nDeaths_red', 'nAssists_red', 'minionsKilled_red', 'jungleMinionsKilled_red', 'wardsPlaced_red', 'wardsKilled_red',
+                     'firstBlood_red', 'firstTower_red', 'midTowersDestroyed_red', 'botTowersDestroyed_red', 'topTowersDestroyed_red', 'inhibitorsDestroyed_red', 'fireDragonsDestroyed_red',
+                     'airDragonsDestroyed_red','waterDragonsDestroyed_red', 'earthDragonsDestroyed_red', 'riftHeraldDestroyed_red', 'TOP_red', 'JUNGLE_red', 'MIDDLE_red', 'BOTTOM_red', 'UTILITY_red',
+                     'totalGold_blue', 'xp_blue', 'nKills_blue', 'nDeaths_blue', 'nAssists_blue', 'minionsKilled_blue', 'jungleMinionsKilled_blue', 'wardsPlaced_blue', 'wardsKilled_blue',
+                     'firstBlood_blue', 'firstTower_blue', 'midTowersDestroyed_blue', 'botTowersDestroyed_blue', 'topTowersDestroyed_blue', 'inhibitorsDestroyed_blue', 'fireDragonsDestroyed_blue',
+                     'airDragonsDestroyed_blue', 'waterDragonsDestroyed_blue','earthDragonsDestroyed_blue','riftHeraldDestroyed_blue', 'TOP_blue', 'JUNGLE_blue', 'MIDDLE_blue', 'BOTTOM_blue', 'UTILITY_blue'
+                     ]
+
+@timed()
+def create_match_row(players_perfomance_at_10, players_events_at_10, participant_game_info, champion_roles, match_id,
+                     role_cache = None):
     '''
      Essa função toma como parâmetro obrigatório 3 DataFrames, o match_id (int) e o objeto champion_roles.
+     Como parâmetro não obrigatório recebe um role_cache.RoleCache, que evita recalcular as roles de composições repetidas.
 
      Ela une todos as informações, eventos e estatísticas de uma partida reunidas utilizando as funçoes desse arquivo em
      apenas uma linha, transformando a partida em uma única observação. 
+
+     Também aceita as saídas com as_array = True das três funções: nesse caso a linha é montada por um MatchFeatures,
+     sem nenhum DataFrame intermediário.
     '''
+    if isinstance(participant_game_info, np.ndarray):
+        # As stats estão na ordem do participantId e o info na ordem do MatchDto
+        stats = np.hstack([players_perfomance_at_10, players_events_at_10])
+        features = MatchFeatures(match_id, participant_game_info, stats[participant_game_info['participantId'] - 1])
+        return match_features_frame([features], champion_roles, role_cache = role_cache)
     
     # Merge nos DataFrames de Entrada
     full_players_info = participant_game_info.merge(players_perfomance_at_10, on = 'participantId')
@@ -220,11 +291,13 @@ def create_match_row(players_perfomance_at_10, players_events_at_10, participant
     grouped_by_team = full_players_info.groupby('teamId').agg(agg_func).sort_index()
 
     # Utilizando o objeto champion_roles, definir a role de cada campeão e adiciono ao DataFrame dos times
+    resolve_roles = role_cache.get if role_cache is not None else lambda champions: get_roles(champion_roles, champions)
+
     champions_100 =  full_players_info[full_players_info.teamId == 100].championId.tolist()
-    roles_100 = get_roles(champion_roles, champions_100)
+    roles_100 = resolve_roles(champions_100)
 
     champions_200 =  full_players_info[full_players_info.teamId == 200].championId.tolist()
-    roles_200 = get_roles(champion_roles, champions_200)
+    roles_200 = resolve_roles(champions_200)
 
     for k, v in roles_100.items():
         pairs = [v, roles_200[k]]
@@ -239,68 +312,306 @@ def create_match_row(players_perfomance_at_10, players_events_at_10, participant
     # Adicionar o match_id ao DataFrame pra facilitar o controle de partidas 
     match_row['gameID'] = match_id
 
-    return match_row[['gameID', 'isWinner_blue', 'totalGold_red', 'xp_red', 'nKills_red', 'nDeaths_red', 'nAssists_red', 'minionsKilled_red', 'jungleMinionsKilled_red', 'wardsPlaced_red', 'wardsKilled_red',
-                     'firstBlood_red', 'firstTower_red', 'midTowersDestroyed_red', 'botTowersDestroyed_red', 'topTowersDestroyed_red', 'inhibitorsDestroyed_red', 'fireDragonsDestroyed_red',
-                     'airDragonsDestroyed_red','waterDragonsDestroyed_red', 'earthDragonsDestroyed_red', 'riftHeraldDestroyed_red', 'TOP_red', 'JUNGLE_red', 'MIDDLE_red', 'BOTTOM_red', 'UTILITY_red',
-                     'totalGold_blue', 'xp_blue', 'nKills_blue', 'nDeaths_blue', 'nAssists_blue', 'minionsKilled_blue', 'jungleMinionsKilled_blue', 'wardsPlaced_blue', 'wardsKilled_blue',
-                     'firstBlood_blue', 'firstTower_blue', 'midTowersDestroyed_blue', 'botTowersDestroyed_blue', 'topTowersDestroyed_blue', 'inhibitorsDestroyed_blue', 'fireDragonsDestroyed_blue',
-                     'airDragonsDestroyed_blue', 'waterDragonsDestroyed_blue','earthDragonsDestroyed_blue','riftHeraldDestroyed_blue', 'TOP_blue', 'JUNGLE_blue', 'MIDDLE_blue', 'BOTTOM_blue', 'UTILITY_blue'
-                    ]]
+    return match_row[MATCH_ROW_COLUMNS]
+
+
+# Stats dos participantFrames usados na linha da partida
+PERFORMANCE_COLUMNS = ['totalGold', 'xp', 'minionsKilled', 'jungleMinionsKilled']
 
+# Stats por player de um snapshot: performance no frame seguida dos eventos acumulados até o frame
+SNAPSHOT_COLUMNS = PERFORMANCE_COLUMNS + EVENT_COLUMNS
 
-def create_matchlist_from_summoner(summoner_data, m, all_matches, match_id_list, champion_roles, region = 'br1'):
+ROLE_COLUMNS = ['TOP', 'JUNGLE', 'MIDDLE', 'BOTTOM', 'UTILITY']
+
+# Stats somadas por time em create_match_row (as demais são agregadas pelo máximo)
+_TEAM_SUM_COLUMNS = {'totalGold', 'xp', 'minionsKilled', 'jungleMinionsKilled', 'wardsPlaced', 'wardsKilled',
+                     'nKills', 'nDeaths', 'nAssists'}
+
+_TEAM_SUFFIX = {100: 'red', 200: 'blue'}
+
+
+class MatchFeatures:
     '''
-    ## ATENÇÃO - FUNÇÃO NÃO FUNCIONA ADEQUEADAMENTE DEVIDO AOS ERROS GERADOS PELA API - NÃO UTILIZAR PARA PROJETOS GRANDES (+1K) ##
+     Representação compacta de uma partida no frame n, no lugar dos três DataFrames de 10 linhas do caminho
+     players_perfomance_at_n -> events_at_n -> get_participant_game_info -> create_match_row: o gameId, o array
+     estruturado info (PARTICIPANT_INFO_DTYPE, na ordem do MatchDto) e as stats (10, len(SNAPSHOT_COLUMNS)) int32 de
+     cada participante, alinhadas com info.
 
-     Essa função toma como parâmetros obrigatórios 1 objeto e 1 classe para utilizar na API da Riot Games:
+     Uma partida ocupa ~2 KB em 3 objetos; a conversão para DataFrame só acontece na borda (match_features_frame),
+     uma única vez para um lote de partidas.
+    '''
+    __slots__ = ('game_id', 'info', 'stats')
+
+    def __init__(self, game_id, info, stats):
+        self.game_id = game_id
+        self.info = info
+        self.stats = stats
+
+    @classmethod
+    def from_match(cls, game_info, timeline, n = 10):
+        '''
+         Monta o registro da partida no frame n (mesmos dados de players_perfomance_at_n(timeline, n),
+         events_at_n(timeline, n + 1) e get_participant_game_info(game_info)).
+        '''
+        info = get_participant_game_info(game_info, as_array = True)
+        snapshot = match_snapshots(timeline, [n])[0]
+        return cls(game_info['gameId'], info, snapshot[info['participantId'] - 1].astype(np.int32))
+
+    @property
+    def nbytes(self):
+        return self.info.nbytes + self.stats.nbytes
+
+    def team_stats(self, team):
+        '''
+         Stats agregadas do time (somas em _TEAM_SUM_COLUMNS, máximos nas demais), na ordem de SNAPSHOT_COLUMNS.
+        '''
+        stats = self.stats[self.info['teamId'] == team]
+        return [stats[:, j].sum() if column in _TEAM_SUM_COLUMNS else stats[:, j].max()
+                for j, column in enumerate(SNAPSHOT_COLUMNS)]
+
+    def row(self, champion_roles, role_cache = None):
+        '''
+         Valores da linha da partida, na ordem de MATCH_ROW_COLUMNS (mesma linha de create_match_row).
+        '''
+        resolve_roles = role_cache.get if role_cache is not None else lambda champions: get_roles(champion_roles, champions)
+        winners = self.info['teamId'][self.info['isWinner']]
+
+        row = {'gameID': self.game_id, 'isWinner_blue': bool((winners == 200).any())}
+        for team, suffix in _TEAM_SUFFIX.items():
+            roles = resolve_roles(self.info['championId'][self.info['teamId'] == team].tolist())
+            row.update({f'{column}_{suffix}': int(value) for column, value in zip(SNAPSHOT_COLUMNS, self.team_stats(team))})
+            row.update({f'{role}_{suffix}': roles[role] for role in ROLE_COLUMNS})
+
+        return [row[column] for column in MATCH_ROW_COLUMNS]
+
+
+def match_features_frame(features, champion_roles, role_cache = None):
+    '''
+     Borda da representação compacta: converte uma lista de MatchFeatures no DataFrame de partidas (colunas de
+     MATCH_ROW_COLUMNS, mesmos dtypes de extract_match_rows).
+    '''
+    rows = [match.row(champion_roles, role_cache = role_cache) for match in features]
+    return pd.DataFrame(rows, columns = MATCH_ROW_COLUMNS).astype({column: np.int64 for column in MATCH_ROW_COLUMNS
+                                                                  if column != 'isWinner_blue'})
 
-     summoner_data: JSON com informações sobre o player (documentação: https://developer.riotgames.com/apis#summoner-v4/GET_getBySummonerName)
-     m: Classe para acessar JSONs da partida (documentação: https://developer.riotgames.com/apis#match-v4)
+@timed()
+def match_snapshots(timeline, frames = None):
+    '''
+     Essa função toma como parâmetro obrigatório um objeto timeline (MatchTimelineDto) e como parâmetro
+     não obrigatório uma lista de frames (padrão: todos os frames do timeline).
 
-     Além disso, também recebe uma lista contendo partidas já salvas, um DataFrame contendo as partidas e o objeto champion_roles.
+     Ela percorre os frames uma única vez, acumulando os eventos (reduce_events), e guarda para cada frame
+     pedido um snapshot com a performance dos players naquele frame e os eventos acumulados até ele - o
+     mesmo que players_perfomance_at_n(timeline, n) + events_at_n(timeline, n + 1).
 
-     A função procura pela lista de partidas de um player (summoner_data), coleta as informações, eventos e estatísticas 
-     relevantes sobre a partida (utilizando as funções acima definidas) e adiciona ao DataFrame all_matches.
+     A função retorna um array (len(frames), 10, len(SNAPSHOT_COLUMNS)), com os players na ordem do participantId.
+    '''
+    all_frames = timeline['frames']
+    frames = range(len(all_frames)) if frames is None else list(frames)
+
+    n_perf = len(PERFORMANCE_COLUMNS)
+    snapshots = np.zeros((len(frames), 10, len(SNAPSHOT_COLUMNS)), dtype = np.int64)
+    acc = np.zeros((10, len(EVENT_COLUMNS)), dtype = np.int64)
+
+    METRICS.count('timelines')
+
+    positions = {}
+    for k, f in enumerate(frames):
+        positions.setdefault(f, []).append(k)
 
-     No final, retorna o DataFrame com as partidas adicionadas.
+    for f in range(max(frames, default = -1) + 1):
+        if f > 0:
+            reduce_events(all_frames[f]['events'], acc)
+
+        for k in positions.get(f, ()):
+            participant_frames = all_frames[f]['participantFrames']
+            snapshots[k, :, :n_perf] = [[participant_frames[f'{i}'][c] for c in PERFORMANCE_COLUMNS] for i in range(1, 11)]
+            snapshots[k, :, n_perf:] = acc
+
+    return snapshots
+
+@timed()
+def match_row_arrays(timelines, game_infos, champion_roles, cutoffs = (5, 10, 15, 20), role_cache = None):
     '''
+     Essa função toma como parâmetros obrigatórios uma sequência de objetos timeline (MatchTimelineDto),
+     a sequência correspondente de objetos game_info (MatchDto) e o objeto champion_roles. Como parâmetros
+     não obrigatórios recebe os cutoffs (frames em que as linhas são montadas) e um role_cache.RoleCache
+     (padrão: um cache novo, só para o lote).
 
-    # Buscar dados de summoner do player e procurar as partidas desde 12/Fev
-    match_list = m.matchlist_by_account(**{'region': region,
-                              'encrypted_account_id': summoner_data['accountId'],
-                              'begin_time':1613171498})
+     Cada timeline é percorrido uma única vez (match_snapshots) e as linhas de todos os cutoffs saem do mesmo
+     tensor; as roles também são resolvidas uma única vez por composição distinta do lote. Em cada cutoff n,
+     partidas com até n frames são descartadas, como no loop de extração.
 
-    n_matches = len(match_list['matches'])
+     A função retorna um dicionário {cutoff: {coluna: array}}, com as colunas de MATCH_ROW_COLUMNS - as mesmas
+     linhas de extract_match_rows_at, sem montar nenhum DataFrame.
+    '''
+    cutoffs = list(cutoffs)
+    pairs = [(timeline, game_info) for timeline, game_info in zip(timelines, game_infos)
+             if len(timeline['frames']) > min(cutoffs)]
+    METRICS.count('matches', len(pairs))
+
+    stats = np.zeros((len(cutoffs), len(pairs), 10, len(SNAPSHOT_COLUMNS)), dtype = np.int64)
+    valid = np.zeros((len(cutoffs), len(pairs)), dtype = bool)
+    team_ids = np.zeros((len(pairs), 10), dtype = np.int64)
+    champion_ids = np.zeros((len(pairs), 10), dtype = np.int64)
+    winners = np.zeros(len(pairs), dtype = np.int64)
+    game_ids = np.zeros(len(pairs), dtype = np.int64)
+
+    # Achatar as partidas nos arrays (uma linha por participante, na ordem do MatchDto)
+    for row, (timeline, game_info) in enumerate(pairs):
+        n_frames = len(timeline['frames'])
+        available = [k for k, n in enumerate(cutoffs) if n_frames > n]
+
+        participant_ids = [participant['participantId'] - 1 for participant in game_info['participants']]
+        snapshots = match_snapshots(timeline, [cutoffs[k] for k in available])
+
+        stats[available, row] = snapshots[:, participant_ids]
+        valid[available, row] = True
+
+        for j, participant in enumerate(game_info['participants']):
+            team_ids[row, j] = participant['teamId']
+            champion_ids[row, j] = participant['championId']
+
+        teams = game_info['teams']
+        winners[row] = teams[0]['teamId'] if teams[0]['win'] == 'Win' else teams[1]['teamId']
+        game_ids[row] = game_info['gameId']
+
+    return aggregate_match_rows(stats, valid, team_ids, champion_ids, winners, game_ids, cutoffs, champion_roles,
+                                role_cache = role_cache)
+
+def aggregate_match_rows(stats, valid, team_ids, champion_ids, winners, game_ids, cutoffs, champion_roles,
+                         role_cache = None):
+    '''
+     Etapa final de match_row_arrays, separada para ser usada com outras fontes das stats (ex.: timeline_index):
+     recebe as stats (len(cutoffs), N, 10, len(SNAPSHOT_COLUMNS)), a máscara valid (len(cutoffs), N) das partidas
+     com frames suficientes em cada cutoff, os teamIds e championIds (N, 10) na mesma ordem dos participantes de
+     stats, o teamId vencedor e o gameId de cada partida.
 
-    for n_match in range(n_matches):
+     A função retorna o dicionário {cutoff: {coluna: array}} de match_row_arrays.
+    '''
+    n_matches = len(game_ids)
 
-        match_id = match_list['matches'][n_match]['gameId']
+    # As roles dependem da composição inteira do time: cada composição distinta do lote é resolvida uma única vez
+    role_cache = RoleCache(champion_roles) if role_cache is None else role_cache
+    roles = {}
+    for team in _TEAM_SUFFIX:
+        compositions = [champion_ids[row][team_ids[row] == team].tolist() for row in range(n_matches)]
+        team_roles = role_cache.resolve_many(compositions)
+        roles[team] = np.array([[assigned[role] for role in ROLE_COLUMNS] for assigned in team_roles],
+                               dtype = np.int64).reshape(n_matches, len(ROLE_COLUMNS))
 
-        # id 420 - Partidas SoloQ Ranked
-        if match_list['matches'][n_match]['queue'] == 420:
+    # Agregar por (partida, time) de forma vetorizada, em cada cutoff
+    is_sum = np.array([column in _TEAM_SUM_COLUMNS for column in SNAPSHOT_COLUMNS])
+    rows_at = {}
 
-            # Como os players jogam um contra o outro e são do mesmo nível, procuro ver se a partida já não existe na base
-            if match_id not in match_id_list:
+    for k, n in enumerate(cutoffs):
+        keep = valid[k]
+        data = {'gameID': game_ids[keep], 'isWinner_blue': winners[keep] == 200}
 
-                match_id_list.append(match_id)
+        for team, suffix in _TEAM_SUFFIX.items():
+            in_team = (team_ids[keep] == team)[:, :, None]
 
-                game_info = m.by_id('br1', match_id)
-                timeline = m.timeline_by_match(region = region, match_id = match_id)
+            sums = np.where(in_team, stats[k, keep], 0).sum(axis = 1)
+            maxs = np.where(in_team, stats[k, keep], np.iinfo(np.int64).min).max(axis = 1)
+            team_stats = np.where(is_sum, sums, maxs)
 
-                # Apenas partidas maiores que 10min
-                if len(timeline['frames']) > 10:
+            for j, column in enumerate(SNAPSHOT_COLUMNS):
+                data[f'{column}_{suffix}'] = team_stats[:, j]
 
-                    players_perfomance_at_10 = players_perfomance_at_n(timeline)
-                    players_events_at_10 = events_at_n(timeline)
-                    participant_game_info = get_participant_game_info(game_info)
+            for j, role in enumerate(ROLE_COLUMNS):
+                data[f'{role}_{suffix}'] = roles[team][keep, j]
 
-                    match_row = create_match_row(players_perfomance_at_10, players_events_at_10, participant_game_info, champion_roles, match_id)
+        rows_at[n] = data
 
-                    all_matches = all_matches.append(match_row)
-    
-    return all_matches
+    return rows_at
 
-def get_top_players_users(leagues, region = 'br1'):
+@timed()
+def extract_match_rows_at(timelines, game_infos, champion_roles, cutoffs = (5, 10, 15, 20), role_cache = None):
+    '''
+     Mesmos parâmetros de match_row_arrays: percorre cada timeline uma única vez e monta as linhas de
+     todos os cutoffs.
+
+     A função retorna um dicionário {cutoff: DataFrame}, com as colunas de MATCH_ROW_COLUMNS.
+    '''
+    arrays_at = match_row_arrays(timelines, game_infos, champion_roles, cutoffs = cutoffs, role_cache = role_cache)
+    return {n: pd.DataFrame(data, columns = MATCH_ROW_COLUMNS) for n, data in arrays_at.items()}
+
+@timed()
+def extract_match_rows(timelines, game_infos, champion_roles, n = 10, role_cache = None):
+    '''
+     Essa função toma como parâmetros obrigatórios uma sequência de objetos timeline (MatchTimelineDto),
+     a sequência correspondente de objetos game_info (MatchDto) e o objeto champion_roles. Como parâmetros
+     não obrigatórios recebe n (int = 10), o frame em que as stats dos players são lidas, e um role_cache.RoleCache.
+
+     É a versão em lote de players_perfomance_at_n -> events_at_n -> get_participant_game_info -> create_match_row:
+     as N partidas são achatadas em arrays (N, 10, n_stats) e os times são agregados de uma vez, com somas e
+     máximos vetorizados por (partida, time).
+
+     Assim como no loop de extração, partidas com até n frames são descartadas.
+
+     A função retorna um DataFrame com uma linha por partida e as colunas de MATCH_ROW_COLUMNS.
+    '''
+    return extract_match_rows_at(timelines, game_infos, champion_roles, cutoffs = [n], role_cache = role_cache)[n]
+
+
+@timed()
+def create_matchlist_from_summoner(summoner_data, m, sink, seen, champion_roles, region = 'br1'):
+    '''
+    ## ATENÇÃO - FUNÇÃO NÃO FUNCIONA ADEQUEADAMENTE DEVIDO AOS ERROS GERADOS PELA API - NÃO UTILIZAR PARA PROJETOS GRANDES (+1K) ##
+    ## Para crawls grandes utilizar crawler.crawl / crawler.crawl_match_rows (assíncrono e respeitando o rate limit) ##
+
+     Essa função toma como parâmetros obrigatórios 1 objeto e 1 classe para utilizar na API da Riot Games:
+
+     summoner_data: JSON com informações sobre o player (documentação: https://developer.riotgames.com/apis#summoner-v4/GET_getBySummonerName)
+     m: Classe para acessar JSONs da partida (documentação: https://developer.riotgames.com/apis#match-v4)
+
+     Além disso, também recebe o sink das partidas (sink.MatchRowSink), o índice seen (match_index.SeenMatches) de
+     partidas já salvas e o objeto champion_roles. As partidas buscadas só entram no seen depois que as suas linhas
+     foram gravadas no disco (sink.flush), então uma execução interrompida não perde partidas.
+
+     A função procura pela lista de partidas de um player (summoner_data), coleta as informações, eventos e estatísticas 
+     relevantes sobre a partida (utilizando as funções acima definidas) e grava as linhas no sink.
+
+     No final, retorna o número de partidas gravadas.
+    '''
+
+    # Buscar dados de summoner do player e procurar as partidas desde 12/Fev
+    with METRICS.timer('api_request'):
+        match_list = m.matchlist_by_account(**{'region': region,
+                                  'encrypted_account_id': summoner_data['accountId'],
+                                  'begin_time':1613171498})
+    METRICS.count('requests')
+
+    # id 420 - Partidas SoloQ Ranked
+    game_ids = [match['gameId'] for match in match_list['matches'] if match['queue'] == 420]
+    new_matches = []
+    fetched = []
+
+    # Como os players jogam um contra o outro e são do mesmo nível, várias partidas já existem na base
+    for match_id in seen.filter_new(game_ids):
+
+        with METRICS.timer('api_request'):
+            game_info = m.by_id('br1', match_id)
+        with METRICS.timer('api_request'):
+            timeline = m.timeline_by_match(region = region, match_id = match_id)
+        METRICS.count('requests', 2)
+        fetched.append(match_id)
+
+        # Apenas partidas maiores que 10min (guardadas como MatchFeatures, convertidas em DataFrame uma vez no final)
+        if len(timeline['frames']) > 10:
+            new_matches.append(MatchFeatures.from_match(game_info, timeline))
+            METRICS.count('matches')
+
+    if new_matches:
+        with METRICS.timer('sink_write'):
+            sink.write(match_features_frame(new_matches, champion_roles))
+            sink.flush()
+
+    seen.update(fetched)
+    return len(new_matches)
+
+@timed()
+def get_top_players_users(leagues, region = 'br1', by_tier = False):
     '''
      Essa função toma como parâmetro obrigatório uma classe leagues (LeagueApiV4).
      
@@ -309,7 +620,9 @@ def get_top_players_users(leagues, region = 'br1'):
      Utilizando a leagues, a função acessa o nome dos players de maior ranking do jogo,
      nesse caso, a partir do Diamante 1. Por padrão, a região foi definida como a brasileira.
 
-     A função retorna uma lista contendo o nome dos players
+     A função retorna uma lista contendo o nome dos players. Com by_tier, retorna um dicionário
+     {tier: lista de nomes} (CHALLENGER, GRANDMASTER, MASTER, DIAMOND_I), o formato usado para
+     alimentar a frontier.CrawlFrontier.
     '''
 
     # CHALLENGER
@@ -340,357 +653,99 @@ def get_top_players_users(leagues, region = 'br1'):
     for summoner in diamondi_league:
         diamondi_list.append(summoner['summonerName'])
     
+    if by_tier:
+        return {'CHALLENGER': challenger_list, 'GRANDMASTER': grandmaster_list,
+                'MASTER': master_list, 'DIAMOND_I': diamondi_list}
+
     allsummoners = challenger_list + grandmaster_list + master_list + diamondi_list
     
     return allsummoners
 
 def get_champions_name(id):
     '''
-    Função simples para armazenar um dicionário.
     Recebe o id e retorna o nome do campeão de acordo com o id.
+    Os nomes vêm da tabela de campeões (champions.json), montada uma única vez.
+    Para converter uma coluna inteira, usar champions.champion_names.
     '''
-    all_champion_id = {
-        1: "Annie",
-        2: "Olaf",
-        3: "Galio",
-        4: "TwistedFate",
-        5: "XinZhao",
-        6: "Urgot",
-        7: "LeBlanc",
-        8: "Vladimir",
-        9: "Fiddlesticks",
-        10: "Kayle",
-        11: "Master Yi",
-        12: "Alistar",
-        13: "Ryze",
-        14: "Sion",
-        15: "Sivir",
-        16: "Soraka",
-        17: "Teemo",
-        18: "Tristana",
-        19: "Warwick",
-        20: "Nunu",
-        21: "MissFortune",
-        22: "Ashe",
-        23: "Tryndamere",
-        24: "Jax",
-        25: "Morgana",
-        26: "Zilean",
-        27: "Singed",
-        28: "Evelynn",
-        29: "Twitch",
-        30: "Karthus",
-        31: "Cho'Gath",
-        32: "Amumu",
-        33: "Rammus",
-        34: "Anivia",
-        35: "Shaco",
-        36: "Dr.Mundo",
-        37: "Sona",
-        38: "Kassadin",
-        39: "Irelia",
-        40: "Janna",
-        41: "Gangplank",
-        42: "Corki",
-        43: "Karma",
-        44: "Taric",
-        45: "Veigar",
-        48: "Trundle",
-        50: "Swain",
-        51: "Caitlyn",
-        53: "Blitzcrank",
-        54: "Malphite",
-        55: "Katarina",
-        56: "Nocturne",
-        57: "Maokai",
-        58: "Renekton",
-        59: "JarvanIV",
-        60: "Elise",
-        61: "Orianna",
-        62: "Wukong",
-        63: "Brand",
-        64: "LeeSin",
-        67: "Vayne",
-        68: "Rumble",
-        69: "Cassiopeia",
-        72: "Skarner",
-        74: "Heimerdinger",
-        75: "Nasus",
-        76: "Nidalee",
-        77: "Udyr",
-        78: "Poppy",
-        79: "Gragas",
-        80: "Pantheon",
-        81: "Ezreal",
-        82: "Mordekaiser",
-        83: "Yorick",
-        84: "Akali",
-        85: "Kennen",
-        86: "Garen",
-        89: "Leona",
-        90: "Malzahar",
-        91: "Talon",
-        92: "Riven",
-        96: "Kog'Maw",
-        98: "Shen",
-        99: "Lux",
-        101: "Xerath",
-        102: "Shyvana",
-        103: "Ahri",
-        104: "Graves",
-        105: "Fizz",
-        106: "Volibear",
-        107: "Rengar",
-        110: "Varus",
-        111: "Nautilus",
-        112: "Viktor",
-        113: "Sejuani",
-        114: "Fiora",
-        115: "Ziggs",
-        117: "Lulu",
-        119: "Draven",
-        120: "Hecarim",
-        121: "Kha'Zix",
-        122: "Darius",
-        126: "Jayce",
-        127: "Lissandra",
-        131: "Diana",
-        133: "Quinn",
-        134: "Syndra",
-        136: "AurelionSol",
-        141: "Kayn",
-        142: "Zoe",
-        143: "Zyra",
-        145: "Kai'sa",
-        147: "Seraphine",
-        150: "Gnar",
-        154: "Zac",
-        157: "Yasuo",
-        161: "Vel'Koz",
-        163: "Taliyah",
-        164: "Camille",
-        201: "Braum",
-        202: "Jhin",
-        203: "Kindred",
-        222: "Jinx",
-        223: "TahmKench",
-        234: "Viego",
-        235: "Senna",
-        236: "Lucian",
-        238: "Zed",
-        240: "Kled",
-        245: "Ekko",
-        246: "Qiyana",
-        254: "Vi",
-        266: "Aatrox",
-        267: "Nami",
-        268: "Azir",
-        350: "Yuumi",
-        360: "Samira",
-        412: "Thresh",
-        420: "Illaoi",
-        421: "Rek'Sai",
-        427: "Ivern",
-        429: "Kalista",
-        432: "Bard",
-        497: "Rakan",
-        498: "Xayah",
-        516: "Ornn",
-        517: "Sylas",
-        523: "Aphelios",
-        518: "Neeko",
-        526: "Rell",
-        555: "Pyke",
-        777: "Yone",
-        875: "Sett",
-        876: "Lillia",
-    }
-    return all_champion_id.get(id)
+    return champion_names(id)
 
 def get_champions_role(id):
     '''
-    Função simples para armazenar um dicionário.
-    Recebe o id e retorna o nome do campeão de acordo com o id.
+    Recebe o id e retorna a classe do campeão (Burst, Diver, ...) de acordo com o id.
+    As classes vêm da tabela de campeões (champions.json), montada uma única vez.
+    Para converter uma coluna inteira, usar champions.champion_classes.
     '''
-    all_champion_id = {
-        1: "Burst",
-        2: "Diver",
-        3: "Warden",
-        4: "Burst",
-        5: "Diver",
-        6: "Juggernaut",
-        7: "Burst",
-        8: "BattleMage",
-        9: "Specialist",
-        10: "Specialist",
-        11: "Skirmisher",
-        12: "Vanguard",
-        13: "BattleMage",
-        14: "Vanguard",
-        15: "Marksman",
-        16: "Enchanter",
-        17: "Specialist",
-        18: "Marksman",
-        19: "Diver",
-        20: "Vanguard",
-        21: "Marksman",
-        22: "Marksman",
-        23: "Skirmisher",
-        24: "Skirmisher",
-        25: "Catcher",
-        26: "Specialist",
-        27: "Specialist",
-        28: "Assassin",
-        29: "Marksman",
-        30: "BattleMage",
-        31: "Specialist",
-        32: "Vanguard",
-        33: "Vanguard",
-        34: "BattleMage",
-        35: "Assassin",
-        36: "Juggernaut",
-        37: "Enchanter",
-        38: "Assassin",
-        39: "Diver",
-        40: "Enchanter",
-        41: "Specialist",
-        42: "Marksman",
-        43: "Enchanter",
-        44: "Warden",
-        45: "Burst",
-        48: "Juggernaut",
-        50: "BattleMage",
-        51: "Marksman",
-        53: "Catcher",
-        54: "Vanguard",
-        55: "Assassin",
-        56: "Assassin",
-        57: "Vanguard",
-        58: "Diver",
-        59: "Diver",
-        60: "Diver",
-        61: "Burst",
-        62: "Diver",
-        63: "Burst",
-        64: "Diver",
-        67: "Marksman",
-        68: "BattleMage",
-        69: "BattleMage",
-        72: "Diver",
-        74: "Specialist",
-        75: "Juggernaut",
-        76: "Specialist",
-        77: "Juggernaut",
-        78: "Warden",
-        79: "Vanguard",
-        80: "Diver",
-        81: "Marksman",
-        82: "BattleMage",
-        83: "Juggernaut",
-        84: "Assassin",
-        85: "BattleMage",
-        86: "Juggernaut",
-        89: "Vanguard",
-        90: "BattleMage",
-        91: "Assassin",
-        92: "Skirmisher",
-        96: "Marksman",
-        98: "Warden",
-        99: "Burst",
-        101: "Artillery",
-        102: "Juggernaut",
-        103: "Burst",
-        104: "Specialist",
-        105: "Assassin",
-        106: "Juggernaut",
-        107: "Assassin",
-        110: "Marksman",
-        111: "Vanguard",
-        112: "BattleMage",
-        113: "Vanguard",
-        114: "Skirmisher",
-        115: "Artillery",
-        117: "Enchanter",
-        119: "Marksman",
-        120: "Diver",
-        121: "Assassin",
-        122: "Juggernaut",
-        126: "Artillery",
-        127: "Burst",
-        131: "Assassin",
-        133: "Specialist",
-        134: "Burst",
-        136: "BattleMage",
-        141: "Skirmisher",
-        142: "Burst",
-        143: "Catcher",
-        145: "Marksman",
-        147: "Enchanter",
-        150: "Specialist",
-        154: "Vanguard",
-        157: "Skirmisher",
-        161: "Artillery",
-        163: "BattleMage",
-        164: "Diver",
-        201: "Warden",
-        202: "Marksman",
-        203: "Marksman",
-        222: "Marksman",
-        223: "Warden",
-        234: "Skirmisher",
-        235: "Marksman",
-        236: "Marksman",
-        238: "Assassin",
-        240: "Skirmisher",
-        245: "Assassin",
-        246: "Assassin",
-        254: "Diver",
-        266: "Juggernaut",
-        267: "Enchanter",
-        268: "Specialist",
-        350: "Enchanter",
-        360: "Marksman",
-        412: "Catcher",
-        420: "Juggernaut",
-        421: "Diver",
-        427: "Catcher",
-        429: "Marksman",
-        432: "Catcher",
-        497: "Catcher",
-        498: "Marksman",
-        516: "Vanguard",
-        517: "Skirmisher",
-        523: "Marksman",
-        518: "Burst",
-        526: "Vanguard",
-        555: "Assassin",
-        777: "Skirmisher",
-        875: "Juggernaut",
-        876: "Skirmisher",
-    }
-    return all_champion_id.get(id)
+    return champion_classes(id)
+
 
 
+# XP mínimo de cada level a partir do 5 (abaixo de 1720 de xp o level é 4, a partir de 8580 é 12)
+XP_LEVEL_THRESHOLDS = np.array([1720, 2400, 3180, 4060, 5040, 6120, 7300, 8580])
 
 def xp_to_level(xp):
     '''
      Função simples para binnar o xp de acordo com o level.
+     Aceita um número, um array ou uma Series (nesse caso binna todos os valores de uma vez).
     '''
-    if xp < 1720:
-        return 4.0
-    elif xp < 2400:
-        return 5.0
-    elif xp < 3180:
-        return 6.0
-    elif xp < 4060:
-        return 7.0
-    elif xp < 5040:
-        return 8.0
-    elif xp < 6120:
-        return 9.0
-    elif xp < 7300:
-        return 10.0
-    elif xp < 8580:
-        return 11.0
-    else:
-        return 12.0
\ No newline at end of file
+    levels = 4.0 + np.searchsorted(XP_LEVEL_THRESHOLDS, xp, side = 'right')
+
+    if isinstance(xp, pd.Series):
+        return pd.Series(levels, index = xp.index, name = xp.name)
+    return levels
+
+def engineered_feature_arrays(columns):
+    '''
+     Essa função toma como parâmetro obrigatório as colunas de uma ou mais partidas (um DataFrame com as colunas
+     de create_match_row ou um dicionário {coluna: array}, como os de match_row_arrays).
+
+     Ela calcula, para cada time, as features derivadas do notebook de preprocessing - meanLevel, monsterControl,
+     mapControl, greatStart e a classe do campeão de cada lane (role{LANE}) - além do deltaGold.
+
+     A função retorna um dicionário {coluna nova: array}, na ordem das colunas de build_engineered_features.
+    '''
+    def col(name):
+        return np.asarray(columns[name])
+
+    new_columns = {}
+
+    for c in ['blue', 'red']:
+        # xp to level (xp médio dos 5 players)
+        new_columns[f'meanLevel_{c}'] = xp_to_level(col(f'xp_{c}') / 5)
+
+        # objective_control
+
+        # monster
+        new_columns[f'monsterControl_{c}'] = (col(f'fireDragonsDestroyed_{c}') + col(f'airDragonsDestroyed_{c}')
+                                              + col(f'waterDragonsDestroyed_{c}') + col(f'earthDragonsDestroyed_{c}')
+                                              + col(f'riftHeraldDestroyed_{c}'))
+        # tower
+        new_columns[f'mapControl_{c}'] = (col(f'botTowersDestroyed_{c}') + col(f'topTowersDestroyed_{c}')
+                                          + 2*col(f'midTowersDestroyed_{c}'))
+
+        # great start
+        new_columns[f'greatStart_{c}'] = np.where((col(f'xp_{c}') > 18000) & (col(f'totalGold_{c}') > 19000), 1, 0)
+
+        # champion -> role
+        for lane in ['MIDDLE', 'BOTTOM', 'TOP', 'JUNGLE', 'UTILITY']:
+            new_columns[f'role{lane}_{c}'] = champion_classes(col(f'{lane}_{c}'))
+
+    new_columns['deltaGold'] = col('totalGold_blue') - col('totalGold_red')
+
+    return new_columns
+
+@timed()
+def build_engineered_features(df):
+    '''
+     Essa função toma como parâmetro obrigatório um DataFrame de partidas (colunas de create_match_row).
+
+     Ela adiciona as features de engineered_feature_arrays ao DataFrame de uma única vez e converte
+     isWinner_blue para 0/1.
+
+     A função retorna um novo DataFrame com as colunas originais seguidas das novas.
+    '''
+    new_columns = engineered_feature_arrays(df)
+
+    engineered = pd.concat([df, pd.DataFrame(new_columns, index = df.index)], axis = 1)
+    engineered['isWinner_blue'] = np.where(df['isWinner_blue'].to_numpy(), 1, 0)
+
+    return engineered
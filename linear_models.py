@@ -0,0 +1,129 @@
+# Modelos lineares do notebook de modelagem treinados direto sobre as matrizes esparsas (CSR) dos datasets lineares
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.linear_model import LogisticRegression, RidgeClassifier
+from sklearn.model_selection import cross_val_score, train_test_split
+from sklearn.svm import LinearSVC, LinearSVR
+
+
+class LinearDataset:
+    '''
+     Uma variante linear do dataset (df_linear, df_linear_sparse, df_linear_dropout) no formato dos modelos:
+     X é uma matriz CSR (bloco numérico seguido do one-hot dos campeões/classes), y o alvo (isWinner_blue),
+     feature_names os nomes das colunas de X e game_ids o gameID de cada linha.
+
+     Nenhuma operação densifica o one-hot: os modelos lineares do sklearn, o train_test_split e o
+     cross_val_score aceitam a matriz esparsa diretamente.
+    '''
+    def __init__(self, X, y, feature_names, game_ids):
+        self.X = sp.csr_matrix(X)
+        self.y = np.asarray(y)
+        self.feature_names = list(feature_names)
+        self.game_ids = np.asarray(game_ids)
+
+    @classmethod
+    def load(cls, store, name):
+        '''
+         Lê a variante name de um dataset_store.DatasetStore.
+        '''
+        X, y, feature_names = store.load_sparse(name)
+        game_ids = store.load(name, columns = ['gameID'])['gameID'].to_numpy()
+        return cls(X, y, feature_names, game_ids)
+
+    @property
+    def shape(self):
+        return self.X.shape
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    @property
+    def nbytes(self):
+        '''
+         Memória ocupada pela matriz X (dados + índices da CSR).
+        '''
+        return self.X.data.nbytes + self.X.indices.nbytes + self.X.indptr.nbytes
+
+    def subset(self, mask):
+        '''
+         Retorna um novo LinearDataset apenas com as linhas de mask (array de bool ou de posições).
+        '''
+        return LinearDataset(self.X[mask], self.y[mask], self.feature_names, self.game_ids[mask])
+
+    def split(self, random_state = 42, **kwargs):
+        '''
+         train_test_split da matriz esparsa, como no notebook. Retorna (X_train, X_val, y_train, y_val).
+        '''
+        return train_test_split(self.X, self.y, random_state = random_state, **kwargs)
+
+
+def make_linear_classifier(model, **params):
+    '''
+     Instancia os modelos lineares com o max_iter usado no notebook de modelagem.
+    '''
+    if model in [LinearSVC, LinearSVR]:
+        return model(max_iter = 100000, **params)
+
+    if model in [LogisticRegression, RidgeClassifier]:
+        return model(max_iter = 2000, **params)
+
+    return model(**params)
+
+
+def fit_linear_classifiers(datasets, models, cv = 10, n_jobs = None):
+    '''
+     Versão esparsa do fit_linear_classifiers do notebook: recebe um dicionário {nome: LinearDataset} e a lista
+     de classes dos modelos, e retorna a mesma tabela (acurácia média e desvio no k-fold e acurácia de treino
+     de cada modelo, uma linha por dataset). n_jobs é repassado ao cross_val_score.
+    '''
+    np.random.seed(42)
+
+    score_list = []
+
+    for name, dataset in datasets.items():
+        X_train, X_val, y_train, y_val = dataset.split()
+
+        for model in models:
+            print(f'{name}: {model.__name__}')
+
+            clf = make_linear_classifier(model)
+            training_score = clf.fit(X_train, y_train).score(X_train, y_train)
+
+            scores = cross_val_score(clf, X_train, y_train, cv = cv, n_jobs = n_jobs)
+
+            mean, std = np.mean(scores), np.std(scores)
+
+            score_list.append({f'{model.__name__} - {cv}fold mean accuracy': mean,
+                               f'{model.__name__} - {cv}fold std accuracy': std,
+                               f'{model.__name__} - training accuracy': training_score,
+                               'data': name})
+
+    return pd.pivot_table(pd.DataFrame(score_list), index = 'data')
+
+
+def linear_objective(trial, X_train, y_train, X_val, y_val):
+    '''
+     Mesmo espaço de busca do linear_objective do notebook, sobre um split já feito (esparso), para que os
+     trials não repitam o drop e o train_test_split. Uso:
+
+       X_train, X_val, y_train, y_val = linear_sparse.split()
+       study.optimize(lambda trial: linear_objective(trial, X_train, y_train, X_val, y_val), n_trials = 400)
+    '''
+    classifier_name = trial.suggest_categorical('classifier', ['LinearSVC', 'LogisticRegression', 'RidgeClassifier'])
+
+    if classifier_name == 'LinearSVC':
+        c = trial.suggest_float('c', 1e-10, 1e10, log = True)
+        clf = LinearSVC(C = c, max_iter = 10000)
+
+    if classifier_name == 'LogisticRegression':
+        c = trial.suggest_float('c', 1e-10, 1e10, log = True)
+        clf = LogisticRegression(C = c, max_iter = 10000)
+
+    if classifier_name == 'RidgeClassifier':
+        alpha = trial.suggest_float('alpha', 1/2*(1e-10), 1/2*(1e10), log = True)
+        clf = RidgeClassifier(alpha = alpha, max_iter = 10000)
+
+    clf.fit(X_train, y_train)
+
+    return clf.score(X_val, y_val)
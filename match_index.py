@@ -0,0 +1,105 @@
+# Índice persistente das partidas já vistas, para não depender de `match_id not in match_id_list`
+import os
+
+import numpy as np
+
+
+class SeenMatches:
+    '''
+     Conjunto de gameIds já vistos. Os ids persistidos ficam em um array int64 ordenado (.npy), aberto
+     com memory-map, e são buscados por busca binária; os ids novos ficam em um set até o próximo flush.
+
+     path None mantém o índice só em memória. Com path, o índice sobrevive a reinícios do kernel e pode
+     ser compartilhado entre processos: flush une o que está no disco com os ids novos antes de gravar,
+     e refresh recarrega o que outros processos gravaram. flush_every (int) grava automaticamente a cada
+     flush_every ids novos.
+    '''
+    def __init__(self, path = None, flush_every = None):
+        self.path = path
+        self.flush_every = flush_every
+        self._new = set()
+        self._base = self._load()
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return np.empty(0, dtype = np.int64)
+
+        base = np.load(self.path, mmap_mode = 'r')
+        return base if base.size else np.empty(0, dtype = np.int64)
+
+    def __len__(self):
+        return len(self._base) + len(self._new)
+
+    def _in_base(self, game_id):
+        i = np.searchsorted(self._base, game_id)
+        return bool(i < len(self._base) and self._base[i] == game_id)
+
+    def __contains__(self, game_id):
+        return game_id in self._new or self._in_base(game_id)
+
+    def add(self, game_id):
+        if game_id in self:
+            return
+
+        self._new.add(int(game_id))
+
+        if self.flush_every is not None and len(self._new) >= self.flush_every:
+            self.flush()
+
+    def update(self, game_ids):
+        for game_id in game_ids:
+            self.add(game_id)
+
+    def contains_many(self, game_ids):
+        '''
+         Retorna um array de bool dizendo, para cada id de game_ids, se ele já foi visto.
+        '''
+        game_ids = np.asarray(game_ids, dtype = np.int64)
+
+        found = np.zeros(game_ids.shape, dtype = bool)
+        if len(self._base):
+            pos = np.minimum(np.searchsorted(self._base, game_ids), len(self._base) - 1)
+            found = self._base[pos] == game_ids
+
+        if self._new:
+            found |= np.isin(game_ids, np.fromiter(self._new, dtype = np.int64, count = len(self._new)))
+
+        return found
+
+    def filter_new(self, game_ids):
+        '''
+         Retorna, na ordem original e sem repetições, os ids de game_ids que ainda não foram vistos.
+        '''
+        game_ids = np.asarray(game_ids, dtype = np.int64)
+        unseen = game_ids[~self.contains_many(game_ids)]
+
+        _, first = np.unique(unseen, return_index = True)
+        return unseen[np.sort(first)].tolist()
+
+    def flush(self):
+        '''
+         Grava o índice no disco (escrita atômica: arquivo temporário + os.replace).
+        '''
+        if self.path is None:
+            return
+
+        merged = np.union1d(self._load(), self._base)
+        if self._new:
+            merged = np.union1d(merged, np.fromiter(self._new, dtype = np.int64, count = len(self._new)))
+
+        tmp_path = self.path + '.tmp.npy'
+        np.save(tmp_path, merged.astype(np.int64))
+
+        # No Windows o arquivo aberto com memory-map não pode ser substituído
+        self._base = merged
+        os.replace(tmp_path, self.path)
+
+        self._new = set()
+        self._base = self._load()
+
+    def refresh(self):
+        '''
+         Recarrega o índice do disco, mantendo os ids novos ainda não gravados.
+        '''
+        self._base = self._load()
+        self._new = {game_id for game_id in self._new if not self._in_base(game_id)}
@@ -0,0 +1,294 @@
+# Instrumentação do pipeline de extração: tempo por estágio e contadores (requisições, 429, cache, eventos)
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Variável de ambiente que liga a coleta já no import (ex.: LOL_METRICS=1 python ...)
+ENV_VAR = 'LOL_METRICS'
+
+# Prefixo das métricas no arquivo no formato texto do Prometheus
+PROMETHEUS_PREFIX = 'lol'
+
+
+class Metrics:
+    '''
+     Registro de timers por estágio e de contadores do pipeline. Com enabled False (o padrão) as chamadas
+     de count/observe e os wrappers de timed só checam o atributo enabled, então a instrumentação pode ficar
+     no código sem custo; ligada, cada estágio guarda apenas (chamadas, segundos, máximo) - sem histogramas
+     nem uma entrada por chamada - para poder ficar ligada em produção.
+
+     Os tempos são inclusivos: o tempo de extract_match_rows inclui o de match_row_arrays, que inclui o de
+     match_snapshots, etc.
+
+     As leituras e escritas do registro passam por um lock, já que ele é compartilhado entre as threads do
+     pipeline e a do MetricsReporter.
+
+     Contadores usados no projeto:
+       requests, responses_429, responses_5xx, connection_errors (RiotClient.request)
+       cache_hits, cache_misses (cache.MatchCache no crawl), role_cache_hits, role_cache_disk_hits, role_cache_misses
+       matches (partidas extraídas), matches_crawled (partidas entregues pelo crawl), timelines e events (eventos
+       percorridos pelos timelines), extraction_failures
+    '''
+    def __init__(self, enabled = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = defaultdict(int)
+            self.timers = {}
+            self.started = time.time()
+
+    def count(self, name, value = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += value
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            timer = self.timers.get(stage)
+            if timer is None:
+                timer = self.timers[stage] = [0, 0.0, 0.0]
+
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+
+    def timer(self, stage):
+        '''
+         Context manager que mede o bloco como o estágio stage.
+        '''
+        return _Timer(self, stage)
+
+    def snapshot(self):
+        '''
+         Cópia dos contadores e timers: {'counters': {nome: valor}, 'timers': {estágio: (chamadas, segundos, máximo)}}.
+        '''
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        return {'counters': dict(self.counters), 'timers': {stage: tuple(timer) for stage, timer in self.timers.items()}}
+
+    def drain(self):
+        '''
+         Retorna o snapshot e zera o registro (usado pelos workers de extraction, que mandam os números de cada
+         bloco para o processo principal).
+        '''
+        with self._lock:
+            snapshot = self._snapshot()
+            self.counters = defaultdict(int)
+            self.timers = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        '''
+         Soma ao registro um snapshot vindo de outro processo.
+        '''
+        if not self.enabled:
+            return
+
+        with self._lock:
+            for name, value in snapshot['counters'].items():
+                self.counters[name] += value
+
+            for stage, (calls, seconds, longest) in snapshot['timers'].items():
+                timer = self.timers.setdefault(stage, [0, 0.0, 0.0])
+                timer[0] += calls
+                timer[1] += seconds
+                timer[2] = max(timer[2], longest)
+
+    def log_line(self, previous = None, elapsed = None):
+        '''
+         Resumo em uma linha. Com previous (snapshot anterior) e elapsed (segundos desde ele), as taxas e os
+         tempos são os do intervalo; sem eles, os acumulados desde o reset.
+        '''
+        current = self.snapshot()
+        previous = previous or {'counters': {}, 'timers': {}}
+        elapsed = elapsed if elapsed is not None else time.time() - self.started
+
+        counters = {name: value - previous['counters'].get(name, 0) for name, value in current['counters'].items()}
+        timers = {}
+        for stage, (calls, seconds, longest) in current['timers'].items():
+            before = previous['timers'].get(stage, (0, 0.0, 0.0))
+            if calls > before[0]:
+                timers[stage] = (calls - before[0], seconds - before[1])
+
+        rate = lambda name: counters.get(name, 0) / elapsed if elapsed > 0 else 0.0
+        cache_total = counters.get('cache_hits', 0) + counters.get('cache_misses', 0)
+        parts = [f'{rate("matches"):.1f} matches/s',
+                 f'{rate("requests"):.1f} req/s',
+                 f'429={counters.get("responses_429", 0)}',
+                 f'cache hit {counters.get("cache_hits", 0) / cache_total:.0%}' if cache_total else 'cache hit -',
+                 f'{counters.get("events", 0) / counters["timelines"]:.0f} events/timeline'
+                 if counters.get('timelines') else 'events/timeline -']
+
+        # Estágios ordenados pelo tempo gasto no intervalo
+        stages = [f'{stage} {seconds / calls * 1000:.2f}ms x{calls} ({seconds:.1f}s)'
+                  for stage, (calls, seconds) in sorted(timers.items(), key = lambda item: -item[1][1])]
+
+        return ', '.join(parts) + (' | ' + ', '.join(stages) if stages else '')
+
+    def prometheus_text(self):
+        '''
+         Contadores e timers no formato texto de exposição do Prometheus (para o textfile collector do
+         node_exporter). Taxas como matches/s saem de rate() sobre os contadores.
+        '''
+        snapshot = self.snapshot()
+        p = PROMETHEUS_PREFIX
+        lines = [f'# HELP {p}_uptime_seconds Segundos desde o início da coleta',
+                 f'# TYPE {p}_uptime_seconds gauge',
+                 f'{p}_uptime_seconds {time.time() - self.started:.3f}']
+
+        for name, value in sorted(snapshot['counters'].items()):
+            lines += [f'# TYPE {p}_{name}_total counter', f'{p}_{name}_total {value}']
+
+        series = [('stage_calls_total', 'counter', 0, 'Chamadas por estágio'),
+                  ('stage_seconds_total', 'counter', 1, 'Segundos acumulados por estágio (inclusivo)'),
+                  ('stage_max_seconds', 'gauge', 2, 'Chamada mais longa por estágio')]
+
+        for metric, kind, position, description in series:
+            lines += [f'# HELP {p}_{metric} {description}', f'# TYPE {p}_{metric} {kind}']
+            for stage, timer in sorted(snapshot['timers'].items()):
+                lines.append(f'{p}_{metric}{{stage="{stage}"}} {timer[position]:.6g}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        '''
+         Grava prometheus_text em path (via arquivo temporário + rename, então o coletor nunca lê um arquivo
+         pela metade).
+        '''
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+# Registro global, ligado pela variável de ambiente LOL_METRICS ou por enable
+METRICS = Metrics(enabled = os.environ.get(ENV_VAR, '') not in ('', '0'))
+
+
+def timed(stage = None):
+    '''
+     Decorator que mede cada chamada da função (síncrona ou async) como o estágio stage (padrão: o nome da
+     função) no registro global. Com o registro desligado, o custo é o de uma chamada extra.
+    '''
+    def decorator(func):
+        name = stage or func.__name__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not METRICS.enabled:
+                    return await func(*args, **kwargs)
+
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    METRICS.observe(name, time.perf_counter() - start)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsReporter:
+    '''
+     Thread que, a cada interval segundos, loga o log_line do intervalo (nível INFO) e, com path, regrava o
+     arquivo do Prometheus. stop (ou o fim do with) grava um último relatório com o acumulado.
+    '''
+    def __init__(self, metrics = METRICS, interval = 60, path = None):
+        self.metrics = metrics
+        self.interval = interval
+        self.path = path
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._run, name = 'metrics-reporter', daemon = True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def report(self, previous = None, elapsed = None):
+        logger.info('metrics: %s', self.metrics.log_line(previous, elapsed))
+        if self.path is not None:
+            self.metrics.write_prometheus(self.path)
+
+    def _run(self):
+        previous, last = self.metrics.snapshot(), time.time()
+
+        while not self._stop.wait(self.interval):
+            now = time.time()
+            self.report(previous, now - last)
+            previous, last = self.metrics.snapshot(), now
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._stop.set()
+            self._thread.join()
+            self.report()
+
+
+def enable(interval = 60, path = None, report = True):
+    '''
+     Liga a coleta no registro global e, com report, inicia um MetricsReporter (retornado, para o stop no fim
+     do crawl). Uso:
+
+       reporter = metrics.enable(interval = 30, path = 'metrics/lol.prom')
+       ...
+       reporter.stop()
+    '''
+    METRICS.enabled = True
+    if report:
+        return MetricsReporter(METRICS, interval = interval, path = path).start()
+
+
+def disable():
+    METRICS.enabled = False
@@ -0,0 +1,384 @@
+# Previsão do time vencedor aos 10min a partir do JSON cru de uma partida, com o modelo e o preprocessing carregados uma vez
+#
+# Uso: python prediction.py modelo.pkl preprocessing_state.json [porta]
+import asyncio
+import json
+import pickle
+import sys
+import time
+
+import numpy as np
+from aiohttp import web
+
+from explanations import catboost_pool, contributions, top_contributions
+from helper import engineered_feature_arrays, match_row_arrays
+from preprocessing import PreprocessingState
+from role_cache import RoleCache
+from scorer import PowerParams
+
+# Variantes do preprocessing: 'linear' (df_linear*, numéricas normalizadas + one-hot) ou 'boosted' (df_boosted*, label encoding)
+VARIANTS = ('linear', 'boosted')
+
+
+class FeatureEncoder:
+    '''
+     Aplica o PreprocessingState às colunas de match_row_arrays + engineered_feature_arrays e monta a matriz
+     de features na ordem de feature_names (a ordem usada no treino), sem passar por DataFrames.
+
+     No variant 'linear' as colunas numéricas passam pelo PowerTransformer e as colunas de campeões/classes
+     viram one-hot ({coluna}_{valor}, como no pd.get_dummies e no preprocessing.one_hot_csr); campeões fora das
+     features do modelo (outliers da variante dropout, campeões novos) ficam zerados. No variant 'boosted' as
+     colunas de campeões/classes recebem o código do LabelEncoder, e valores fora do vocabulário viram NaN.
+    '''
+    def __init__(self, state, feature_names, variant = 'linear'):
+        if variant not in VARIANTS:
+            raise ValueError(f"variant deve ser 'linear' ou 'boosted', não {variant!r}")
+
+        self.state = state
+        self.feature_names = list(feature_names)
+        self.variant = variant
+
+        lane_columns = list(state.vocabularies)
+        position = {name: j for j, name in enumerate(self.feature_names)}
+
+        # (coluna, posição na matriz) das features que são colunas da linha da partida
+        self._numeric = [(name, j) for name, j in position.items() if name not in state.vocabularies]
+        self._categorical = {}
+        self._power = None
+
+        if variant == 'linear':
+            for column in lane_columns:
+                lookup = {value: position[f'{column}_{value}'] for value in state.vocabularies[column]
+                          if f'{column}_{value}' in position}
+                self._categorical[column] = lookup
+
+            one_hot = {j for lookup in self._categorical.values() for j in lookup.values()}
+            self._numeric = [(name, j) for name, j in self._numeric if j not in one_hot]
+
+            # Parâmetros do PowerTransformer das features numéricas, para transformar todas as colunas de uma vez
+            power = [(j, *state.power[name]) for name, j in self._numeric if name in state.power]
+            if power:
+                self._power = PowerParams(*map(np.array, zip(*power)))
+        else:
+            for column in lane_columns:
+                if column in position:
+                    self._categorical[column] = ({value: code for code, value in enumerate(state.vocabularies[column])},
+                                                 position[column])
+
+    def transform(self, columns):
+        '''
+         Recebe as colunas de uma ou mais partidas ({coluna: array}) e retorna a matriz (n_partidas, n_features).
+        '''
+        n_rows = len(columns['gameID'])
+        X = np.zeros((n_rows, len(self.feature_names)), dtype = np.float64)
+
+        for name, j in self._numeric:
+            if name not in columns:
+                raise KeyError(f'feature {name!r} não é gerada pela extração nem pelo preprocessing')
+
+            X[:, j] = columns[name]
+
+        if self._power is not None:
+            X[:, self._power.index] = self._power.transform(X[:, self._power.index])
+
+        if self.variant == 'linear':
+            for column, lookup in self._categorical.items():
+                for i, value in enumerate(columns[column]):
+                    j = lookup.get(_python_value(value))
+                    if j is not None:
+                        X[i, j] = 1.0
+        else:
+            for column, (codes, j) in self._categorical.items():
+                X[:, j] = [codes.get(_python_value(value), np.nan) for value in columns[column]]
+
+        return X
+
+
+def _python_value(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+def positive_proba(model, X):
+    '''
+     Probabilidade da classe positiva (vitória do time azul) para os modelos do notebook de modelagem:
+     predict_proba (LogisticRegression, CatBoost, LGBMClassifier), decision_function passado pela sigmoide
+     (LinearSVC, RidgeClassifier - um score, não uma probabilidade calibrada) ou predict de um lgbm.Booster.
+    '''
+    # Modelos lineares binários do sklearn: o mesmo cálculo do predict_proba/decision_function, sem a validação
+    # de entrada do sklearn (que custa mais que o próprio produto escalar em uma partida só)
+    coef = getattr(model, 'coef_', None)
+    if coef is not None and hasattr(model, 'decision_function') and np.ndim(coef) == 2 and len(coef) == 1:
+        scores = X @ coef[0] + np.ravel(model.intercept_)[0]
+        return 1 / (1 + np.exp(-scores))
+
+    # CatBoost: DataFrame com os nomes das features do treino e as colunas categóricas inteiras
+    if hasattr(model, 'get_cat_feature_indices'):
+        return model.predict_proba(catboost_pool(model, X))[:, 1]
+
+    if hasattr(model, 'predict_proba'):
+        return model.predict_proba(X)[:, 1]
+
+    if hasattr(model, 'decision_function'):
+        return 1 / (1 + np.exp(-model.decision_function(X)))
+
+    return np.asarray(model.predict(X), dtype = np.float64)
+
+
+class MatchPredictor:
+    '''
+     Modelo treinado + PreprocessingState carregados uma única vez. predict recebe o par (game_info, timeline)
+     cru da API e retorna a probabilidade de vitória do time azul no frame n; predict_many faz o mesmo para
+     várias partidas com uma única chamada ao modelo.
+
+     A extração reaproveita helper.match_row_arrays e helper.engineered_feature_arrays, e as roles ficam em um
+     role_cache.RoleCache (com role_cache_path, compartilhado com a extração e entre reinícios).
+
+     explain_many devolve, junto com as probabilidades, as features que mais contribuíram para cada previsão
+     (explanations.contributions). Modelos lineares precisam de background_mean, a média das features no set
+     de treino (ex.: np.asarray(X_train.mean(axis = 0)).ravel()), gravada junto com o modelo.
+    '''
+    def __init__(self, model, state, feature_names, champion_roles, variant = 'linear', n = 10, role_cache = None,
+                 background_mean = None):
+        self.model = model
+        self.state = state
+        self.n = n
+        self.champion_roles = champion_roles
+        self.role_cache = role_cache or RoleCache(champion_roles)
+        self.encoder = FeatureEncoder(state, feature_names, variant)
+        self.background_mean = background_mean
+
+    @property
+    def feature_names(self):
+        return self.encoder.feature_names
+
+    @property
+    def variant(self):
+        return self.encoder.variant
+
+    def save(self, path):
+        '''
+         Grava o modelo com as informações necessárias para reconstruir as features (o estado do preprocessing
+         fica no seu próprio JSON, ver PreprocessingState.save).
+        '''
+        with open(path, 'wb') as f:
+            pickle.dump({'model': self.model, 'feature_names': self.feature_names, 'variant': self.variant,
+                         'n': self.n, 'background_mean': self.background_mean}, f)
+
+    @classmethod
+    def load(cls, path, state_path, champion_roles = None, role_cache_path = None):
+        '''
+         Carrega um modelo gravado por save e o PreprocessingState. Sem champion_roles, as playrates são
+         baixadas com roleidentification.pull_data (como no notebook de extração).
+        '''
+        with open(path, 'rb') as f:
+            bundle = pickle.load(f)
+
+        if champion_roles is None:
+            from roleidentification import pull_data
+            champion_roles = pull_data()
+
+        return cls(bundle['model'], PreprocessingState.load(state_path), bundle['feature_names'], champion_roles,
+                   variant = bundle['variant'], n = bundle['n'],
+                   role_cache = RoleCache(champion_roles, path = role_cache_path),
+                   background_mean = bundle.get('background_mean'))
+
+    def features(self, pairs):
+        '''
+         Monta a matriz de features de uma lista de pares (game_info, timeline). Retorna (gameIds, X), apenas
+         com as partidas que chegaram ao frame n.
+        '''
+        arrays = match_row_arrays([t for _, t in pairs], [g for g, _ in pairs], self.champion_roles,
+                                  cutoffs = [self.n], role_cache = self.role_cache)[self.n]
+        arrays.update(engineered_feature_arrays(arrays))
+
+        return arrays['gameID'], self.encoder.transform(arrays)
+
+    def predict_many(self, pairs):
+        '''
+         Retorna um array com a probabilidade de vitória do time azul de cada par (game_info, timeline), na
+         ordem de pairs. Partidas que terminaram antes do frame n ficam com NaN.
+        '''
+        proba = np.full(len(pairs), np.nan)
+        scorable = [i for i, (_, timeline) in enumerate(pairs) if len(timeline['frames']) > self.n]
+
+        if scorable:
+            _, X = self.features([pairs[i] for i in scorable])
+            proba[scorable] = positive_proba(self.model, X)
+
+        return proba
+
+    def predict(self, game_info, timeline):
+        return float(self.predict_many([(game_info, timeline)])[0])
+
+    def explain_many(self, pairs, top_k = 5):
+        '''
+         Mesmo que predict_many, mas retorna (proba, explanations): explanations tem, para cada par, as top_k
+         features com maior contribuição SHAP (em log-odds) na previsão (ver explanations.top_contributions), ou
+         None para as partidas que terminaram antes do frame n. As features são montadas uma única vez para as
+         duas saídas.
+        '''
+        proba = np.full(len(pairs), np.nan)
+        explanations = [None] * len(pairs)
+        scorable = [i for i, (_, timeline) in enumerate(pairs) if len(timeline['frames']) > self.n]
+
+        if scorable:
+            _, X = self.features([pairs[i] for i in scorable])
+            values = contributions(self.model, X, self.background_mean)
+
+            # A soma das contribuições é a margem do modelo: a probabilidade sai dela, sem uma segunda chamada
+            proba[scorable] = 1 / (1 + np.exp(-values.sum(axis = 1)))
+            for i, explanation in zip(scorable, top_contributions(values, X, self.feature_names, top_k = top_k)):
+                explanations[i] = explanation
+
+        return proba, explanations
+
+
+class PredictionServer:
+    '''
+     Endpoint HTTP local do MatchPredictor:
+
+       POST /predict        {"match": MatchDto, "timeline": MatchTimelineDto} -> {"gameId", "probability_blue"}
+       POST /predict/batch  [{"match": ..., "timeline": ...}, ...]            -> lista de respostas
+       GET  /health
+
+     Com explain_top_k > 0, cada resposta também traz "explanation" (MatchPredictor.explain_many), calculada no
+     mesmo lote da previsão.
+
+     Com max_batch > 1, as requisições de /predict que chegam dentro de max_wait segundos são agrupadas
+     (micro-batching) e pontuadas em uma única chamada ao modelo, trocando alguns milissegundos de latência
+     por throughput. Os contadores requests e batches permitem ver o tamanho médio dos lotes.
+    '''
+    def __init__(self, predictor, max_batch = 1, max_wait = 0.002, explain_top_k = 0):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.explain_top_k = explain_top_k
+
+        self.requests = 0
+        self.batches = 0
+
+        self.app = web.Application(client_max_size = 32 * 1024 ** 2)
+        self.app.add_routes([web.post('/predict', self._predict),
+                             web.post('/predict/batch', self._predict_batch),
+                             web.get('/health', self._health)])
+        self.app.on_startup.append(self._start_batcher)
+        self.app.on_cleanup.append(self._stop_batcher)
+
+        self._queue = None
+        self._batcher = None
+        self._runner = None
+        self.url = None
+
+    def _score(self, pairs):
+        self.batches += 1
+
+        if not self.explain_top_k:
+            proba = self.predictor.predict_many(pairs)
+            return [{'gameId': game_info.get('gameId'), 'probability_blue': None if np.isnan(p) else float(p)}
+                    for (game_info, _), p in zip(pairs, proba)]
+
+        proba, explanations = self.predictor.explain_many(pairs, top_k = self.explain_top_k)
+        return [{'gameId': game_info.get('gameId'), 'probability_blue': None if np.isnan(p) else float(p),
+                 'explanation': explanation}
+                for (game_info, _), p, explanation in zip(pairs, proba, explanations)]
+
+    async def _start_batcher(self, app):
+        if self.max_batch > 1:
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def _stop_batcher(self, app):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions = True)
+
+    async def _batch_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Futures já resolvidos (ex.: cancelados quando o cliente desconectou) são ignorados
+            try:
+                results = self._score([pair for pair, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    @staticmethod
+    def _pair(body):
+        try:
+            return body['match'], body['timeline']
+        except (KeyError, TypeError):
+            raise web.HTTPBadRequest(text = 'corpo deve ser {"match": MatchDto, "timeline": MatchTimelineDto}')
+
+    @staticmethod
+    async def _json(request):
+        try:
+            return await request.json()
+        except json.JSONDecodeError:
+            raise web.HTTPBadRequest(text = 'corpo deve ser um JSON válido')
+
+    async def _predict(self, request):
+        self.requests += 1
+        pair = self._pair(await self._json(request))
+
+        if self._queue is None:
+            return web.json_response(self._score([pair])[0])
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((pair, future))
+        return web.json_response(await future)
+
+    async def _predict_batch(self, request):
+        body = await self._json(request)
+        if not isinstance(body, list):
+            raise web.HTTPBadRequest(text = 'corpo deve ser uma lista de {"match", "timeline"}')
+
+        self.requests += len(body)
+        return web.json_response(self._score([self._pair(item) for item in body]))
+
+    async def _health(self, request):
+        return web.json_response({'status': 'ok', 'variant': self.predictor.variant, 'n': self.predictor.n,
+                                  'requests': self.requests, 'batches': self.batches})
+
+    async def start(self, host = '127.0.0.1', port = 0):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}'
+        return self.url
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+if __name__ == '__main__':
+    predictor = MatchPredictor.load(sys.argv[1], sys.argv[2])
+    port = int(sys.argv[3]) if len(sys.argv) > 3 else 8080
+    web.run_app(PredictionServer(predictor, max_batch = 32).app, host = '127.0.0.1', port = port)
@@ -0,0 +1,441 @@
+# Pipeline de preprocessing em blocos (fit + transform), com memória limitada pelo tamanho do bloco
+import glob
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from dataset_store import DatasetStore
+from helper import ROLE_COLUMNS, build_engineered_features
+
+# Colunas numéricas normalizadas com o PowerTransformer (yeo-johnson) nos datasets lineares
+NUM_COLUMNS = ['totalGold_red', 'xp_red', 'nKills_red', 'nDeaths_red',
+               'nAssists_red', 'minionsKilled_red', 'jungleMinionsKilled_red',
+               'wardsPlaced_red', 'wardsKilled_red', 'meanLevel_red',
+               'totalGold_blue', 'xp_blue', 'nKills_blue', 'nDeaths_blue',
+               'nAssists_blue', 'minionsKilled_blue', 'jungleMinionsKilled_blue',
+               'wardsPlaced_blue', 'wardsKilled_blue', 'meanLevel_blue',
+               'deltaGold']
+
+# Colunas removidas dos datasets lineares
+LINEAR_DROP = ['meanLevel_blue', 'meanLevel_red', 'nDeaths_blue', 'nDeaths_red']
+
+# Campeões (ou classes) com frequência até 0.1% são considerados outliers
+OUTLIER_FREQUENCY = 0.001
+
+# Grade de lambdas do yeo-johnson: uma grade grossa no primeiro passe e uma fina em volta do melhor lambda no segundo
+COARSE_LAMBDAS = np.round(np.arange(-3, 3.0001, 0.1), 10)
+FINE_STEP = 0.001
+FINE_WINDOW = 0.06
+
+
+def is_lane_column(column):
+    '''
+     Colunas de campeões e de classes (possuem alguma lane no nome), como no notebook.
+    '''
+    return any(lane in column for lane in ROLE_COLUMNS)
+
+
+def is_champion_column(column):
+    '''
+     Apenas as colunas de campeões (começam com a lane, ex.: TOP_red).
+    '''
+    return any(column.startswith(lane) for lane in ROLE_COLUMNS)
+
+
+def yeo_johnson(x, lmbda):
+    '''
+     Transformação yeo-johnson de x. lmbda pode ser um número ou um array (nesse caso o retorno tem uma
+     coluna por lambda, no formato (len(x), len(lmbda))).
+    '''
+    x = np.asarray(x, dtype = np.float64)
+    lmbda = np.asarray(lmbda, dtype = np.float64)
+
+    if lmbda.ndim:
+        x = x[:, None]
+
+    pos = x >= 0
+    out = np.empty(np.broadcast(x, lmbda).shape)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+        lam_pos = np.broadcast_to(lmbda, out.shape)
+        x_full = np.broadcast_to(x, out.shape)
+        pos = np.broadcast_to(pos, out.shape)
+
+        zero = np.isclose(lam_pos, 0)
+        two = np.isclose(lam_pos, 2)
+
+        pos_value = np.where(zero, np.log1p(np.abs(x_full)), (np.power(np.abs(x_full) + 1, lam_pos) - 1) / lam_pos)
+        neg_value = np.where(two, -np.log1p(np.abs(x_full)),
+                             -(np.power(np.abs(x_full) + 1, 2 - lam_pos) - 1) / (2 - lam_pos))
+
+        out[...] = np.where(pos, pos_value, neg_value)
+
+    return out
+
+
+class _YeoJohnsonStats:
+    '''
+     Estatísticas suficientes para escolher o lambda do yeo-johnson por máxima verossimilhança em uma
+     grade de lambdas, acumuladas bloco a bloco (média e soma dos quadrados combinadas pelo algoritmo de Chan).
+    '''
+    def __init__(self, lambdas):
+        self.lambdas = np.asarray(lambdas, dtype = np.float64)
+        self.n = 0
+        self.mean = np.zeros(len(self.lambdas))
+        self.m2 = np.zeros(len(self.lambdas))
+        self.log_term = 0.0
+
+    def update(self, x):
+        x = np.asarray(x, dtype = np.float64)
+        if not len(x):
+            return
+
+        y = yeo_johnson(x, self.lambdas)
+        n_b = len(x)
+        mean_b = y.mean(axis = 0)
+        m2_b = ((y - mean_b) ** 2).sum(axis = 0)
+
+        delta = mean_b - self.mean
+        total = self.n + n_b
+        self.mean = self.mean + delta * n_b / total
+        self.m2 = self.m2 + m2_b + delta ** 2 * self.n * n_b / total
+        self.n = total
+
+        self.log_term += (np.sign(x) * np.log1p(np.abs(x))).sum()
+
+    def best(self):
+        '''
+         Retorna (lambda, média, desvio padrão) do lambda de maior log-verossimilhança da grade.
+        '''
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            loglike = -self.n / 2 * np.log(self.m2 / self.n) + (self.lambdas - 1) * self.log_term
+
+        i = int(np.nanargmax(loglike))
+        return float(self.lambdas[i]), float(self.mean[i]), float(np.sqrt(self.m2[i] / self.n))
+
+
+class _SortedIds:
+    '''
+     gameIds já lidos por read_chunks: um array int64 ordenado em um .npy no disco (aberto com memory-map).
+     add intercala os ids de um bloco no arquivo em pedaços de block_size, então a memória fica limitada pelo
+     bloco e por block_size, e não pelo tamanho do dataset.
+    '''
+    def __init__(self, directory, block_size = 1 << 20):
+        self.path = os.path.join(directory, 'ids.npy')
+        self.block_size = block_size
+        self.ids = np.empty(0, dtype = np.int64)
+
+    def contains_many(self, game_ids):
+        game_ids = np.asarray(game_ids, dtype = np.int64)
+        if not len(self.ids):
+            return np.zeros(game_ids.shape, dtype = bool)
+
+        pos = np.minimum(np.searchsorted(self.ids, game_ids), len(self.ids) - 1)
+        return self.ids[pos] == game_ids
+
+    def add(self, game_ids):
+        '''
+         Acrescenta game_ids, que não podem estar no arquivo (ver contains_many).
+        '''
+        game_ids = np.unique(np.asarray(game_ids, dtype = np.int64))
+        if not len(game_ids):
+            return
+
+        n_old = len(self.ids)
+        tmp_path = self.path + '.tmp.npy'
+        merged = np.lib.format.open_memmap(tmp_path, mode = 'w+', dtype = np.int64, shape = (n_old + len(game_ids),))
+
+        # Posição final de cada id: a sua posição no array de origem mais quantos ids do outro array vêm antes
+        merged[np.searchsorted(self.ids, game_ids) + np.arange(len(game_ids))] = game_ids
+        for start in range(0, n_old, self.block_size):
+            block = np.asarray(self.ids[start:start + self.block_size])
+            merged[start + np.arange(len(block)) + np.searchsorted(game_ids, block)] = block
+
+        merged.flush()
+        del merged
+
+        # No Windows o arquivo aberto com memory-map não pode ser substituído
+        self.ids = np.empty(0, dtype = np.int64)
+        os.replace(tmp_path, self.path)
+        self.ids = np.load(self.path, mmap_mode = 'r')
+
+
+def read_chunks(source, chunksize = 50000):
+    '''
+     Lê o dataset de partidas em blocos. source pode ser um CSV (como o data/54k_matches.csv) ou um diretório
+     do sink.MatchRowSink. Partidas repetidas (mesmo gameID) são descartadas, como no notebook; os gameIds
+     já lidos ficam em um arquivo temporário (_SortedIds), então a memória depende só de chunksize.
+    '''
+    if os.path.isdir(source):
+        parts = sorted(glob.glob(os.path.join(source, 'part-*.parquet')))
+        chunks = (pd.read_parquet(path) for path in parts)
+    else:
+        chunks = pd.read_csv(source, chunksize = chunksize)
+
+    with tempfile.TemporaryDirectory() as directory:
+        seen = _SortedIds(directory)
+
+        for chunk in chunks:
+            chunk = chunk.drop(columns = ['Unnamed: 0'], errors = 'ignore')
+            chunk = chunk.drop_duplicates(subset = 'gameID')
+
+            chunk = chunk[~seen.contains_many(chunk['gameID'].to_numpy())]
+            seen.add(chunk['gameID'].to_numpy())
+
+            yield chunk.reset_index(drop = True)
+
+
+class PreprocessingState:
+    '''
+     Estado aprendido no passe de fit: parâmetros do PowerTransformer (lambda, média e desvio de cada coluna
+     numérica), vocabulário (valores ordenados) e contagens de cada coluna de campeão/classe, e o número de
+     partidas. Pode ser salvo e carregado em JSON, para reaproveitar o preprocessing fora do notebook.
+
+     extend acrescenta partidas novas sem refazer o fit: valores novos (campeões lançados depois do fit) vão
+     para o fim do vocabulário, então os códigos e as colunas one-hot já usados pelos modelos não mudam.
+    '''
+    def __init__(self, power = None, vocabularies = None, counts = None, n_rows = 0):
+        self.power = power or {}
+        self.vocabularies = vocabularies or {}
+        self.counts = counts or {}
+        self.n_rows = n_rows
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'power': self.power, 'vocabularies': self.vocabularies,
+                       'counts': {c: [[v, n] for v, n in counts.items()] for c, counts in self.counts.items()},
+                       'n_rows': self.n_rows}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+
+        counts = {c: {v: n for v, n in pairs} for c, pairs in data['counts'].items()}
+        return cls(data['power'], data['vocabularies'], counts, data['n_rows'])
+
+    def label_codes(self, column, values):
+        '''
+         Mesmo resultado do LabelEncoder ajustado na coluna inteira: posição do valor no vocabulário. Valores
+         fora do vocabulário (ou None) recebem -1, que vira NaN no pd.Categorical, como no
+         prediction.FeatureEncoder.
+        '''
+        codes = {value: code for code, value in enumerate(self.vocabularies[column])}
+        return np.array([codes.get(_python_value(value), -1) for value in values], dtype = np.int64)
+
+    def extend(self, df):
+        '''
+         Soma as partidas de df (já com build_engineered_features) às contagens e acrescenta os valores novos
+         de cada coluna de campeão/classe ao fim do vocabulário. Os parâmetros do PowerTransformer não são
+         reajustados. Retorna {coluna: valores novos}.
+        '''
+        new_values = {}
+        self.n_rows += len(df)
+
+        for column in [c for c in df.columns if is_lane_column(c)]:
+            column_counts = self.counts.setdefault(column, {})
+            vocabulary = self.vocabularies.setdefault(column, [])
+
+            for value, n in df[column].value_counts().items():
+                value = _python_value(value)
+                if value not in column_counts:
+                    new_values.setdefault(column, []).append(value)
+                column_counts[value] = column_counts.get(value, 0) + int(n)
+
+            if column in new_values:
+                new_values[column] = sorted(new_values[column])
+                vocabulary.extend(new_values[column])
+
+        return new_values
+
+    def non_outliers(self, column):
+        '''
+         Valores da coluna com frequência acima de OUTLIER_FREQUENCY.
+        '''
+        return [v for v in self.vocabularies[column] if self.counts[column][v] / self.n_rows > OUTLIER_FREQUENCY]
+
+    def power_transform(self, df):
+        '''
+         Aplica o PowerTransformer (yeo-johnson + padronização) às colunas numéricas de df, in place.
+        '''
+        for column, (lmbda, mean, scale) in self.power.items():
+            df[column] = (yeo_johnson(df[column].to_numpy(), lmbda) - mean) / scale
+        return df
+
+
+def _python_value(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+def fit_preprocessing(source, chunksize = 50000):
+    '''
+     Passe de fit: percorre o dataset em blocos e retorna o PreprocessingState.
+
+     O lambda de cada coluna é escolhido por máxima verossimilhança em dois passes pelo dataset (grade grossa
+     e depois uma grade fina de passo FINE_STEP em volta do melhor lambda); os vocabulários e as contagens dos
+     campeões/classes são coletados no primeiro passe. A memória usada depende só de chunksize.
+    '''
+    power_columns = [c for c in NUM_COLUMNS if c not in LINEAR_DROP]
+
+    coarse = {c: _YeoJohnsonStats(COARSE_LAMBDAS) for c in power_columns}
+    counts = {}
+    n_rows = 0
+
+    for chunk in read_chunks(source, chunksize):
+        chunk = build_engineered_features(chunk)
+        n_rows += len(chunk)
+
+        for column in power_columns:
+            coarse[column].update(chunk[column].to_numpy())
+
+        for column in [c for c in chunk.columns if is_lane_column(c)]:
+            column_counts = counts.setdefault(column, {})
+            for value, n in chunk[column].value_counts().items():
+                value = _python_value(value)
+                column_counts[value] = column_counts.get(value, 0) + int(n)
+
+    # Segundo passe: grade fina em volta do melhor lambda da grade grossa
+    fine = {}
+    for column in power_columns:
+        best, _, _ = coarse[column].best()
+        fine[column] = _YeoJohnsonStats(np.round(np.arange(best - FINE_WINDOW, best + FINE_WINDOW + FINE_STEP / 2, FINE_STEP), 10))
+
+    for chunk in read_chunks(source, chunksize):
+        chunk = build_engineered_features(chunk)
+        for column in power_columns:
+            fine[column].update(chunk[column].to_numpy())
+
+    power = {column: fine[column].best() for column in power_columns}
+    vocabularies = {column: sorted(column_counts) for column, column_counts in counts.items()}
+
+    return PreprocessingState(power, vocabularies, counts, n_rows)
+
+
+def update_preprocessing(state, source, chunksize = 50000):
+    '''
+     Versão incremental do fit_preprocessing: percorre só as partidas novas de source e estende o state
+     (PreprocessingState.extend), sem refazer o fit do histórico inteiro. Retorna {coluna: valores novos}.
+    '''
+    new_values = {}
+    for chunk in read_chunks(source, chunksize):
+        for column, values in state.extend(build_engineered_features(chunk)).items():
+            new_values.setdefault(column, []).extend(values)
+
+    return new_values
+
+
+def one_hot_csr(df, columns, vocabularies):
+    '''
+     Monta o one-hot das columns direto dos códigos inteiros, como uma matriz CSR (sem passar pelo pd.get_dummies).
+     Os nomes das colunas seguem o pd.get_dummies ({coluna}_{valor}); valores fora do vocabulário ficam zerados.
+
+     A função retorna (matriz CSR, nomes das colunas).
+    '''
+    names = []
+    rows, cols = [], []
+    offset = 0
+
+    for column in columns:
+        vocabulary = vocabularies[column]
+        position = {value: j for j, value in enumerate(vocabulary)}
+
+        codes = np.array([position.get(_python_value(v), -1) for v in df[column].to_numpy()], dtype = np.int64)
+        present = codes >= 0
+
+        rows.append(np.flatnonzero(present))
+        cols.append(codes[present] + offset)
+
+        names.extend(f'{column}_{value}' for value in vocabulary)
+        offset += len(vocabulary)
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype = np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype = np.int64)
+
+    matrix = sp.csr_matrix((np.ones(len(rows), dtype = np.uint8), (rows, cols)), shape = (len(df), offset))
+    return matrix, names
+
+
+def _outlier_mask(df, columns, allowed):
+    mask = np.ones(len(df), dtype = bool)
+    for column in columns:
+        mask &= df[column].isin(allowed[column]).to_numpy()
+    return mask
+
+
+def transform_preprocessing(source, state, store = None, chunksize = 50000):
+    '''
+     Passe de transform: percorre o dataset em blocos, aplica o estado ajustado e grava, bloco a bloco, as cinco
+     variantes do notebook de preprocessing no DatasetStore:
+
+     df_boosted / df_boosted_dropout: campeões e classes com label encoding (sem e com o filtro de outliers)
+     df_linear: numéricas normalizadas, sem os campeões e com o one-hot das classes
+     df_linear_sparse / df_linear_dropout: numéricas normalizadas e one-hot (esparso) dos campeões e classes
+
+     Diferente do notebook, a frequência de cada campeão é calculada no dataset inteiro para todas as colunas
+     (e não coluna a coluna sobre o dataset já filtrado), o que só muda casos de fronteira do filtro de 0.1%.
+    '''
+    store = store or DatasetStore()
+
+    lane_columns = [c for c in state.vocabularies]
+    champion_columns = [c for c in lane_columns if is_champion_column(c)]
+    role_columns = [c for c in lane_columns if not is_champion_column(c)]
+
+    allowed = {c: set(state.non_outliers(c)) for c in lane_columns}
+    dropout_vocabularies = {c: (state.non_outliers(c) if c in champion_columns else state.vocabularies[c])
+                            for c in lane_columns}
+
+    _, sparse_names = one_hot_csr(pd.DataFrame({c: [] for c in lane_columns}), lane_columns, state.vocabularies)
+    _, role_names = one_hot_csr(pd.DataFrame({c: [] for c in role_columns}), role_columns, state.vocabularies)
+    _, dropout_names = one_hot_csr(pd.DataFrame({c: [] for c in lane_columns}), lane_columns, dropout_vocabularies)
+
+    with store.writer('df_boosted') as boosted, \
+         store.writer('df_boosted_dropout') as boosted_dropout, \
+         store.writer('df_linear', sparse_columns = role_names) as linear, \
+         store.writer('df_linear_sparse', sparse_columns = sparse_names) as linear_sparse, \
+         store.writer('df_linear_dropout', sparse_columns = dropout_names) as linear_dropout:
+
+        for chunk in read_chunks(source, chunksize):
+            df = build_engineered_features(chunk)
+
+            # Boosted: label encoding das colunas de campeões e classes
+            df_boosted = df.copy()
+            for column in lane_columns:
+                codes = state.label_codes(column, df[column].to_numpy())
+                df_boosted[column] = pd.Categorical(codes, categories = range(len(state.vocabularies[column])))
+
+            boosted.write(df_boosted)
+            boosted_dropout.write(df_boosted[_outlier_mask(df, lane_columns, allowed)])
+
+            # Linear: numéricas normalizadas e one-hot esparso
+            df_linear = state.power_transform(df.drop(columns = LINEAR_DROP))
+            numeric = df_linear.drop(columns = lane_columns)
+
+            one_hot, _ = one_hot_csr(df_linear, role_columns, state.vocabularies)
+            linear.write(numeric, one_hot)
+
+            one_hot, _ = one_hot_csr(df_linear, lane_columns, state.vocabularies)
+            linear_sparse.write(numeric, one_hot)
+
+            keep = _outlier_mask(df, champion_columns, allowed)
+            one_hot, _ = one_hot_csr(df_linear[keep], lane_columns, dropout_vocabularies)
+            linear_dropout.write(numeric[keep], one_hot)
+
+    return store
+
+
+def run_preprocessing(source, store = None, chunksize = 50000, state_path = None):
+    '''
+     Roda o pipeline completo (fit + transform) sobre source e, opcionalmente, salva o estado em state_path.
+     Retorna o PreprocessingState.
+    '''
+    state = fit_preprocessing(source, chunksize)
+    transform_preprocessing(source, state, store, chunksize)
+
+    if state_path is not None:
+        state.save(state_path)
+
+    return state
@@ -0,0 +1,322 @@
+# Atualização incremental dos modelos com partidas novas: vocabulários estendidos, boosting continuado e janela de patches
+import copy
+import glob
+import json
+import os
+import pickle
+import shutil
+import time
+
+import catboost
+import lightgbm as lgbm
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import clone
+
+from helper import build_engineered_features
+from prediction import FeatureEncoder
+from preprocessing import PreprocessingState, is_lane_column
+from tuning import FIXED_PARAMS_LGB
+
+# Árvores acrescentadas por atualização quando o boosting é continuado
+REFRESH_BOOST_ROUND = 100
+
+
+def game_patch(game_info):
+    '''
+     Patch de uma partida ('11.3') a partir do gameVersion do MatchDto ('11.3.357.5376').
+    '''
+    return '.'.join(game_info['gameVersion'].split('.')[:2])
+
+
+def patch_key(patch):
+    return tuple(int(part) for part in str(patch).split('.'))
+
+
+class PatchWindow:
+    '''
+     Partidas das últimas max_patches patches, em directory/{patch}/part-00000.parquet, ... (colunas de
+     helper.create_match_row). add grava um lote de partidas de uma patch e apaga as patches que saíram da
+     janela, então o treino a partir da janela custa o tamanho da janela, e não o do histórico.
+    '''
+    def __init__(self, directory = 'data/window', max_patches = 3):
+        self.directory = directory
+        self.max_patches = max_patches
+        os.makedirs(directory, exist_ok = True)
+
+    def patches(self):
+        return sorted((name for name in os.listdir(self.directory)
+                       if glob.glob(os.path.join(self.directory, name, 'part-*.parquet'))), key = patch_key)
+
+    def _parts(self, patch):
+        return sorted(glob.glob(os.path.join(self.directory, patch, 'part-*.parquet')))
+
+    def accepts(self, patch):
+        '''
+         Se um lote da patch fica na janela: False para patches mais antigas que todas as da janela cheia, que
+         seriam descartadas logo depois de gravadas.
+        '''
+        patch = str(patch)
+        return patch in sorted(set(self.patches()) | {patch}, key = patch_key)[-self.max_patches:]
+
+    def add(self, df, patch):
+        '''
+         Grava df como um lote da patch (escrita atômica: arquivo temporário + os.replace) e retorna a lista
+         das patches descartadas da janela. Lotes de patches que não entram na janela (ver accepts) levantam
+         ValueError, sem gravar nada.
+        '''
+        patch = str(patch)
+        if not self.accepts(patch):
+            raise ValueError(f'patch {patch} é mais antiga que a janela {self.patches()}')
+
+        os.makedirs(os.path.join(self.directory, patch), exist_ok = True)
+
+        path = os.path.join(self.directory, patch, f'part-{len(self._parts(patch)):05d}.parquet')
+        df.to_parquet(path + '.tmp', index = False)
+        os.replace(path + '.tmp', path)
+
+        evicted = self.patches()[:-self.max_patches]
+        for old in evicted:
+            shutil.rmtree(os.path.join(self.directory, old))
+
+        return evicted
+
+    def frame(self, patches = None):
+        '''
+         DataFrame com as partidas das patches (padrão: a janela inteira).
+        '''
+        parts = [path for patch in (patches or self.patches()) for path in self._parts(patch)]
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat([pd.read_parquet(path) for path in parts], ignore_index = True)
+
+    def __len__(self):
+        return sum(len(pd.read_parquet(path, columns = ['gameID']))
+                   for patch in self.patches() for path in self._parts(patch))
+
+
+def extend_linear_features(feature_names, state):
+    '''
+     Nomes das features de um modelo linear depois de um PreprocessingState.extend: as features atuais, na
+     mesma ordem, seguidas do one-hot ({coluna}_{valor}) dos valores novos das colunas que já têm one-hot no
+     modelo. Como as colunas antigas não mudam de posição, os coeficientes antigos continuam valendo.
+    '''
+    names = list(feature_names)
+    present = set(names)
+
+    for column, vocabulary in state.vocabularies.items():
+        if any(f'{column}_{value}' in present for value in vocabulary):
+            names.extend(f'{column}_{value}' for value in vocabulary if f'{column}_{value}' not in present)
+
+    return names
+
+
+def encode(df, state, feature_names, variant, chunk_size = 5000):
+    '''
+     Matriz de features de um DataFrame de partidas (colunas de helper.create_match_row) na ordem de
+     feature_names, com o mesmo encoding do prediction.FeatureEncoder: densa no variant 'boosted' e CSR no
+     'linear' (montada em blocos de chunk_size partidas, sem densificar o one-hot inteiro).
+
+     A função retorna (X, y).
+    '''
+    df = build_engineered_features(df)
+    encoder = FeatureEncoder(state, feature_names, variant)
+
+    blocks = []
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        X = encoder.transform({column: chunk[column].to_numpy() for column in chunk.columns})
+        blocks.append(sp.csr_matrix(X) if variant == 'linear' else X)
+
+    n_features = len(feature_names)
+    if variant == 'linear':
+        X = sp.vstack(blocks, format = 'csr') if blocks else sp.csr_matrix((0, n_features))
+    else:
+        X = np.vstack(blocks) if blocks else np.empty((0, n_features))
+
+    return X, df['isWinner_blue'].to_numpy().astype(np.int64)
+
+
+def _cat_features(feature_names):
+    # Mesma regra do tuning.prepare_shared_split: colunas de campeões/classes são categóricas
+    return [j for j, column in enumerate(feature_names) if is_lane_column(column)]
+
+
+def continue_lightgbm(booster, X, y, num_boost_round = REFRESH_BOOST_ROUND, init = True, params = None):
+    '''
+     Acrescenta num_boost_round árvores ao lgbm.Booster treinando só em (X, y), a partir das previsões do
+     modelo atual (init_model). Com init False, treina um modelo novo com os mesmos parâmetros e
+     num_boost_round árvores (usado quando uma patch sai da janela, com o número de árvores do modelo
+     original). Retorna o novo Booster.
+    '''
+    feature_names = booster.feature_name()
+    params = dict(FIXED_PARAMS_LGB, **{**(booster.params or {}), **(params or {})})
+    params.pop('num_iterations', None)
+
+    train = lgbm.Dataset(X, label = y, feature_name = feature_names, categorical_feature = _cat_features(feature_names),
+                         params = {'verbosity': -1, 'feature_pre_filter': False})
+
+    if init:
+        return lgbm.train(params, train, num_boost_round = num_boost_round, init_model = booster,
+                          keep_training_booster = True)
+    return lgbm.train(params, train, num_boost_round = num_boost_round)
+
+
+def _catboost_pool(X, y, feature_names, cat_features):
+    # Mesma conversão do tuning.SharedSplit: colunas categóricas do CatBoost precisam ser inteiras (NaN vira -1)
+    df = pd.DataFrame(np.asarray(X), columns = feature_names)
+    for j in cat_features:
+        df[feature_names[j]] = df[feature_names[j]].fillna(-1).astype(np.int64)
+    return catboost.Pool(df, label = y, cat_features = cat_features)
+
+
+def continue_catboost(model, X, y, num_boost_round = REFRESH_BOOST_ROUND, init = True):
+    '''
+     Mesmo que continue_lightgbm para um CatBoostClassifier: num_boost_round árvores novas treinadas em (X, y)
+     a partir do modelo atual, ou, com init False, um modelo novo com num_boost_round árvores.
+    '''
+    feature_names = model.feature_names_
+    pool = _catboost_pool(X, y, feature_names, model.get_cat_feature_indices())
+
+    params = model.get_params()
+    params.pop('cat_features', None)
+    params['iterations'] = num_boost_round
+
+    return catboost.CatBoostClassifier(**params).fit(pool, init_model = model if init else None)
+
+
+def warm_start_linear(model, X, y, feature_names, new_feature_names):
+    '''
+     Reajusta um modelo linear do sklearn em (X, y), cujas colunas seguem new_feature_names (ver
+     extend_linear_features). Modelos com warm_start (LogisticRegression) partem dos coeficientes atuais -
+     as features novas começam em 0 - e convergem em poucas iterações; os demais (LinearSVC, RidgeClassifier)
+     são reajustados do zero, o que no tamanho da janela custa pouco.
+    '''
+    clf = clone(model)
+
+    if 'warm_start' in clf.get_params():
+        position = {name: j for j, name in enumerate(new_feature_names)}
+        coef = np.zeros((1, len(new_feature_names)))
+        coef[0, [position[name] for name in feature_names]] = model.coef_[0]
+
+        clf.set_params(warm_start = True)
+        clf.coef_ = coef
+        clf.intercept_ = np.array(model.intercept_, dtype = np.float64)
+
+    return clf.fit(X, y)
+
+
+class ModelRefresher:
+    '''
+     Modo de treino incremental: a cada lote de partidas novas (refresh), o PreprocessingState guardado é
+     estendido (campeões novos entram no fim dos vocabulários), o lote entra na PatchWindow e os modelos são
+     atualizados sem refazer o fit do histórico:
+
+       - LightGBM (lgbm.Booster) e CatBoost: o boosting continua a partir do modelo atual, com
+         num_boost_round árvores treinadas só no lote novo. Quando uma patch sai da janela, os modelos são
+         retreinados na janela com os mesmos parâmetros e o número de árvores dos modelos originais
+         (base_rounds), já que árvores não podem ser desfeitas - o tamanho dos modelos não cresce sem limite;
+       - modelo linear: reajustado na janela inteira a cada refresh, com warm start a partir dos coeficientes
+         atuais e as features de campeões novos acrescentadas ao fim (linear_feature_names). Um ajuste só no
+         lote esqueceria o resto da janela, então o custo dele é o da janela (limitada a max_patches patches).
+
+     O custo de uma atualização fica proporcional ao lote novo (boosting) ou à janela (modelo linear e troca
+     de patch), nunca ao histórico inteiro. save/load gravam o estado e os modelos em um diretório.
+    '''
+    def __init__(self, state, window, lightgbm = None, catboost = None, linear = None, linear_feature_names = None,
+                 num_boost_round = REFRESH_BOOST_ROUND, base_rounds = None):
+        self.state = state
+        self.window = window
+        self.lightgbm = lightgbm
+        self.catboost = catboost
+        self.linear = linear
+        self.linear_feature_names = list(linear_feature_names) if linear_feature_names is not None else None
+        self.num_boost_round = num_boost_round
+
+        # Número de árvores dos modelos originais, usado nos retreinos da janela
+        self.base_rounds = dict(base_rounds or {})
+        if lightgbm is not None:
+            self.base_rounds.setdefault('lightgbm', lightgbm.current_iteration())
+        if catboost is not None:
+            self.base_rounds.setdefault('catboost', catboost.tree_count_)
+
+    def refresh(self, df, patch):
+        '''
+         Atualiza o estado e os modelos com o DataFrame de partidas novas df (colunas de
+         helper.create_match_row), todas da patch informada (ver game_patch). Retorna um relatório com as
+         linhas do lote e da janela, os valores novos dos vocabulários, as patches descartadas, o modo das
+         árvores ('continued' ou 'window') e os segundos gastos. Lotes de uma patch mais antiga que a janela
+         levantam ValueError antes de qualquer alteração (ver PatchWindow.accepts). O estado e os modelos só
+         são substituídos depois que a janela e todos os refits terminaram: um erro no meio deixa o refresher
+         como estava.
+        '''
+        start = time.perf_counter()
+        if not self.window.accepts(patch):
+            raise ValueError(f'patch {patch} é mais antiga que a janela {self.window.patches()}')
+
+        df = df.drop_duplicates(subset = 'gameID').reset_index(drop = True)
+
+        state = copy.deepcopy(self.state)
+        new_values = state.extend(build_engineered_features(df))
+        evicted = self.window.add(df, patch)
+        mode = 'window' if evicted else 'continued'
+
+        trees = df if mode == 'continued' else self.window.frame()
+
+        lightgbm = self.lightgbm
+        if lightgbm is not None:
+            X, y = encode(trees, state, lightgbm.feature_name(), 'boosted')
+            rounds = self.num_boost_round if mode == 'continued' else self.base_rounds['lightgbm']
+            lightgbm = continue_lightgbm(lightgbm, X, y, rounds, init = mode == 'continued')
+
+        catboost_model = self.catboost
+        if catboost_model is not None:
+            X, y = encode(trees, state, catboost_model.feature_names_, 'boosted')
+            rounds = self.num_boost_round if mode == 'continued' else self.base_rounds['catboost']
+            catboost_model = continue_catboost(catboost_model, X, y, rounds, init = mode == 'continued')
+
+        window_rows = None
+        linear, linear_feature_names = self.linear, self.linear_feature_names
+        if linear is not None:
+            frame = self.window.frame()
+            window_rows = len(frame)
+
+            linear_feature_names = extend_linear_features(self.linear_feature_names, state)
+            X, y = encode(frame, state, linear_feature_names, 'linear')
+            linear = warm_start_linear(self.linear, X, y, self.linear_feature_names, linear_feature_names)
+
+        self.state = state
+        self.lightgbm, self.catboost = lightgbm, catboost_model
+        self.linear, self.linear_feature_names = linear, linear_feature_names
+
+        return {'patch': str(patch), 'rows': len(df), 'window_rows': window_rows, 'new_values': new_values,
+                'evicted': evicted, 'mode': mode, 'seconds': time.perf_counter() - start}
+
+    def save(self, directory):
+        '''
+         Grava o PreprocessingState (state.json), os modelos (models.pkl) e a configuração da janela e do
+         número de árvores (refresh.json).
+        '''
+        os.makedirs(directory, exist_ok = True)
+        self.state.save(os.path.join(directory, 'state.json'))
+
+        with open(os.path.join(directory, 'models.pkl'), 'wb') as f:
+            pickle.dump({'lightgbm': self.lightgbm, 'catboost': self.catboost, 'linear': self.linear,
+                         'linear_feature_names': self.linear_feature_names}, f)
+
+        with open(os.path.join(directory, 'refresh.json'), 'w') as f:
+            json.dump({'window': self.window.directory, 'max_patches': self.window.max_patches,
+                       'num_boost_round': self.num_boost_round, 'base_rounds': self.base_rounds}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'refresh.json')) as f:
+            meta = json.load(f)
+
+        with open(os.path.join(directory, 'models.pkl'), 'rb') as f:
+            models = pickle.load(f)
+
+        return cls(PreprocessingState.load(os.path.join(directory, 'state.json')),
+                   PatchWindow(meta['window'], meta['max_patches']), num_boost_round = meta['num_boost_round'],
+                   base_rounds = meta.get('base_rounds'), **models)
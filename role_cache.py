@@ -0,0 +1,175 @@
+# Cache das roles resolvidas por roleidentification.get_roles, indexado pela composição (tupla ordenada de championIds)
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+
+from roleidentification import get_roles
+
+from metrics import METRICS
+
+
+def composition_key(champions):
+    '''
+     Chave de uma composição: a tupla ordenada dos championIds (a ordem dos participantes não muda as roles).
+    '''
+    return tuple(sorted(int(champion) for champion in champions))
+
+
+def champion_roles_digest(champion_roles):
+    '''
+     Hash do objeto champion_roles: roles gravadas no disco só valem para as mesmas playrates.
+    '''
+    data = json.dumps(champion_roles, sort_keys = True, default = str).encode()
+    return hashlib.sha1(data).hexdigest()
+
+
+class RoleCache:
+    '''
+     Memoiza get_roles(champion_roles, champions) por composição, em um LRU de até maxsize composições.
+
+     Com path, as composições resolvidas também são gravadas em um arquivo SQLite, que pode ser compartilhado
+     entre processos (ex.: os workers de extraction): uma composição resolvida por um processo não é
+     recalculada pelos outros. As linhas do arquivo são separadas pelo hash do champion_roles, então um
+     pull_data novo não reaproveita roles calculadas com playrates antigas.
+
+     Os contadores hits, disk_hits e misses (chamadas a get_roles) ficam em stats.
+    '''
+    def __init__(self, champion_roles, maxsize = 100_000, path = None):
+        self.champion_roles = champion_roles
+        self.maxsize = maxsize
+        self.path = path
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+
+        self.conn = None
+        if path is not None:
+            self.digest = champion_roles_digest(champion_roles)
+            self.conn = sqlite3.connect(path, timeout = 30)
+            self.conn.execute('PRAGMA journal_mode = WAL')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS roles (
+                                     digest TEXT NOT NULL,
+                                     composition TEXT NOT NULL,
+                                     roles TEXT NOT NULL,
+                                     PRIMARY KEY (digest, composition))''')
+            self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __len__(self):
+        return len(self._lru)
+
+    def __contains__(self, champions):
+        return composition_key(champions) in self._lru
+
+    # A conexão SQLite não é serializada: ao chegar em outro processo, o cache reabre o arquivo
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['conn'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(state['champion_roles'], maxsize = state['maxsize'], path = state['path'])
+        self._lru = state['_lru']
+
+    @property
+    def stats(self):
+        total = self.hits + self.disk_hits + self.misses
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / total if total else 0.0, 'size': len(self)}
+
+    def _remember(self, key, roles):
+        self._lru[key] = roles
+        self._lru.move_to_end(key)
+
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last = False)
+
+    def _read_disk(self, keys):
+        if self.conn is None or not keys:
+            return {}
+
+        found = {}
+        compositions = [','.join(map(str, key)) for key in keys]
+
+        # Limite de variáveis por consulta do SQLite
+        for i in range(0, len(compositions), 500):
+            chunk = compositions[i:i + 500]
+            rows = self.conn.execute(f'SELECT composition, roles FROM roles WHERE digest = ? AND composition IN '
+                                     f'({",".join("?" * len(chunk))})', [self.digest, *chunk])
+            for composition, roles in rows:
+                found[tuple(int(c) for c in composition.split(','))] = json.loads(roles)
+
+        return found
+
+    def _write_disk(self, resolved):
+        if self.conn is None or not resolved:
+            return
+
+        self.conn.executemany('INSERT OR IGNORE INTO roles VALUES (?, ?, ?)',
+                              [(self.digest, ','.join(map(str, key)), json.dumps(roles)) for key, roles in resolved.items()])
+        self.conn.commit()
+
+    def get(self, champions):
+        '''
+         Retorna o dicionário {role: championId} da composição champions (mesmo retorno de get_roles).
+        '''
+        return self.resolve_many([champions])[0]
+
+    def resolve_many(self, compositions):
+        '''
+         Versão em lote de get: cada composição distinta de compositions é procurada uma única vez (LRU,
+         depois disco) e só as que faltarem passam por get_roles. Retorna a lista de roles, na ordem de compositions.
+        '''
+        keys = [composition_key(champions) for champions in compositions]
+        found = {}
+        hits, disk_hits, misses = self.hits, self.disk_hits, self.misses
+
+        for key in dict.fromkeys(keys):
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                found[key] = self._lru[key]
+
+        on_disk = self._read_disk([key for key in dict.fromkeys(keys) if key not in found])
+        found.update(on_disk)
+
+        resolved = {}
+        with METRICS.timer('get_roles'):
+            for key in dict.fromkeys(keys):
+                if key not in found:
+                    resolved[key] = found[key] = get_roles(self.champion_roles, list(key))
+
+        self._write_disk(resolved)
+
+        # Hits e misses contados por partida/time (a unidade que seria recalculada sem o cache)
+        seen = set()
+        for key in keys:
+            if key in resolved and key not in seen:
+                self.misses += 1
+            elif key in on_disk and key not in seen:
+                self.disk_hits += 1
+            else:
+                self.hits += 1
+            seen.add(key)
+
+        for key in dict.fromkeys(keys):
+            self._remember(key, found[key])
+
+        if METRICS.enabled:
+            METRICS.count('role_cache_hits', self.hits - hits)
+            METRICS.count('role_cache_disk_hits', self.disk_hits - disk_hits)
+            METRICS.count('role_cache_misses', self.misses - misses)
+
+        return [found[key] for key in keys]
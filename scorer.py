@@ -0,0 +1,225 @@
+# Scorer compilado: modelo final + preprocessing em arrays NumPy, sem pandas/lightgbm/catboost/sklearn no import
+#
+# Gerado por export.export_scorer. Uso: CompiledScorer.load('modelo.npz').score(colunas)
+import json
+
+import numpy as np
+
+# missing_type dos nós do LightGBM
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+
+# Mesmo kZeroThreshold do LightGBM: valores em [-1e-35, 1e-35] contam como zero no missing_type Zero
+ZERO_THRESHOLD = 1e-35
+
+
+class PowerParams:
+    '''
+     yeo-johnson + padronização de várias colunas, cada uma com o seu lambda (mesmas fórmulas de
+     preprocessing.yeo_johnson). Os casos lambda = 0 e lambda = 2 são resolvidos uma única vez aqui, então
+     a transformação de uma partida é só um punhado de operações vetorizadas.
+    '''
+    def __init__(self, index, lambdas, means, scales):
+        self.index = index
+        self.means = means
+        self.scales = scales
+
+        self.zero = np.isclose(lambdas, 0)
+        self.two = np.isclose(lambdas, 2)
+        self.lambdas = np.where(self.zero, 1.0, lambdas)
+        self.lambdas_neg = np.where(self.two, 1.0, 2 - lambdas)
+
+    def transform(self, x):
+        log = np.log1p(np.abs(x))
+        pos = np.where(self.zero, log, (np.power(np.abs(x) + 1, self.lambdas) - 1) / self.lambdas)
+        neg = np.where(self.two, -log, -(np.power(np.abs(x) + 1, self.lambdas_neg) - 1) / self.lambdas_neg)
+
+        return (np.where(x >= 0, pos, neg) - self.means) / self.scales
+
+
+def engineered_numeric_arrays(columns, xp_level_thresholds):
+    '''
+     Features numéricas derivadas de helper.engineered_feature_arrays (meanLevel, monsterControl, mapControl,
+     greatStart e deltaGold), com as mesmas fórmulas - as classes dos campeões (role{LANE}) são resolvidas
+     pelas tabelas do scorer.
+    '''
+    def col(name):
+        return np.asarray(columns[name])
+
+    new_columns = {}
+    for c in ['blue', 'red']:
+        new_columns[f'meanLevel_{c}'] = 4.0 + np.searchsorted(xp_level_thresholds, col(f'xp_{c}') / 5, side = 'right')
+        new_columns[f'monsterControl_{c}'] = (col(f'fireDragonsDestroyed_{c}') + col(f'airDragonsDestroyed_{c}')
+                                              + col(f'waterDragonsDestroyed_{c}') + col(f'earthDragonsDestroyed_{c}')
+                                              + col(f'riftHeraldDestroyed_{c}'))
+        new_columns[f'mapControl_{c}'] = (col(f'botTowersDestroyed_{c}') + col(f'topTowersDestroyed_{c}')
+                                          + 2*col(f'midTowersDestroyed_{c}'))
+        new_columns[f'greatStart_{c}'] = np.where((col(f'xp_{c}') > 18000) & (col(f'totalGold_{c}') > 19000), 1, 0)
+
+    new_columns['deltaGold'] = col('totalGold_blue') - col('totalGold_red')
+    return new_columns
+
+
+class CompiledScorer:
+    '''
+     Modelo e preprocessing exportados por export.export_scorer, carregados de um único .npz (sem pickle).
+
+     transform monta a matriz de features a partir das colunas de helper.match_row_arrays (ou das linhas do
+     sink), com o mesmo encoding do prediction.FeatureEncoder: features derivadas, PowerTransformer e one-hot
+     no variant 'linear', códigos do LabelEncoder no 'boosted'. As colunas de campeões e de classes são
+     resolvidas por tabelas indexadas pelo championId.
+
+     Modelos:
+       - 'lightgbm': árvores achatadas em arrays (um nó por posição, folhas com feature -1), percorridas em
+         todas as árvores ao mesmo tempo, um nível por iteração, em blocos de chunk_size partidas;
+       - 'catboost': árvores simétricas (oblivious) só com features numéricas: o índice da folha sai de uma
+         comparação por nível;
+       - 'linear': coeficientes e intercepto.
+
+     margin é a margem (log-odds) do modelo e predict_proba a probabilidade de vitória do time azul.
+    '''
+    def __init__(self, arrays, meta, chunk_size = 4096):
+        self.arrays = arrays
+        self.meta = meta
+        self.chunk_size = chunk_size
+
+        self.feature_names = meta['feature_names']
+        self.variant = meta['variant']
+        self.kind = meta['kind']
+
+        self._power = None
+        if len(arrays['power_index']):
+            self._power = PowerParams(arrays['power_index'], arrays['power_lambdas'], arrays['power_means'],
+                                      arrays['power_scales'])
+
+        if self.kind == 'lightgbm':
+            self._max_depth = int(meta['max_depth'])
+            self._has_zero = bool((arrays['missing_type'] == MISSING_ZERO).any())
+            self._has_categorical = bool(arrays['categorical'].any())
+            self._category_width = arrays['category_table'].shape[1]
+            self._category_table = arrays['category_table'].ravel()
+
+    @classmethod
+    def load(cls, path, chunk_size = 4096):
+        with np.load(path, allow_pickle = False) as data:
+            arrays = {name: data[name] for name in data.files if name != 'meta'}
+            meta = json.loads(data['meta'].tobytes().decode())
+        return cls(arrays, meta, chunk_size)
+
+    def transform(self, columns):
+        '''
+         Recebe as colunas de uma ou mais partidas ({coluna: array}) e retorna a matriz (n_partidas, n_features).
+        '''
+        n_rows = len(columns['gameID'])
+        X = np.zeros((n_rows, len(self.feature_names)), dtype = np.float64)
+
+        engineered = None
+        for name, j in zip(self.meta['numeric_names'], self.arrays['numeric_index']):
+            if name in columns:
+                X[:, j] = columns[name]
+            else:
+                if engineered is None:
+                    engineered = engineered_numeric_arrays(columns, self.arrays['xp_level_thresholds'])
+                X[:, j] = engineered[name]
+
+        if self._power is not None:
+            X[:, self._power.index] = self._power.transform(X[:, self._power.index])
+
+        tables = self.arrays['categorical_tables']
+        for k, source in enumerate(self.meta['categorical_sources']):
+            ids = np.asarray(columns[source], dtype = np.int64)
+            valid = (ids >= 0) & (ids < tables.shape[1])
+            values = np.where(valid, tables[k, np.where(valid, ids, 0)], -1)
+
+            if self.variant == 'linear':
+                # Tabela championId -> posição da coluna one-hot (-1: valor fora das features do modelo)
+                hit = np.flatnonzero(values >= 0)
+                X[hit, values[hit]] = 1.0
+            else:
+                # Tabela championId -> código do LabelEncoder (-1: fora do vocabulário, NaN como no FeatureEncoder)
+                X[:, self.arrays['categorical_index'][k]] = np.where(values >= 0, values, np.nan)
+
+        return X
+
+    def margin(self, X):
+        X = np.asarray(X, dtype = np.float64)
+
+        if self.kind == 'linear':
+            return X @ self.arrays['coef'] + float(self.arrays['intercept'])
+
+        out = np.empty(len(X))
+        predict = self._lightgbm_margin if self.kind == 'lightgbm' else self._catboost_margin
+        for start in range(0, len(X), self.chunk_size):
+            out[start:start + self.chunk_size] = predict(X[start:start + self.chunk_size])
+        return out
+
+    def _lightgbm_margin(self, X):
+        a = self.arrays
+        n_trees = len(a['roots'])
+
+        # Um caminho por (partida, árvore); a cada nível só os caminhos que ainda não chegaram a uma folha
+        # são avançados
+        has_nan = bool(np.isnan(X).any())
+        node = np.tile(a['roots'], len(X))
+        row = np.repeat(np.arange(len(X)), n_trees)
+        active = np.arange(len(node))
+
+        for _ in range(self._max_depth):
+            current = node[active]
+            feature = a['feature'][current]
+            internal = feature >= 0
+            if not internal.all():
+                keep = np.flatnonzero(internal)
+                active, current, feature = active[keep], current[keep], feature[keep]
+            if not len(active):
+                break
+
+            x = X[row[active], feature]
+
+            # Split numérico (NumericalDecision do LightGBM): x <= threshold, com o lado dos NaN de cada nó
+            # (nan_left) e, nos nós com missing_type Zero, valores em torno de 0 indo para o default_left
+            with np.errstate(invalid = 'ignore'):
+                left = x <= a['threshold'][current]
+            if has_nan:
+                left = np.where(np.isnan(x), a['nan_left'][current], left)
+
+            if self._has_zero:
+                zero = np.flatnonzero((a['missing_type'][current] == MISSING_ZERO)
+                                      & (np.abs(np.nan_to_num(x)) <= ZERO_THRESHOLD))
+                left[zero] = a['default_left'][current[zero]]
+
+            # Split categórico (CategoricalDecision): vai para a esquerda se o valor inteiro estiver no conjunto;
+            # NaN e valores negativos vão sempre para a direita
+            if self._has_categorical:
+                categorical = np.flatnonzero(a['categorical'][current])
+                codes = np.nan_to_num(x[categorical], nan = -1.0).astype(np.int64)
+                valid = (codes >= 0) & (codes < self._category_width)
+                flat = a['category_row'][current[categorical]] * self._category_width + np.where(valid, codes, 0)
+                left[categorical] = self._category_table[flat] & valid
+
+            # Nós em pré-ordem: o filho da esquerda é sempre o nó seguinte
+            node[active] = np.where(left, current + 1, a['right'][current])
+
+        return a['value'][node].reshape(len(X), n_trees).sum(axis = 1)
+
+    def _catboost_margin(self, X):
+        a = self.arrays
+        x = X[:, a['split_feature']].astype(np.float32)
+
+        # Bit de cada nível: valor acima da borda (NaN segue o nan_value_treatment da feature)
+        with np.errstate(invalid = 'ignore'):
+            bits = np.where(np.isnan(x), a['split_nan_true'], x > a['split_border'])
+
+        # Folha de cada árvore: soma dos bits ponderados por 2^nível (os splits de cada árvore são contíguos a
+        # partir de tree_split; árvores sem split foram somadas ao bias no export)
+        leaf = np.add.reduceat(bits * a['split_weight'], a['tree_split'], axis = 1)
+
+        return a['scale'] * a['leaf_value'][a['tree_offset'] + leaf].sum(axis = 1) + a['bias']
+
+    def predict_proba(self, X):
+        return 1 / (1 + np.exp(-self.meta.get('sigmoid', 1.0) * self.margin(X)))
+
+    def score(self, columns):
+        '''
+         Probabilidade de vitória do time azul para as colunas de uma ou mais partidas (ver transform).
+        '''
+        return self.predict_proba(self.transform(columns))
@@ -0,0 +1,127 @@
+# Escrita incremental do dataset de partidas em lotes (Parquet ou Arrow IPC), no lugar de all_matches.append
+import glob
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+from helper import MATCH_ROW_COLUMNS
+from metrics import timed
+
+
+def _column_type(column):
+    if column == 'isWinner_blue':
+        return pa.bool_()
+    return pa.int64()
+
+
+# Schema das linhas de partida: mesmas colunas (e ordem) de create_match_row
+MATCH_ROW_SCHEMA = pa.schema([(column, _column_type(column)) for column in MATCH_ROW_COLUMNS])
+
+_EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+class MatchRowSink:
+    '''
+     Acumula linhas de partidas em memória e grava um arquivo (part-00000.parquet, part-00001.parquet, ...)
+     em directory a cada batch_size linhas, com o schema MATCH_ROW_SCHEMA. format pode ser 'parquet' ou
+     'arrow' (Arrow IPC).
+
+     Cada lote é escrito em um arquivo temporário e renomeado ao final, então um crash nunca deixa um lote
+     pela metade. Ao abrir um diretório existente, a numeração continua do último lote gravado e
+     game_ids() retorna as partidas já gravadas (para retomar o crawl sem repeti-las).
+    '''
+    def __init__(self, directory = 'data/matches', batch_size = 1000, format = 'parquet'):
+        if format not in _EXTENSIONS:
+            raise ValueError(f"format deve ser 'parquet' ou 'arrow', não {format!r}")
+
+        self.directory = directory
+        self.batch_size = batch_size
+        self.format = format
+        self._buffer = []
+
+        os.makedirs(directory, exist_ok = True)
+        self.next_part = len(self.parts())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def parts(self):
+        return sorted(glob.glob(os.path.join(self.directory, f'part-*.{_EXTENSIONS[self.format]}')))
+
+    def __len__(self):
+        return self.rows_written() + len(self._buffer)
+
+    @timed('sink_write')
+    def write(self, match_rows):
+        '''
+         Adiciona as linhas de um DataFrame (saída de create_match_row ou de extract_match_rows) ao buffer,
+         gravando um lote sempre que o buffer chega a batch_size linhas.
+        '''
+        self._buffer.extend(match_rows[MATCH_ROW_COLUMNS].itertuples(index = False, name = None))
+
+        while len(self._buffer) >= self.batch_size:
+            self._write_part(self._buffer[:self.batch_size])
+            self._buffer = self._buffer[self.batch_size:]
+
+    def flush(self):
+        '''
+         Grava o que estiver no buffer como um lote (possivelmente menor que batch_size).
+        '''
+        if self._buffer:
+            self._write_part(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+
+    def _write_part(self, rows):
+        columns = list(zip(*rows))
+        table = pa.Table.from_arrays([pa.array(values, type = field.type) for values, field in zip(columns, MATCH_ROW_SCHEMA)],
+                                     schema = MATCH_ROW_SCHEMA)
+
+        path = os.path.join(self.directory, f'part-{self.next_part:05d}.{_EXTENSIONS[self.format]}')
+        tmp_path = path + '.tmp'
+
+        if self.format == 'parquet':
+            pq.write_table(table, tmp_path)
+        else:
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, MATCH_ROW_SCHEMA) as writer:
+                writer.write_table(table)
+
+        os.replace(tmp_path, path)
+        self.next_part += 1
+
+    def _read_part(self, path, columns = None):
+        if self.format == 'parquet':
+            return pq.read_table(path, columns = columns)
+
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+
+    def rows_written(self):
+        if self.format == 'parquet':
+            return sum(pq.ParquetFile(path).metadata.num_rows for path in self.parts())
+        return sum(self._read_part(path, ['gameID']).num_rows for path in self.parts())
+
+    def game_ids(self):
+        '''
+         Retorna a lista de gameIDs já gravados no diretório.
+        '''
+        return [game_id for path in self.parts() for game_id in self._read_part(path, ['gameID']).column(0).to_pylist()]
+
+    def read(self, columns = None):
+        '''
+         Lê todos os lotes gravados em um único DataFrame (opcionalmente apenas as columns escolhidas).
+        '''
+        tables = [self._read_part(path, columns) for path in self.parts()]
+        if not tables:
+            return pd.DataFrame(columns = columns or MATCH_ROW_COLUMNS)
+
+        return pa.concat_tables(tables).to_pandas()
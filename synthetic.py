@@ -0,0 +1,167 @@
+# Gerador de partidas sintéticas (MatchDto / MatchTimelineDto) para rodar benchmarks sem a API
+import random
+
+# Alguns ids de campeões reais, só para que os objetos tenham a cara dos da API
+CHAMPION_IDS = (1, 2, 3, 4, 5, 7, 11, 12, 18, 22, 24, 25, 40, 51, 53, 54, 55, 61, 64, 67, 81, 84, 89, 92,
+                98, 99, 103, 104, 111, 114, 117, 119, 121, 122, 141, 145, 157, 164, 202, 222, 234, 235,
+                236, 238, 245, 254, 266, 350, 360, 412, 421, 497, 498, 517, 523, 555, 777, 875, 876)
+
+LANES = [('TOP', 'SOLO'), ('JUNGLE', 'NONE'), ('MIDDLE', 'SOLO'), ('BOTTOM', 'DUO_CARRY'), ('BOTTOM', 'DUO_SUPPORT')]
+ROLES = ['TOP', 'JUNGLE', 'MIDDLE', 'BOTTOM', 'UTILITY']
+
+WARD_TYPES = ['YELLOW_TRINKET', 'CONTROL_WARD', 'SIGHT_WARD', 'BLUE_TRINKET', 'UNDEFINED']
+DRAGONS = ['FIRE_DRAGON', 'WATER_DRAGON', 'EARTH_DRAGON', 'AIR_DRAGON']
+TOWER_LANES = ['BOT_LANE', 'TOP_LANE', 'MID_LANE']
+
+# Eventos que o extrator ignora mas que dominam o volume de um timeline real
+NOISE_EVENTS = ['ITEM_PURCHASED', 'SKILL_LEVEL_UP', 'ITEM_DESTROYED', 'ITEM_SOLD', 'ITEM_UNDO']
+
+
+def _team_of(participant_id):
+    return 100 if participant_id <= 5 else 200
+
+
+def _random_event(rng, timestamp):
+    '''
+     Sorteia um evento com proporções parecidas com as de uma partida de SoloQ.
+    '''
+    roll = rng.random()
+    pid = rng.randint(1, 10)
+
+    if roll < 0.45:
+        return {'type': rng.choice(NOISE_EVENTS), 'timestamp': timestamp, 'participantId': pid,
+                'itemId': rng.randint(1001, 6700), 'skillSlot': rng.randint(1, 4)}
+
+    if roll < 0.72:
+        return {'type': 'WARD_PLACED', 'timestamp': timestamp, 'creatorId': pid,
+                'wardType': rng.choice(WARD_TYPES)}
+
+    if roll < 0.82:
+        return {'type': 'WARD_KILL', 'timestamp': timestamp, 'killerId': pid,
+                'wardType': rng.choice(WARD_TYPES)}
+
+    if roll < 0.94:
+        enemies = range(6, 11) if pid <= 5 else range(1, 6)
+        allies = [p for p in (range(1, 6) if pid <= 5 else range(6, 11)) if p != pid]
+        return {'type': 'CHAMPION_KILL', 'timestamp': timestamp, 'killerId': pid,
+                'victimId': rng.choice(enemies),
+                'assistingParticipantIds': rng.sample(allies, rng.randint(0, 3)),
+                'position': {'x': rng.randint(0, 14000), 'y': rng.randint(0, 14000)}}
+
+    if roll < 0.97:
+        if rng.random() < 0.75:
+            return {'type': 'ELITE_MONSTER_KILL', 'timestamp': timestamp, 'killerId': pid,
+                    'monsterType': 'DRAGON', 'monsterSubType': rng.choice(DRAGONS)}
+        return {'type': 'ELITE_MONSTER_KILL', 'timestamp': timestamp, 'killerId': pid,
+                'monsterType': 'RIFTHERALD'}
+
+    if rng.random() < 0.9:
+        return {'type': 'BUILDING_KILL', 'timestamp': timestamp, 'killerId': pid,
+                'teamId': 200 if pid <= 5 else 100, 'buildingType': 'TOWER_BUILDING',
+                'laneType': rng.choice(TOWER_LANES), 'towerType': 'OUTER_TURRET',
+                'assistingParticipantIds': []}
+    return {'type': 'BUILDING_KILL', 'timestamp': timestamp, 'killerId': pid,
+            'teamId': 200 if pid <= 5 else 100, 'buildingType': 'INHIBITOR_BUILDING',
+            'laneType': rng.choice(TOWER_LANES), 'assistingParticipantIds': []}
+
+
+def make_timeline(n_frames = 30, events_per_frame = 40, seed = 0):
+    '''
+     Cria um objeto timeline (MatchTimelineDto) sintético com n_frames frames e, em média,
+     events_per_frame eventos por frame (o primeiro frame não possui eventos, assim como na API).
+
+     Os stats dos participantFrames são acumulativos, então crescem de acordo com o frame.
+    '''
+    rng = random.Random(seed)
+
+    frames = []
+    stats = {i: {'totalGold': 500, 'xp': 0, 'minionsKilled': 0, 'jungleMinionsKilled': 0} for i in range(1, 11)}
+
+    for f in range(n_frames):
+        timestamp = f * 60000
+
+        participant_frames = {}
+        for i in range(1, 11):
+            s = stats[i]
+            if f > 0:
+                s['totalGold'] += rng.randint(250, 500)
+                s['xp'] += rng.randint(250, 600)
+                s['minionsKilled'] += rng.randint(0, 10)
+                s['jungleMinionsKilled'] += rng.randint(0, 6)
+
+            participant_frames[f'{i}'] = {'participantId': i, 'position': {'x': rng.randint(0, 14000),
+                                                                          'y': rng.randint(0, 14000)},
+                                          'currentGold': rng.randint(0, 1500), 'level': 1 + s['xp'] // 1000,
+                                          'dominionScore': 0, 'teamScore': 0, **s}
+
+        events = []
+        if f > 0:
+            n_events = rng.randint(events_per_frame // 2, events_per_frame + events_per_frame // 2)
+            events = [_random_event(rng, timestamp + rng.randint(0, 59999)) for _ in range(n_events)]
+            events.sort(key = lambda e: e['timestamp'])
+
+        frames.append({'participantFrames': participant_frames, 'events': events, 'timestamp': timestamp})
+
+    return {'frames': frames, 'frameInterval': 60000}
+
+
+def make_game_info(game_id = 2200000000, seed = 0):
+    '''
+     Cria um objeto game_info (MatchDto) sintético de uma partida de SoloQ (queue 420) com
+     10 participantes, cada um com campeão, lane e role.
+    '''
+    rng = random.Random(seed)
+
+    champions = rng.sample(CHAMPION_IDS, 10)
+    blue_wins = rng.random() < 0.5
+
+    participants = []
+    identities = []
+    for i in range(1, 11):
+        lane, role = LANES[(i - 1) % 5]
+        participants.append({'participantId': i, 'teamId': _team_of(i), 'championId': champions[i - 1],
+                             'spell1Id': 4, 'spell2Id': rng.choice([7, 11, 12, 14]),
+                             'timeline': {'participantId': i, 'lane': lane, 'role': role}})
+        identities.append({'participantId': i,
+                           'player': {'summonerName': f'synthetic{rng.randint(0, 10**6)}',
+                                      'accountId': f'acc-{rng.getrandbits(48):012x}',
+                                      'summonerId': f'sum-{rng.getrandbits(48):012x}',
+                                      'platformId': 'BR1'}})
+
+    return {'gameId': game_id, 'platformId': 'BR1', 'queueId': 420, 'gameDuration': rng.randint(1200, 2700),
+            'teams': [{'teamId': 100, 'win': 'Fail' if blue_wins else 'Win'},
+                      {'teamId': 200, 'win': 'Win' if blue_wins else 'Fail'}],
+            'participants': participants, 'participantIdentities': identities}
+
+
+def make_matches(n_matches, n_frames = 30, events_per_frame = 40, seed = 0):
+    '''
+     Gera n_matches pares (game_info, timeline) reprodutíveis a partir da seed. n_frames pode ser um int ou
+     um intervalo (mínimo, máximo), sorteado por partida - ex.: (15, 45) para misturar remakes/surrenders
+     com partidas longas, como no dataset real.
+    '''
+    if isinstance(n_frames, int):
+        frames = [n_frames] * n_matches
+    else:
+        rng = random.Random(seed)
+        frames = [rng.randint(*n_frames) for _ in range(n_matches)]
+
+    return [(make_game_info(game_id = 2200000000 + k, seed = seed + k),
+             make_timeline(n_frames = frames[k], events_per_frame = events_per_frame, seed = seed + k))
+            for k in range(n_matches)]
+
+
+def make_champion_roles(seed = 0):
+    '''
+     Cria um objeto champion_roles sintético no mesmo formato do retornado por roleidentification.pull_data():
+     {championId: {role: play rate}}, para que get_roles funcione sem acesso à internet.
+    '''
+    rng = random.Random(seed)
+
+    champion_roles = {}
+    for champion_id in CHAMPION_IDS:
+        weights = [rng.random() ** 4 for _ in ROLES]
+        total = sum(weights)
+        champion_roles[champion_id] = {role: w / total for role, w in zip(ROLES, weights)}
+
+    return champion_roles
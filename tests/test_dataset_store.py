@@ -0,0 +1,39 @@
+# Testes do DatasetStore: colunas de campeões/classes voltam como category depois de gravadas
+import numpy as np
+import pandas as pd
+
+from dataset_store import DatasetStore
+
+
+def _matches():
+    return pd.DataFrame({'gameID': [1, 2, 3], 'isWinner_blue': [1, 0, 1], 'TOP_blue': [10, 20, 10],
+                         'roleTOP_blue': ['Mage', 'Tank', 'Mage'], 'xp_blue': [1.0, 2.0, 3.0]})
+
+
+def test_save_load_keeps_categorical_dtypes(tmp_path):
+    store = DatasetStore(str(tmp_path))
+    df = _matches()
+    store.save('df_boosted', df)
+
+    loaded = store.load('df_boosted')
+    assert isinstance(loaded['TOP_blue'].dtype, pd.CategoricalDtype)
+    assert isinstance(loaded['roleTOP_blue'].dtype, pd.CategoricalDtype)
+    assert loaded['TOP_blue'].cat.categories.tolist() == [10, 20]
+    assert loaded['xp_blue'].dtype == np.float64
+    pd.testing.assert_frame_equal(loaded, df.astype({'TOP_blue': 'category', 'roleTOP_blue': 'category'}))
+
+
+def test_writer_keeps_categories_across_chunks(tmp_path):
+    store = DatasetStore(str(tmp_path))
+    df = _matches()
+    chunks = [df.assign(TOP_blue = pd.Categorical([0, 1, 0], categories = range(3))),
+              df.assign(TOP_blue = pd.Categorical([2, np.nan, 0], categories = range(3)))]
+
+    with store.writer('df_boosted') as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+
+    loaded = store.load('df_boosted', columns = ['TOP_blue'])
+    assert loaded['TOP_blue'].cat.categories.tolist() == [0, 1, 2]
+    assert loaded['TOP_blue'].cat.codes.tolist() == [0, 1, 0, 2, -1, 0]
+    assert loaded['TOP_blue'].cat.categories.dtype == np.int64
@@ -0,0 +1,22 @@
+# Testes das contribuições SHAP: CatBoost treinado em DataFrame com nomes e cat_features
+import numpy as np
+import pandas as pd
+import pytest
+
+from explanations import contributions
+
+catboost = pytest.importorskip('catboost')
+
+
+def test_catboost_contributions_named_frame():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({'xp_blue': rng.normal(size = 200), 'TOP_blue': rng.integers(0, 5, 200),
+                      'gold_blue': rng.normal(size = 200)})
+    y = (X['xp_blue'] + (X['TOP_blue'] == 2) > 0.5).astype(int)
+    model = catboost.CatBoostClassifier(iterations = 20, depth = 3, verbose = False, thread_count = 1,
+                                        allow_writing_files = False)
+    model.fit(X, y, cat_features = ['TOP_blue'])
+
+    shap = contributions(model, X.astype(float).assign(TOP_blue = X['TOP_blue'].astype('category')))
+    assert shap.shape == (len(X), X.shape[1] + 1)
+    np.testing.assert_allclose(shap.sum(axis = 1), model.predict(X, prediction_type = 'RawFormulaVal'), atol = 1e-6)
@@ -0,0 +1,495 @@
+# Arquivo colunar dos timelines: só os eventos de interesse, agrupados por tipo, com leitura preguiçosa (memory-map)
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from helper import (EVENT_COLUMNS, EVENT_HANDLERS, MATCH_ROW_COLUMNS, PERFORMANCE_COLUMNS, SNAPSHOT_COLUMNS,
+                    aggregate_match_rows)
+from metrics import METRICS, timed
+
+# Tipos de evento guardados no arquivo (os mesmos que helper.reduce_events contabiliza) e os campos de cada um:
+# {tipo: {campo: chave do EventDto}}. subtype é um código do vocabulário do tipo (ver _subtype) e assists é um
+# bitmask dos assistingParticipantIds (bit p = participante p).
+EVENT_FIELDS = {'WARD_PLACED': {'participant': 'creatorId', 'subtype': 'wardType'},
+                'WARD_KILL': {'participant': 'killerId', 'subtype': 'wardType'},
+                'CHAMPION_KILL': {'participant': 'killerId', 'victim': 'victimId', 'assists': 'assistingParticipantIds'},
+                'ELITE_MONSTER_KILL': {'participant': 'killerId', 'subtype': 'monsterType'},
+                'BUILDING_KILL': {'participant': 'killerId', 'team': 'teamId', 'subtype': 'buildingType'}}
+
+assert set(EVENT_FIELDS) == set(EVENT_HANDLERS)
+
+_FIELD_DTYPES = {'frame': np.int16, 'timestamp': np.int64, 'participant': np.int8, 'victim': np.int8,
+                 'assists': np.int16, 'team': np.int16, 'subtype': np.int16}
+
+# Arrays por partida: {nome: (dtype, shape de uma partida)}
+_MATCH_ARRAYS = {'game_ids': (np.int64, ()),
+                 'winners': (np.int16, ()),
+                 'team_ids': (np.int16, (10,)),
+                 'champion_ids': (np.int16, (10,))}
+
+_EVENT_IDX = {column: j for j, column in enumerate(EVENT_COLUMNS)}
+
+# Subtipos (texto de _subtype) que contam em alguma coluna de EVENT_COLUMNS, como nas funções _on_* do helper
+_MONSTER_COLUMNS = {'DRAGON:FIRE_DRAGON': 'fireDragonsDestroyed', 'DRAGON:WATER_DRAGON': 'waterDragonsDestroyed',
+                    'DRAGON:EARTH_DRAGON': 'earthDragonsDestroyed', 'DRAGON:AIR_DRAGON': 'airDragonsDestroyed'}
+
+_TOWER_COLUMNS = {'TOWER_BUILDING:BOT_LANE': 'botTowersDestroyed', 'TOWER_BUILDING:TOP_LANE': 'topTowersDestroyed',
+                  'TOWER_BUILDING:MID_LANE': 'midTowersDestroyed'}
+
+
+def _subtype(event_type, event):
+    '''
+     Texto do subtipo de um evento, codificado no vocabulário do tipo: o wardType dos eventos de ward,
+     monsterType:monsterSubType dos monstros elite e buildingType:laneType das construções.
+    '''
+    if event_type == 'ELITE_MONSTER_KILL':
+        return f"{event['monsterType']}:{event.get('monsterSubType', '')}"
+    if event_type == 'BUILDING_KILL':
+        return f"{event['buildingType']}:{event.get('laneType', '')}"
+    return event['wardType']
+
+
+class TimelineIndexWriter:
+    '''
+     Grava um TimelineIndex em directory, partida a partida (add), em blocos de chunk_size partidas: a memória
+     usada é a de um bloco, não a do arquivo inteiro.
+
+     Arquivos (binários crus, com dtype e shape no meta.json):
+       game_ids, winners, team_ids, champion_ids: uma entrada por partida (participantes na ordem do participantId)
+       frame_offsets (partidas + 1) e performance (frames, 10, len(PERFORMANCE_COLUMNS)): stats de cada frame
+       {tipo}.offsets (partidas + 1) e {tipo}.{campo}: eventos do tipo, na ordem do timeline
+
+     O meta.json é gravado por último (no close, e não quando o bloco with termina com uma exceção), então um
+     arquivo interrompido no meio nunca é aberto.
+    '''
+    def __init__(self, directory, chunk_size = 1000):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok = True)
+
+        meta_path = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        self.n_matches = 0
+        self.n_frames = 0
+        self.n_events = {event_type: 0 for event_type in EVENT_FIELDS}
+        self.vocab = {event_type: {} for event_type in EVENT_FIELDS if 'subtype' in EVENT_FIELDS[event_type]}
+
+        names = list(_MATCH_ARRAYS) + ['frame_offsets', 'performance']
+        names += [f'{event_type}.offsets' for event_type in EVENT_FIELDS]
+        names += [f'{event_type}.{field}' for event_type, fields in EVENT_FIELDS.items() for field in ['frame', 'timestamp', *fields]]
+        self._files = {name: open(os.path.join(directory, f'{name}.bin'), 'wb') for name in names}
+
+        self._reset_buffers()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _reset_buffers(self):
+        self._buffers = {name: [] for name in self._files}
+
+    def _code(self, event_type, text):
+        vocab = self.vocab[event_type]
+        if text not in vocab:
+            vocab[text] = len(vocab)
+        return vocab[text]
+
+    def add(self, game_info, timeline):
+        buffers = self._buffers
+        participants = sorted(game_info['participants'], key = lambda participant: participant['participantId'])
+        teams = game_info['teams']
+
+        buffers['game_ids'].append(game_info['gameId'])
+        buffers['winners'].append(teams[0]['teamId'] if teams[0]['win'] == 'Win' else teams[1]['teamId'])
+        buffers['team_ids'].append([participant['teamId'] for participant in participants])
+        buffers['champion_ids'].append([participant['championId'] for participant in participants])
+
+        frames = timeline['frames']
+        buffers['frame_offsets'].append(self.n_frames)
+        buffers['performance'].extend([[frame['participantFrames'][f'{i}'][c] for c in PERFORMANCE_COLUMNS] for i in range(1, 11)]
+                                      for frame in frames)
+        self.n_frames += len(frames)
+
+        for event_type in EVENT_FIELDS:
+            buffers[f'{event_type}.offsets'].append(self.n_events[event_type])
+
+        for f, frame in enumerate(frames):
+            for event in frame['events']:
+                event_type = event['type']
+                fields = EVENT_FIELDS.get(event_type)
+                if fields is None:
+                    continue
+
+                buffers[f'{event_type}.frame'].append(f)
+                buffers[f'{event_type}.timestamp'].append(event['timestamp'])
+                for field, key in fields.items():
+                    if field == 'subtype':
+                        value = self._code(event_type, _subtype(event_type, event))
+                    elif field == 'assists':
+                        value = sum(1 << p for p in event.get(key, ()))
+                    else:
+                        value = event.get(key, 0)
+                    buffers[f'{event_type}.{field}'].append(value)
+
+                self.n_events[event_type] += 1
+
+        self.n_matches += 1
+        if self.n_matches % self.chunk_size == 0:
+            self._flush()
+
+    def _dtype(self, name):
+        if name in _MATCH_ARRAYS:
+            return _MATCH_ARRAYS[name][0]
+        if name == 'performance':
+            return np.int32
+        if name.endswith('offsets'):
+            return np.int64
+        return _FIELD_DTYPES[name.split('.')[1]]
+
+    def _flush(self):
+        for name, values in self._buffers.items():
+            if values:
+                self._files[name].write(np.asarray(values, dtype = self._dtype(name)).tobytes())
+        self._reset_buffers()
+
+    def close(self):
+        if self._files is None:
+            return
+
+        # Último offset de cada array (partidas + 1 entradas)
+        self._buffers['frame_offsets'].append(self.n_frames)
+        for event_type in EVENT_FIELDS:
+            self._buffers[f'{event_type}.offsets'].append(self.n_events[event_type])
+
+        self._flush()
+        for f in self._files.values():
+            f.close()
+
+        arrays = {}
+        for name in self._files:
+            if name in _MATCH_ARRAYS:
+                shape = [self.n_matches, *_MATCH_ARRAYS[name][1]]
+            elif name == 'performance':
+                shape = [self.n_frames, 10, len(PERFORMANCE_COLUMNS)]
+            elif name.endswith('offsets'):
+                shape = [self.n_matches + 1]
+            else:
+                shape = [self.n_events[name.split('.')[0]]]
+            arrays[name] = {'dtype': np.dtype(self._dtype(name)).str, 'shape': shape}
+
+        meta = {'n_matches': self.n_matches, 'arrays': arrays,
+                'vocab': {event_type: list(vocab) for event_type, vocab in self.vocab.items()}}
+        with open(os.path.join(self.directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        self._files = None
+
+    def abort(self):
+        '''
+         Fecha os arquivos sem gravar o meta.json (usado quando a escrita falha no meio): o diretório continua
+         sem um TimelineIndex que possa ser aberto.
+        '''
+        if self._files is None:
+            return
+
+        for f in self._files.values():
+            f.close()
+        self._files = None
+
+
+def build_timeline_index(matches, directory, chunk_size = 1000):
+    '''
+     Grava os pares (game_info, timeline) de matches (ex.: cache.MatchCache.iter_matches()) como um TimelineIndex
+     em directory. Retorna o TimelineIndex aberto.
+    '''
+    with TimelineIndexWriter(directory, chunk_size = chunk_size) as writer:
+        for game_info, timeline in matches:
+            writer.add(game_info, timeline)
+
+    return TimelineIndex(directory)
+
+
+def _add(counts, match, player, column):
+    # counts[match, player, column] += 1 para cada evento, com repetições (bincount no array achatado)
+    flat = counts.reshape(-1)
+    flat += np.bincount((match * 10 + player) * counts.shape[-1] + column, minlength = flat.size)
+
+
+def _add_team(counts, match, team, column):
+    # Eventos globais contam para os 5 players do time (team 0: participantes 1-5, team 1: 6-10)
+    match, team, column = (np.repeat(a, 5) for a in (match, team, column))
+    _add(counts, match, team * 5 + np.tile(np.arange(5), len(match) // 5), column)
+
+
+def _first_per_match(match, mask):
+    # Posição do primeiro evento de cada partida entre os de mask (os eventos estão na ordem do timeline)
+    candidates = np.flatnonzero(mask)
+    _, first = np.unique(match[candidates], return_index = True)
+    return candidates[first]
+
+
+class TimelineIndex:
+    '''
+     Timelines pré-processados por build_timeline_index: os eventos de cada tipo de EVENT_FIELDS ficam em arrays
+     colunares, com um índice de offsets por partida, e os eventos que a extração ignora (ITEM_PURCHASED,
+     SKILL_LEVEL_UP, ...) não são guardados.
+
+     Abrir o arquivo lê apenas o meta.json; cada array é mapeado (np.memmap) no primeiro uso, e as consultas
+     leem só as fatias das partidas e dos tipos de evento pedidos. Assim, reprocessar o arquivo custa I/O e
+     CPU proporcionais aos eventos de interesse, sem nenhum parse de JSON.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self._arrays = {}
+        self._positions = None
+
+    def __len__(self):
+        return self.meta['n_matches']
+
+    def array(self, name):
+        '''
+         Array name do arquivo (ex.: 'game_ids', 'CHAMPION_KILL.victim'), mapeado na memória no primeiro acesso.
+        '''
+        if name not in self._arrays:
+            spec = self.meta['arrays'][name]
+            shape = tuple(spec['shape'])
+            if 0 in shape:
+                self._arrays[name] = np.zeros(shape, dtype = spec['dtype'])
+            else:
+                self._arrays[name] = np.memmap(os.path.join(self.directory, f'{name}.bin'), dtype = spec['dtype'],
+                                               mode = 'r', shape = shape)
+        return self._arrays[name]
+
+    @property
+    def game_ids(self):
+        return self.array('game_ids')
+
+    def position(self, game_id):
+        if self._positions is None:
+            self._positions = {int(game_id): i for i, game_id in enumerate(self.game_ids)}
+        return self._positions[game_id]
+
+    def n_frames(self, start = 0, stop = None):
+        return np.diff(self.array('frame_offsets')[start:(len(self) if stop is None else stop) + 1])
+
+    def match(self, game_id):
+        '''
+         MatchTimeline (visão preguiçosa) da partida game_id.
+        '''
+        return MatchTimeline(self, self.position(game_id))
+
+    def events(self, event_type, start = 0, stop = None):
+        '''
+         Eventos do tipo event_type das partidas [start, stop): retorna (match, columns), em que match é a posição
+         (relativa a start) da partida de cada evento e columns o dicionário {campo: array}.
+        '''
+        stop = len(self) if stop is None else stop
+        offsets = np.asarray(self.array(f'{event_type}.offsets')[start:stop + 1])
+        lo, hi = offsets[0], offsets[-1]
+
+        columns = {field: np.asarray(self.array(f'{event_type}.{field}')[lo:hi])
+                   for field in ['frame', 'timestamp', *EVENT_FIELDS[event_type]]}
+        match = np.repeat(np.arange(stop - start), np.diff(offsets))
+        return match, columns
+
+    def _subtype_map(self, event_type, value_of, dtype = np.int64):
+        # Array código do subtipo -> value_of(texto do subtipo)
+        return np.array([value_of(text) for text in self.meta['vocab'][event_type]], dtype = dtype)
+
+    def event_counts(self, frames, start = 0, stop = None):
+        '''
+         Versão vetorizada de helper.reduce_events sobre o arquivo: para cada frame f de frames, os eventos de
+         interesse acumulados nos frames 1..f de cada partida de [start, stop), por player.
+
+         A função retorna um array (len(frames), stop - start, 10, len(EVENT_COLUMNS)); a fatia [k, i] é igual a
+         helper.events_at_n(timeline, frames[k] + 1, as_array = True) da partida start + i.
+        '''
+        stop = len(self) if stop is None else stop
+        frames = list(frames)
+        counts = np.zeros((len(frames), stop - start, 10, len(EVENT_COLUMNS)), dtype = np.int64)
+        n_events = 0
+
+        for event_type in EVENT_FIELDS:
+            match, ev = self.events(event_type, start, stop)
+            n_events += len(match)
+            if not len(match):
+                continue
+
+            participant = ev['participant'].astype(np.int64)
+            killer_team = (participant > 5).astype(np.int64)
+
+            # Como no events_at_n, os eventos do frame 0 não contam
+            counted = ev['frame'] >= 1
+
+            if event_type in ('WARD_PLACED', 'WARD_KILL'):
+                column = _EVENT_IDX['wardsPlaced' if event_type == 'WARD_PLACED' else 'wardsKilled']
+                # Id 0 (sem player) não é contado, como no events_at_n
+                keep = self._subtype_map(event_type, lambda text: text != 'UNDEFINED', dtype = bool)[ev['subtype']]
+                keep &= participant != 0
+
+                for k, f in enumerate(frames):
+                    sel = keep & counted & (ev['frame'] <= f)
+                    _add(counts[k], match[sel], participant[sel] - 1, np.full(sel.sum(), column))
+
+            elif event_type == 'CHAMPION_KILL':
+                keep = participant != 0
+                victim = ev['victim'].astype(np.int64)
+                assists = ev['assists'].astype(np.int64)
+                first_blood = _first_per_match(match, keep & counted)
+
+                for k, f in enumerate(frames):
+                    sel = keep & counted & (ev['frame'] <= f)
+                    _add(counts[k], match[sel], participant[sel] - 1, np.full(sel.sum(), _EVENT_IDX['nKills']))
+                    _add(counts[k], match[sel], victim[sel] - 1, np.full(sel.sum(), _EVENT_IDX['nDeaths']))
+
+                    for p in range(1, 11):
+                        assisted = sel & ((assists >> p) & 1).astype(bool)
+                        _add(counts[k], match[assisted], np.full(assisted.sum(), p - 1), np.full(assisted.sum(), _EVENT_IDX['nAssists']))
+
+                    first = first_blood[ev['frame'][first_blood] <= f]
+                    _add(counts[k], match[first], participant[first] - 1, np.full(len(first), _EVENT_IDX['firstBlood']))
+
+            elif event_type == 'ELITE_MONSTER_KILL':
+                def monster_column(text):
+                    if text.startswith('RIFTHERALD:'):
+                        return _EVENT_IDX['riftHeraldDestroyed']
+                    return _EVENT_IDX[_MONSTER_COLUMNS[text]] if text in _MONSTER_COLUMNS else -1
+
+                column = self._subtype_map(event_type, monster_column)[ev['subtype']]
+
+                for k, f in enumerate(frames):
+                    sel = (column >= 0) & counted & (ev['frame'] <= f)
+                    _add_team(counts[k], match[sel], killer_team[sel], column[sel])
+
+            else:
+                is_tower = self._subtype_map(event_type, lambda text: text.startswith('TOWER_BUILDING:'), dtype = bool)[ev['subtype']]
+                is_inhibitor = self._subtype_map(event_type, lambda text: text.startswith('INHIBITOR_BUILDING:'),
+                                                 dtype = bool)[ev['subtype']]
+                lane = self._subtype_map(event_type, lambda text: _EVENT_IDX[_TOWER_COLUMNS[text]] if text in _TOWER_COLUMNS else -1)[ev['subtype']]
+
+                # teamId é o time dono da torre, então quem pontua é o outro time
+                scoring_team = (ev['team'] == 100).astype(np.int64)
+                first_tower = _first_per_match(match, is_tower & counted)
+
+                for k, f in enumerate(frames):
+                    in_frames = counted & (ev['frame'] <= f)
+                    sel = is_tower & in_frames & (lane >= 0)
+                    _add_team(counts[k], match[sel], scoring_team[sel], lane[sel])
+
+                    first = first_tower[ev['frame'][first_tower] <= f]
+                    _add_team(counts[k], match[first], scoring_team[first], np.full(len(first), _EVENT_IDX['firstTower']))
+
+                    sel = is_inhibitor & in_frames
+                    _add_team(counts[k], match[sel], killer_team[sel], np.full(sel.sum(), _EVENT_IDX['inhibitorsDestroyed']))
+
+        METRICS.count('timelines', stop - start)
+        METRICS.count('events', n_events)
+        return counts
+
+    def snapshots(self, frames, start = 0, stop = None):
+        '''
+         Versão em lote de helper.match_snapshots para as partidas [start, stop): retorna (snapshots, valid), em
+         que snapshots é um array (len(frames), stop - start, 10, len(SNAPSHOT_COLUMNS)) e valid marca as
+         partidas que possuem cada frame (nas demais, a performance fica zerada).
+        '''
+        stop = len(self) if stop is None else stop
+        frames = list(frames)
+        n_frames = self.n_frames(start, stop)
+        frame_offsets = np.asarray(self.array('frame_offsets')[start:stop])
+        performance = self.array('performance')
+
+        snapshots = np.zeros((len(frames), stop - start, 10, len(SNAPSHOT_COLUMNS)), dtype = np.int64)
+        valid = np.zeros((len(frames), stop - start), dtype = bool)
+
+        for k, f in enumerate(frames):
+            valid[k] = n_frames > f
+            snapshots[k, valid[k], :, :len(PERFORMANCE_COLUMNS)] = performance[frame_offsets[valid[k]] + f]
+
+        snapshots[:, :, :, len(PERFORMANCE_COLUMNS):] = self.event_counts(frames, start, stop)
+        return snapshots, valid
+
+    @timed('timeline_index.match_row_arrays')
+    def match_row_arrays(self, champion_roles, cutoffs = (5, 10, 15, 20), start = 0, stop = None, role_cache = None):
+        '''
+         Mesmo retorno de helper.match_row_arrays ({cutoff: {coluna: array}}) para as partidas [start, stop) do
+         arquivo, na ordem em que foram gravadas.
+        '''
+        stop = len(self) if stop is None else stop
+        cutoffs = list(cutoffs)
+
+        rows = np.flatnonzero(self.n_frames(start, stop) > min(cutoffs))
+        METRICS.count('matches', len(rows))
+
+        snapshots, valid = self.snapshots(cutoffs, start, stop)
+        arrays = {name: np.asarray(self.array(name)[start:stop]) for name in _MATCH_ARRAYS}
+
+        return aggregate_match_rows(snapshots[:, rows], valid[:, rows], arrays['team_ids'][rows].astype(np.int64),
+                                    arrays['champion_ids'][rows].astype(np.int64), arrays['winners'][rows].astype(np.int64),
+                                    arrays['game_ids'][rows], cutoffs, champion_roles, role_cache = role_cache)
+
+    def iter_match_rows(self, champion_roles, n = 10, chunk_size = 10000, role_cache = None):
+        '''
+         Gerador com as linhas de partidas (DataFrame com as colunas de MATCH_ROW_COLUMNS, como
+         helper.extract_match_rows) de blocos de chunk_size partidas - pode ir direto para um sink.MatchRowSink.
+        '''
+        for start in range(0, len(self), chunk_size):
+            data = self.match_row_arrays(champion_roles, cutoffs = [n], start = start,
+                                         stop = min(start + chunk_size, len(self)), role_cache = role_cache)[n]
+            yield pd.DataFrame(data, columns = MATCH_ROW_COLUMNS)
+
+    def extract_match_rows(self, champion_roles, n = 10, chunk_size = 10000, role_cache = None):
+        '''
+         Todas as linhas de partidas do arquivo em um único DataFrame (ver iter_match_rows).
+        '''
+        blocks = list(self.iter_match_rows(champion_roles, n = n, chunk_size = chunk_size, role_cache = role_cache))
+        if not blocks:
+            return pd.DataFrame(columns = MATCH_ROW_COLUMNS)
+        return pd.concat(blocks, ignore_index = True)
+
+
+class MatchTimeline:
+    '''
+     Visão de uma partida do TimelineIndex: nada é lido do disco até que os frames ou eventos sejam pedidos.
+    '''
+    def __init__(self, index, position):
+        self.index = index
+        self.position = position
+
+    @property
+    def game_id(self):
+        return int(self.index.game_ids[self.position])
+
+    @property
+    def n_frames(self):
+        return int(self.index.n_frames(self.position, self.position + 1)[0])
+
+    def performance(self, frame):
+        '''
+         Array (10, len(PERFORMANCE_COLUMNS)) com as stats dos players no frame, na ordem do participantId.
+        '''
+        offset = self.index.array('frame_offsets')[self.position]
+        return np.asarray(self.index.array('performance')[offset + frame], dtype = np.int64)
+
+    def events(self, event_type):
+        '''
+         Dicionário {campo: array} com os eventos do tipo event_type da partida, na ordem do timeline.
+        '''
+        return self.index.events(event_type, self.position, self.position + 1)[1]
+
+    def events_at_n(self, n = 11):
+        '''
+         Mesmo retorno de helper.events_at_n(timeline, n, as_array = True).
+        '''
+        return self.index.event_counts([n - 1], self.position, self.position + 1)[0, 0]
@@ -0,0 +1,288 @@
+# Busca de hiperparâmetros (Optuna) do LightGBM e do CatBoost com os dados preparados uma única vez e trials em paralelo
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import catboost
+import lightgbm as lgbm
+import numpy as np
+import optuna
+import pandas as pd
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from preprocessing import is_lane_column
+
+# Parâmetros fixos dos modelos, como no notebook de modelagem ('accuracy' não é uma métrica do LightGBM: a AUC
+# da validação é o que alimenta o pruning e o early stopping)
+FIXED_PARAMS_LGB = {'objective': 'binary',
+                    'metric': 'auc',
+                    'verbosity': -1,
+                    'boosting_type': 'gbdt',
+                    'random_seed': 42,
+                    'num_threads': 1}
+
+FIXED_PARAMS_CB = {'objective': 'Logloss',
+                   'eval_metric': 'AUC',
+                   'random_seed': 42,
+                   'thread_count': 1,
+                   'used_ram_limit': '12gb'}
+
+NUM_BOOST_ROUND = 2000
+EARLY_STOPPING_ROUNDS = 100
+
+# Pruning: a partir da 10ª iteração, trials com AUC abaixo da mediana das anteriores são interrompidos
+PRUNER_WARMUP_STEPS = 10
+
+_ARRAYS = ('X_train', 'X_val', 'y_train', 'y_val')
+
+# feature_pre_filter desligado: min_child_samples muda a cada trial sem precisar refazer o Dataset
+_DATASET_PARAMS = {'verbosity': -1, 'feature_pre_filter': False}
+
+
+class SharedSplit:
+    '''
+     Split treino/validação do dataset boosted gravado uma única vez em directory: as matrizes em .npy (abertas
+     com memory-map, somente leitura - os workers compartilham as mesmas páginas do cache do sistema) e os
+     lgbm.Dataset de treino e validação já binados (save_binary), que os workers carregam sem refazer os bins.
+
+     Dentro de cada processo os objetos são montados uma vez (lgbm_datasets, catboost_pools) e reaproveitados
+     por todos os trials.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+
+        with open(os.path.join(directory, 'split.json')) as f:
+            meta = json.load(f)
+
+        self.feature_names = meta['feature_names']
+        self.cat_features = meta['cat_features']
+
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, f'{name}.npy'), mmap_mode = 'r'))
+
+        self._lgbm = None
+        self._catboost = None
+
+    def lgbm_datasets(self):
+        if self._lgbm is None:
+            train = lgbm.Dataset(os.path.join(self.directory, 'train.bin'), params = _DATASET_PARAMS)
+            val = lgbm.Dataset(os.path.join(self.directory, 'val.bin'), reference = train, params = _DATASET_PARAMS)
+            self._lgbm = (train.construct(), val.construct())
+        return self._lgbm
+
+    def catboost_pools(self):
+        '''
+         Pools do CatBoost (as colunas categóricas do CatBoost precisam ser inteiras: NaN vira -1).
+        '''
+        if self._catboost is None:
+            self._catboost = tuple(catboost.Pool(self._catboost_frame(X), label = np.asarray(y),
+                                                 cat_features = self.cat_features)
+                                   for X, y in ((self.X_train, self.y_train), (self.X_val, self.y_val)))
+        return self._catboost
+
+    def _catboost_frame(self, X):
+        df = pd.DataFrame(np.asarray(X), columns = self.feature_names)
+        for j in self.cat_features:
+            column = self.feature_names[j]
+            df[column] = df[column].fillna(-1).astype(np.int64)
+        return df
+
+
+def prepare_shared_split(df, directory = 'data/tuning', test_size = 0.25, random_state = 42):
+    '''
+     Essa função toma como parâmetro obrigatório o DataFrame boosted (df_boosted ou df_boosted_dropout, já sem
+     o test set) e, como parâmetros não obrigatórios, o diretório de saída e os parâmetros do train_test_split
+     (os mesmos do notebook).
+
+     Ela faz o drop de gameID/isWinner_blue e o split uma única vez, grava as matrizes e os lgbm.Dataset binados
+     em directory e retorna o SharedSplit correspondente.
+    '''
+    os.makedirs(directory, exist_ok = True)
+
+    X = df.drop(['gameID', 'isWinner_blue'], axis = 1)
+    y = df['isWinner_blue'].to_numpy().astype(np.int64)
+
+    feature_names = list(X.columns)
+    cat_features = [j for j, column in enumerate(feature_names) if is_lane_column(column)]
+
+    # Colunas category (label encoding do DatasetStore) viram os próprios códigos; ausentes viram NaN
+    X = np.column_stack([X[column].astype(np.float64).to_numpy() for column in feature_names])
+
+    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size = test_size, random_state = random_state)
+    for name, array in zip(_ARRAYS, (X_train, X_val, y_train, y_val)):
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+
+    train = lgbm.Dataset(X_train, label = y_train, feature_name = feature_names, categorical_feature = cat_features,
+                         params = _DATASET_PARAMS, free_raw_data = False)
+    val = lgbm.Dataset(X_val, label = y_val, reference = train, params = _DATASET_PARAMS, free_raw_data = False)
+
+    for path in ('train.bin', 'val.bin'):
+        if os.path.exists(os.path.join(directory, path)):
+            os.remove(os.path.join(directory, path))
+    train.save_binary(os.path.join(directory, 'train.bin'))
+    val.save_binary(os.path.join(directory, 'val.bin'))
+
+    with open(os.path.join(directory, 'split.json'), 'w') as f:
+        json.dump({'feature_names': feature_names, 'cat_features': cat_features}, f)
+
+    return SharedSplit(directory)
+
+
+def lgbm_pruning_callback(trial, valid_name = 'val', metric = 'auc'):
+    '''
+     Callback do lgbm.train que reporta a métrica da validação ao Optuna a cada iteração e interrompe o
+     treino (optuna.TrialPruned) quando o pruner decide cortar o trial.
+    '''
+    def callback(env):
+        for data_name, metric_name, value, _ in env.evaluation_result_list:
+            if data_name == valid_name and metric_name == metric:
+                trial.report(value, env.iteration)
+                if trial.should_prune():
+                    raise optuna.TrialPruned(f'trial cortado na iteração {env.iteration}')
+
+    callback.order = 5
+    return callback
+
+
+class CatBoostPruningCallback:
+    '''
+     Mesma ideia de lgbm_pruning_callback para o CatBoost (after_iteration retornando False para o treino).
+     Como o CatBoost não propaga exceções do callback, check() levanta o TrialPruned depois do fit.
+    '''
+    def __init__(self, trial, metric = 'AUC'):
+        self.trial = trial
+        self.metric = metric
+        self.pruned = False
+
+    def after_iteration(self, info):
+        value = info.metrics['validation'][self.metric][-1]
+        self.trial.report(value, info.iteration)
+
+        self.pruned = self.trial.should_prune()
+        return not self.pruned
+
+    def check(self):
+        if self.pruned:
+            raise optuna.TrialPruned('trial cortado pelo pruner')
+
+
+def lightgbm_objective(trial, split):
+    '''
+     Mesmo espaço de busca do lightgbm_objective do notebook, treinando sobre os Datasets já binados do split.
+    '''
+    train_data, val_data = split.lgbm_datasets()
+
+    params = dict(FIXED_PARAMS_LGB,
+                  lambda_l1 = trial.suggest_float('lambda_l1', 1e-8, 10.0, log = True),
+                  lambda_l2 = trial.suggest_float('lambda_l2', 1e-8, 10.0, log = True),
+                  num_leaves = trial.suggest_int('num_leaves', 2, 256),
+                  feature_fraction = trial.suggest_float('feature_fraction', 0.4, 1.0),
+                  bagging_fraction = trial.suggest_float('bagging_fraction', 0.4, 1.0),
+                  bagging_freq = trial.suggest_int('bagging_freq', 1, 7),
+                  min_child_samples = trial.suggest_int('min_child_samples', 5, 100))
+
+    model_lgbm = lgbm.train(params, train_data, num_boost_round = NUM_BOOST_ROUND, valid_sets = [val_data],
+                            valid_names = ['val'],
+                            callbacks = [lgbm_pruning_callback(trial),
+                                         lgbm.early_stopping(EARLY_STOPPING_ROUNDS, verbose = False)])
+
+    pred = model_lgbm.predict(split.X_val, num_iteration = model_lgbm.best_iteration)
+    return accuracy_score(split.y_val, np.rint(pred))
+
+
+def cb_objective(trial, split):
+    '''
+     Mesmo espaço de busca do cb_objective do notebook, treinando sobre os Pools montados uma vez por processo.
+    '''
+    train_pool, val_pool = split.catboost_pools()
+
+    params = dict(FIXED_PARAMS_CB,
+                  colsample_bylevel = trial.suggest_float('colsample_bylevel', 0.01, 0.1),
+                  depth = trial.suggest_int('depth', 1, 12),
+                  boosting_type = trial.suggest_categorical('boosting_type', ['Ordered', 'Plain']),
+                  bootstrap_type = trial.suggest_categorical('bootstrap_type', ['Bayesian', 'Bernoulli', 'MVS']))
+
+    if params['bootstrap_type'] == 'Bayesian':
+        params['bagging_temperature'] = trial.suggest_float('bagging_temperature', 0, 10)
+
+    elif params['bootstrap_type'] == 'Bernoulli':
+        params['subsample'] = trial.suggest_float('subsample', 0.1, 1)
+
+    pruning = CatBoostPruningCallback(trial)
+    model_cb = catboost.CatBoostClassifier(logging_level = 'Silent', **params)
+    model_cb.fit(train_pool, eval_set = val_pool, early_stopping_rounds = EARLY_STOPPING_ROUNDS,
+                 callbacks = [pruning])
+    pruning.check()
+
+    return accuracy_score(split.y_val, model_cb.predict(val_pool))
+
+
+OBJECTIVES = {'lightgbm': lightgbm_objective, 'catboost': cb_objective}
+
+
+def get_storage(path):
+    '''
+     Storage do Optuna compartilhado pelos workers: arquivo SQLite (.db / .sqlite) ou journal file (qualquer
+     outra extensão, que aguenta melhor muitos processos escrevendo ao mesmo tempo).
+    '''
+    if path.endswith(('.db', '.sqlite', '.sqlite3')):
+        return f'sqlite:///{path}'
+    return JournalStorage(JournalFileBackend(path))
+
+
+# SharedSplit de cada processo worker, carregado uma única vez
+_worker_splits = {}
+
+
+def _make_study(study_name, storage_path, seed):
+    # Sampler e pruner não ficam no storage: cada processo precisa recriá-los (com seeds diferentes, para os
+    # workers não sugerirem os mesmos parâmetros)
+    return optuna.create_study(study_name = study_name, storage = get_storage(storage_path), direction = 'maximize',
+                               sampler = optuna.samplers.TPESampler(seed = seed),
+                               pruner = optuna.pruners.MedianPruner(n_warmup_steps = PRUNER_WARMUP_STEPS),
+                               load_if_exists = True)
+
+
+def _optimize(objective, directory, study_name, storage_path, n_trials, seed):
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    if directory not in _worker_splits:
+        _worker_splits[directory] = SharedSplit(directory)
+    split = _worker_splits[directory]
+
+    study = _make_study(study_name, storage_path, seed)
+    study.optimize(lambda trial: OBJECTIVES[objective](trial, split), n_trials = n_trials)
+
+
+def run_study(objective, directory = 'data/tuning', study_name = None, storage_path = 'data/tuning/optuna.journal',
+              n_trials = 100, n_jobs = None, seed = 42):
+    '''
+     Essa função toma como parâmetro obrigatório o nome do objetivo ('lightgbm' ou 'catboost') e, como parâmetros
+     não obrigatórios, o diretório do SharedSplit (ver prepare_shared_split), o nome do estudo (padrão: o objetivo),
+     o arquivo do storage, o número total de trials e o número de processos (padrão: os.cpu_count()).
+
+     Os n_trials são divididos entre n_jobs processos, que rodam em paralelo sobre o mesmo estudo (com MedianPruner,
+     como no notebook). Cada modelo usa uma thread, então n_jobs trials ocupam n_jobs núcleos. Rodar de novo
+     com o mesmo storage continua o estudo.
+
+     A função retorna o optuna.Study.
+    '''
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective deve ser 'lightgbm' ou 'catboost', não {objective!r}")
+
+    study_name = study_name or objective
+    n_jobs = min(n_jobs or os.cpu_count(), n_trials)
+
+    _make_study(study_name, storage_path, seed)
+
+    shares = [n_trials // n_jobs + (i < n_trials % n_jobs) for i in range(n_jobs)]
+    with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+        futures = [executor.submit(_optimize, objective, directory, study_name, storage_path, share, seed + i)
+                   for i, share in enumerate(shares)]
+        for future in futures:
+            future.result()
+
+    return optuna.load_study(study_name = study_name, storage = get_storage(storage_path))